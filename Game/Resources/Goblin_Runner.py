@@ -2,7 +2,12 @@
 
 # Import the existing modules 
 import pygame as pg 
+import argparse
+import gc
+import os
+import random
 import sys 
+import time
 
 # Import the modules coming from the other directories 
 from character import Character  
@@ -11,49 +16,148 @@ from level_display import LevelDisplay
 from dialogue import Dialogue 
 from enemy import Enemy  
 from music import Music
+from sound_effects import SoundEffects
+from headless import HeadlessDriver
+from asset_manager import AssetManager
+from dirty_renderer import DirtyRenderer
+from startup_profiler import StartupProfiler
+from frame_profiler import FrameProfiler
+from input_replay import InputRecorder, ReplayDriver, read_replay_header
+from level_pack import LEVEL_PACK_PATH, load_level_pack
+from endless_mode import EndlessMode
+from render_canvas import RenderCanvas, check_canvas_size
+from scenes import (SceneStack, MenuScene, CreditsScene, DialogueScene, TutorialScene, GameplayScene, EndlessScene, 
+                    GameOverScene, GameCompletedScene, STATE_MAIN_MENU, STATE_LEVEL_DIALOGUE, STATE_TUTORIAL_GAMEPLAY, 
+                    STATE_GAMEPLAY, STATE_GAME_OVER, STATE_GAME_COMPLETED, STATE_CREDITS, STATE_ENDLESS)
 
 
 class Goblin_Runner: 
-
-    def __init__(self): 
-        # Initialize all Pygame modules. 
-        pg.init() 
+    # Screen size used in headless mode when no resolution is given.
+    HEADLESS_RESOLUTION = (1920, 1080)
+
+    # Folder where scaled, display-format images are saved so later launches skip decoding and scaling.
+    ASSET_CACHE_DIR = 'GAME_DEV_FINAL/.asset_cache'
+
+    # Physics and animation run at a fixed number of ticks per second, separate from the drawing rate.
+    TICK_RATE = 60
+    TICK_SECONDS = 1 / TICK_RATE
+
+    # Longest frame time (in seconds) the simulation will catch up on in one frame.
+    MAX_FRAME_TIME = 0.25
+
+    # Longest time (in milliseconds) an unchanged screen waits for input before running the next frame.
+    IDLE_WAIT_MS = 250
+
+    def __init__(self, headless=False, resolution=None, use_asset_cache=True, dirty_rects=False, enemy_backend='dict', stress_enemies=0, collision_mode='mask', mirror_sprites=True, profile_startup=False, minimal_init=False, startup_budget_ms=None, show_frame_profiler=False, trace_path=None, seed=None, record_path=None, replay_path=None, level_pack_path=LEVEL_PACK_PATH, endless=False, canvas_size=None, canvas_scaling='scaled'): 
+        # Store if the game runs without a window, sound or real input (for build machines and simulations).
+        self.headless = headless
+
+        # A replay runs with the seed, screen size and game settings it was recorded with.
+        if replay_path:
+            replay_header = read_replay_header(replay_path)
+            seed = replay_header['seed']
+            resolution = replay_header['resolution']
+            enemy_backend = replay_header['settings'].get('enemy_backend', enemy_backend)
+            stress_enemies = replay_header['settings'].get('stress_enemies', stress_enemies)
+            collision_mode = replay_header['settings'].get('collision_mode', collision_mode)
+            endless = replay_header['settings'].get('endless', endless)
+
+            # With a render canvas, the recorded screen size is the canvas size and the display keeps its own size.
+            if canvas_size:
+                canvas_size, resolution = resolution, None
+
+        # Seed for every random choice in the game. Runs with the same seed and input are identical.
+        self.seed = seed if seed is not None else random.randrange(2 ** 63)
+
+        # Measure how long each part of the startup takes, if asked. The report is printed when startup is done.
+        self.startup_profiler = StartupProfiler(enabled=profile_startup)
+        self.startup_budget_ms = startup_budget_ms
+
+        # Use SDL's dummy video and audio drivers in headless mode. These must be set before Pygame starts.
+        if self.headless:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+        # Initialize the Pygame modules. The minimal setup starts only the display and fonts 
+        # (the mixer is started by the music system when sound is on). 
+        if minimal_init: 
+            with self.startup_profiler.measure('pygame', 'display module'): 
+                pg.display.init() 
+            with self.startup_profiler.measure('pygame', 'font module'): 
+                pg.font.init() 
+        else: 
+            # Initialize all Pygame modules. 
+            with self.startup_profiler.measure('pygame', 'all modules (pg.init)'): 
+                pg.init() 
         
         # Get display information for screen size. Then, store current screen width and height. 
         self.info = pg.display.Info() 
-        self.screen_width = self.info.current_w 
-        self.screen_height = self.info.current_h 
-
-        # Set up the display screen in fullscreen mode. 
-        self.screen = pg.display.set_mode((self.screen_width, self.screen_height), pg.FULLSCREEN)
+        if canvas_size:
+            # The game is drawn at the canvas size and scaled up to the display once per frame.
+            self.screen_width, self.screen_height = canvas_size
+        elif resolution:
+            self.screen_width, self.screen_height = resolution
+        elif self.headless:
+            self.screen_width, self.screen_height = self.HEADLESS_RESOLUTION
+        else:
+            self.screen_width = self.info.current_w 
+            self.screen_height = self.info.current_h 
+
+        # Set up the display screen in fullscreen mode (a plain surface in headless mode). 
+        display_flags = 0 if self.headless else pg.FULLSCREEN
+        with self.startup_profiler.measure('pygame', 'display mode'): 
+            if canvas_size:
+                # Everything is drawn on the canvas surface. The display keeps the given resolution (or the desktop size).
+                display_size = resolution or (self.HEADLESS_RESOLUTION if self.headless else None)
+                self.render_canvas = RenderCanvas(canvas_size, display_size, scaling=canvas_scaling, display_flags=display_flags)
+                self.screen = self.render_canvas.surface
+            else:
+                self.render_canvas = None
+                self.screen = pg.display.set_mode((self.screen_width, self.screen_height), display_flags)
 
         # Define font path for the display game text. 
         self.font_path = 'GAME_DEV_FINAL/assets/font/bytebounce/ByteBounce.ttf' 
 
+        # Initialize the asset manager. All modules share its images and fonts.
+        self.assets = AssetManager(cache_dir=self.ASSET_CACHE_DIR if use_asset_cache else None, profiler=self.startup_profiler)
+
+        # Load the compiled level pack. It holds every level's background, dialogue and enemies. 
+        with self.startup_profiler.measure('subsystem', 'LevelPack'): 
+            self.levels = load_level_pack(level_pack_path) 
+
         # Initialize level display. 
-        self.game_level = LevelDisplay(self.screen_width, self.screen_height, level_font_size=100, level_text_pos_y=250) 
+        with self.startup_profiler.measure('subsystem', 'LevelDisplay'): 
+            self.game_level = LevelDisplay(self.screen_width, self.screen_height, level_font_size=100, level_text_pos_y=250, assets=self.assets, levels=self.levels) 
         
         # Set initial and maximum game level. 
         self.current_level = 1 
-        self.MAX_LEVEL = 3 
+        self.MAX_LEVEL = self.levels.max_level 
 
         # Set up Game State 
-        self.STATE_MAIN_MENU = 0 
-        self.STATE_LEVEL_DIALOGUE = 1 
-        self.STATE_TUTORIAL_GAMEPLAY = 2 
-        self.STATE_GAMEPLAY = 3 
-        self.STATE_GAME_OVER = 4 
-        self.STATE_GAME_COMPLETED = 5 
-        self.STATE_CREDITS = 6 
+        self.STATE_MAIN_MENU = STATE_MAIN_MENU 
+        self.STATE_LEVEL_DIALOGUE = STATE_LEVEL_DIALOGUE 
+        self.STATE_TUTORIAL_GAMEPLAY = STATE_TUTORIAL_GAMEPLAY 
+        self.STATE_GAMEPLAY = STATE_GAMEPLAY 
+        self.STATE_GAME_OVER = STATE_GAME_OVER 
+        self.STATE_GAME_COMPLETED = STATE_GAME_COMPLETED 
+        self.STATE_CREDITS = STATE_CREDITS 
+        self.STATE_ENDLESS = STATE_ENDLESS 
+
+        # Create one scene for each game state. Each scene handles its own events, updates and drawing, 
+        # and only the scene on top of the scene stack runs. 
+        self.scenes = {scene.state: scene for scene in [MenuScene(self), CreditsScene(self), DialogueScene(self), TutorialScene(self), 
+                                                        GameplayScene(self), EndlessScene(self), GameOverScene(self), GameCompletedScene(self)]} 
 
         # Set initial game state to main menu. 
-        self.game_state = self.STATE_MAIN_MENU 
+        self.scene_stack = SceneStack() 
+        self.scene_stack.push(self.scenes[self.STATE_MAIN_MENU]) 
 
         # Flag to control active gameplay. 
         self.game_active = False 
         
         # Initialize dialogue system. 
-        self.game_dialogue = Dialogue(self.screen_width, self.screen_height) 
+        with self.startup_profiler.measure('subsystem', 'Dialogue'): 
+            self.game_dialogue = Dialogue(self.screen_width, self.screen_height, assets=self.assets, levels=self.levels) 
 
         # Define character size and its position. 
         self.character_size = 90 
@@ -61,206 +165,357 @@ class Goblin_Runner:
         initial_char_y = self.screen_height - 200 
 
         # Initialize character management system. 
-        self.character = Character(self.screen_width, self.screen_height, initial_char_x, initial_char_y, self.character_size) 
-
-        # Initialize enemy management system. 
-        self.enemy_system = Enemy(self.screen_width, self.screen_height, self.MAX_LEVEL) 
-
-        # Create Pygame clock for frame rate control. 
+        with self.startup_profiler.measure('subsystem', 'Character'): 
+            self.character = Character(self.screen_width, self.screen_height, initial_char_x, initial_char_y, self.character_size, assets=self.assets, mirror_frames=mirror_sprites) 
+
+        # Initialize enemy management system. The 'numpy' backend keeps enemies in arrays for large enemy counts. 
+        with self.startup_profiler.measure('subsystem', f'Enemy ({enemy_backend})'): 
+            if enemy_backend == 'numpy': 
+                # Import here so NumPy is only needed when this backend is chosen. 
+                from enemy_array import EnemyArray 
+                self.enemy_system = EnemyArray(self.screen_width, self.screen_height, self.MAX_LEVEL, assets=self.assets, mirror_frames=mirror_sprites, seed=self.seed, levels=self.levels) 
+
+                # Fill level 1 with many enemies to test crowded levels. 
+                if stress_enemies: 
+                    self.enemy_system.add_stress_level(1, stress_enemies) 
+            else: 
+                self.enemy_system = Enemy(self.screen_width, self.screen_height, self.MAX_LEVEL, assets=self.assets, mirror_frames=mirror_sprites, seed=self.seed, levels=self.levels) 
+
+        # Initialize endless mode. Its enemies come from a fixed pool and use the same enemy types as the levels. 
+        # Enemies of a wave are spaced by how far the character runs and jumps. 
+        with self.startup_profiler.measure('subsystem', 'EndlessMode'): 
+            jump_ticks = 2 * -self.character.jump_power // self.character.gravity 
+            self.endless_mode = EndlessMode(self.screen_width, self.screen_height, self.game_level, self.enemy_system, assets=self.assets, seed=self.seed, jump_ticks=jump_ticks, runner_speed=self.character.speed) 
+
+        # Flag to know if the current (or last) run is an endless run. 
+        self.playing_endless = False 
+
+        # Start in endless mode instead of the main menu, if asked. 
+        self.start_in_endless = endless 
+
+        # Create Pygame clock for frame rate control. Headless mode runs as fast as the CPU allows (0 = no limit).
         self.clock = pg.time.Clock() 
+        self.target_fps = 0 if self.headless else 60
 
         # Initialize main menu management system 
-        self.menu = GameMenu(self.screen, self) 
-
-        # Initialize music management system
-        self.audio_manager = Music() 
-        self.audio_manager.play_background_music()
+        with self.startup_profiler.measure('subsystem', 'GameMenu'): 
+            self.menu = GameMenu(self.screen, self, assets=self.assets) 
+
+        # Initialize music management system. Music playback is skipped in headless mode.
+        # The music track is decoded on the music loader thread and starts playing on a later frame.
+        with self.startup_profiler.measure('subsystem', 'Music'): 
+            self.audio_manager = Music(enabled=not self.headless) 
+            self.audio_manager.play_background_music()
+
+        # Initialize sound effect system. The effects are decoded once here, so playing them never loads anything.
+        with self.startup_profiler.measure('subsystem', 'SoundEffects'): 
+            self.sound_effects = SoundEffects(enabled=not self.headless) 
+
+        # In headless mode, input comes from the automatic driver instead of the keyboard and mouse.
+        # A replay feeds back recorded input instead, and a recorder saves the input of this run to a file.
+        if replay_path:
+            self.input_driver = ReplayDriver(replay_path)
+        else:
+            self.input_driver = HeadlessDriver(self) if self.headless else None
+        if record_path:
+            replay_settings = {'enemy_backend': enemy_backend, 'stress_enemies': stress_enemies, 'collision_mode': collision_mode, 'endless': endless}
+            self.input_driver = InputRecorder(record_path, self, source=self.input_driver, settings=replay_settings)
+
+        # In dirty rectangle mode, gameplay only repaints and sends the screen areas that changed.
+        self.dirty_renderer = DirtyRenderer(self.screen) if dirty_rects else None
+
+        # Holds the changed screen areas of the current frame. None means the whole screen is sent.
+        self.dirty_rects = None
+
+        # Remember the state drawn in the last frame to know when the whole screen must be redrawn.
+        self.last_drawn_state = None
+
+        # Screens that only change on input (menus, end screens, fully shown dialogue) are drawn once and left on the display.
+        # Remember what the shown screen depends on, and if the last frame was skipped because nothing changed.
+        self.static_frame_key = None
+        self.idle = False
+
+        # While idle, wait for real input instead of running frames. Headless runs and replays never wait.
+        self.waits_for_input = not self.headless and not replay_path
+
+        # Times every phase of each frame. F3 shows or hides the timing overlay. 
+        self.frame_profiler = FrameProfiler(font=self.assets.load_font(self.font_path, 36), trace_path=trace_path) 
+        if show_frame_profiler: 
+            self.frame_profiler.toggle_overlay() 
+
+        # Stores real time that has passed but has not been simulated yet (in seconds).
+        self.accumulator = 0.0
+
+        # Counts rendered frames and measures the frame rate of the last run.
+        self.frame_count = 0
+        self.frames_per_second = 0.0
 
         # Set up timer to prevent fast level changes. 
         self.level_transition_cooldown = 0 
 
-        # Adjusts character's collision box size. 
+        # Adjusts character's collision box size (used by the 'rect' collision mode). 
         self.collision_offset = 50
 
-        pg.display.flip() 
-
-    def run_game(self): 
-        # Control Main Game Loop. 
+        # Set how collisions are checked: 'mask' compares the real pixels of the sprites after a rect check, 
+        # 'rect' only compares the character's shrunken box with the enemy boxes. 
+        self.collision_mode = collision_mode
+
+        if self.start_in_endless: 
+            self.start_endless() 
+
+        self.present_frame() 
+
+        # Startup ends with the first frame on screen. Print the timing report if it was asked for.
+        self.startup_profiler.finish()
+        if profile_startup:
+            print(self.startup_profiler.report(budget_ms=self.startup_budget_ms))
+
+    @property 
+    def game_state(self): 
+        # The state of the scene on top of the scene stack. 
+        return self.scene_stack.top.state 
+
+    @game_state.setter 
+    def game_state(self, state): 
+        # Setting the game state shows the scene of that state instead of every scene on the stack. 
+        self.switch_scene(state) 
+
+    def switch_scene(self, state): 
+        # Replaces every scene on the scene stack with the scene of the given state. 
+        self.scene_stack.switch(self.scenes[state]) 
+
+    def is_over_startup_budget(self): 
+        # Returns True if a startup time budget was given and the startup took longer. 
+        return self.startup_budget_ms is not None and self.startup_profiler.get_total_time() * 1000 > self.startup_budget_ms 
+
+    def get_events(self):
+        # Returns this frame's events from the input driver (headless, replay or recorder) or from Pygame.
+        if self.input_driver:
+            return self.input_driver.get_events()
+        return self.get_real_events()
+
+    def get_real_events(self):
+        # Returns the Pygame events, with mouse positions on the render canvas if there is one.
+        if self.render_canvas:
+            return self.render_canvas.map_events(pg.event.get())
+        return pg.event.get()
+
+    def get_pressed_keys(self):
+        # Returns the currently held keys from the input driver or from the keyboard.
+        if self.input_driver:
+            return self.input_driver.get_pressed_keys()
+        return pg.key.get_pressed()
+
+    def get_mouse_position(self):
+        # Returns the mouse position from the input driver or from the real mouse.
+        if self.input_driver:
+            return self.input_driver.get_mouse_position()
+        return self.get_real_mouse_position()
+
+    def get_real_mouse_position(self):
+        # Returns the real mouse position, on the render canvas if there is one.
+        if self.render_canvas:
+            return self.render_canvas.to_canvas(pg.mouse.get_pos())
+        return pg.mouse.get_pos()
+
+    def run_game(self, max_frames=None): 
+        # Control Main Game Loop. If max_frames is given, the loop stops after that many frames.
         running = True 
+        self.frame_count = 0
+        start_time = time.perf_counter()
+
+        # Forget any real time that was not simulated before this run.
+        self.accumulator = 0.0
+
+        # Restart the clock so the first frame does not count the startup time.
+        self.clock.tick()
         
         while running: 
-            # Get all Pygame events. 
-            events = pg.event.get() 
+            running = self.run_frame() 
+
+            # Stop if the frame limit is reached.
+            if max_frames is not None and self.frame_count >= max_frames:
+                running = False
+
+        # Calculate and report the average frame rate of this run.
+        elapsed_seconds = time.perf_counter() - start_time
+        self.frames_per_second = self.frame_count / elapsed_seconds if elapsed_seconds > 0 else 0.0
+        if self.headless:
+            print(f"Simulated {self.frame_count} frames in {elapsed_seconds:.2f} s ({self.frames_per_second:.1f} FPS)")
+            print(self.assets.report())
+            collision_stats = self.enemy_system.get_collision_stats()
+            print(f"Collisions: {collision_stats['queries']} queries, {collision_stats['candidates_per_query']:.2f} candidates per query, "
+                  f"{collision_stats['colliding_pairs']} rect hits, {collision_stats['mask_checks']} mask checks, "
+                  f"{collision_stats['mask_hits']} mask hits")
+            if self.endless_mode.spawned:
+                endless_stats = self.endless_mode.get_stats()
+                print(f"Endless: {endless_stats['spawned']} enemies spawned, {endless_stats['recycled']} recycled, "
+                      f"{endless_stats['peak_active']} of {endless_stats['pool_size']} pooled enemies in use at most, "
+                      f"best distance {self.endless_mode.best_distance} m")
+
+        # Write the recorded frame phases for chrome://tracing or Perfetto. 
+        if self.frame_profiler.trace_path: 
+            event_count = self.frame_profiler.export_trace() 
+            print(f"Wrote {event_count} trace events to {self.frame_profiler.trace_path}") 
+
+        if self.input_driver:
+            self.input_driver.close()
+        self.assets.shutdown()
+        self.audio_manager.quit_mixer()
+        pg.quit() 
+        sys.exit() 
 
-            for event in events: 
-                if event.type == pg.QUIT: 
-                    running = False 
-                
-                # If a key is pressed down and pressed 'q', the game will exit 
-                elif event.type == pg.KEYDOWN: 
-                    if event.key == pg.K_q: 
-                        running = False 
-                    
-                    # If Spacebar is pressed, the following decision will be made. 
-                    elif event.key == pg.K_SPACE: 
-
-                        # If dialogue is active, appear dialogue text 
-                        if self.game_dialogue.is_dialogue_active(): 
-
-                            # Advance dialogue, if it ends. 
-                            if not self.game_dialogue.advance_dialogue(): 
-                                
-                                # If Level 1 dialogue finished, proceed to tutorial 
-                                if self.game_dialogue.last_dialogue_level_completed == 1: 
-                                    self.game_state = self.STATE_TUTORIAL_GAMEPLAY 
-                                    self.game_level.start_tutorial() 
-                                    self.game_dialogue.last_dialogue_level_completed = None 
-
-                                # If Level 2 or 3 dialogue finished, gameplay will activate and start enemy movement. 
-                                elif self.game_dialogue.last_dialogue_level_completed in [2, 3]: 
-                                    self.game_state = self.STATE_GAMEPLAY 
-                                    self.game_active = True 
-                                    self.level_transition_cooldown = self.game_dialogue.COOLDOWN_FRAMES 
-                                    self.enemy_system.start_movement_for_level(self.current_level) 
-                                
-                                # If game completion dialogue finished, return to main menu. 
-                                elif self.game_dialogue.last_dialogue_level_completed == 4: 
-                                    self.reset_game_for_menu() 
-                        
-                        # If game over or completed, return to main menu. 
-                        elif self.game_state in [self.STATE_GAME_OVER, self.STATE_GAME_COMPLETED]: 
-                            self.reset_game_for_menu() 
-
-                        # If in tutorial or gameplay, make character jump. 
-                        elif self.game_state in [self.STATE_TUTORIAL_GAMEPLAY, self.STATE_GAMEPLAY]: 
-                            self.character.jump() 
-            
-            # If in main menu, handle menu interactions and draw its elements 
-            if self.game_state == self.STATE_MAIN_MENU: 
-                self.menu.handle_events(events) 
-                self.menu.draw() 
-            
-            # If in level dialogue, draw level background and dialogue box and text. 
-            elif self.game_state == self.STATE_LEVEL_DIALOGUE: 
-                self.game_level.draw_background(self.screen, self.current_level) 
-                self.game_dialogue.draw_dialogue(self.screen) 
-            
-            # If in tutorial, draw Level 1 background. 
-            elif self.game_state == self.STATE_TUTORIAL_GAMEPLAY: 
-                self.game_level.draw_background(self.screen, self.current_level) 
+    def run_frame(self): 
+        # Runs one frame of the game loop: input, fixed simulation ticks, drawing and presenting. 
+        # Returns False when the player asked to quit. 
+        running = True 
+        self.frame_profiler.begin_frame() 
 
-                # Get currently pressed keys. 
-                keys = pg.key.get_pressed() 
+        # If nothing changed in the last frame, sleep until input arrives instead of drawing the same screen again. 
+        if self.idle and self.waits_for_input: 
+            with self.frame_profiler.measure('wait'): 
+                self.wait_for_input()
 
-                # Update character movement and animation and draw character.. 
-                self.character.update(keys) 
-                self.character.draw(self.screen) 
-                
-                # Update and draw tutorial. 
-                tutorial_completed = self.game_level.update_and_draw_tutorial(self.screen, keys) 
-
-                # If tutorial is finished, activate gameplay and start enemy movement. 
-                if tutorial_completed: 
-                    self.game_state = self.STATE_GAMEPLAY 
-                    self.game_active = True  
-                    self.level_transition_cooldown = self.game_dialogue.COOLDOWN_FRAMES 
-                    self.enemy_system.start_movement_for_level(self.current_level) 
-
-            # If game is over, draw game over screen. 
-            elif self.game_state == self.STATE_GAME_OVER: 
-                self.game_level.draw_game_over_screen(self.screen) 
-            
-            # If game is completed, draw game completion screen like thank you message. 
-            elif self.game_state == self.STATE_GAME_COMPLETED: 
-                self.game_level.draw_thank_you_screen(self.screen) 
-            
-            # If in credits screen, allow menu to handle events and draw credits. 
-            elif self.game_state == self.STATE_CREDITS: 
-                self.menu.handle_events(events) 
-                self.menu.draw_credits_screen() 
+                # Restart the clock, so the time spent asleep is not simulated. Otherwise an event that starts
+                # gameplay (like SPACE on a finished dialogue page) would run up to IDLE_WAIT_MS of catch-up ticks at once.
+                self.clock.tick()
 
-            # If in active gameplay, update character and get pressed keys. 
-            elif self.game_state == self.STATE_GAMEPLAY:
-                
-                # If cooldown is active, decrease cooldown timer. 
-                if self.level_transition_cooldown > 0: 
-                    self.level_transition_cooldown -= 1
+        # Get all Pygame events. 
+        with self.frame_profiler.measure('events'): 
+            events = self.get_events() 
 
-                keys = pg.key.get_pressed()
-                self.character.update(keys)
+        for event in events: 
+            if event.type == pg.QUIT: 
+                running = False 
+            
+            # If a key is pressed down and pressed 'q', the game will exit 
+            elif event.type == pg.KEYDOWN and event.key == pg.K_q: 
+                running = False 
+
+            # F3 shows or hides the frame timing overlay. The whole screen is redrawn to remove it. 
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F3: 
+                self.frame_profiler.toggle_overlay() 
+                self.menu.invalidate() 
+                if self.dirty_renderer: 
+                    self.dirty_renderer.invalidate() 
                 
-                # If within valid gameplay levels, update enemy. 
-                if self.current_level <= self.MAX_LEVEL: 
-                    self.enemy_system.update(self.current_level, self.character.rect) 
-
-                    # Create smaller collision rect for character. 
-                    shrunk_char_rect = self.character.rect.inflate(-self.collision_offset * 2, -self.collision_offset * 2) 
-
-                    # Get enemy collision rectangles. 
-                    enemy_rects_for_level = self.enemy_system.get_current_enemy_rects(self.current_level)
+            # Every other event (like SPACE or a mouse click) goes to the scene on top of the stack only. 
+            else: 
+                self.scene_stack.top.handle_event(event) 
+        
+        with self.frame_profiler.measure('events'): 
+            # Get currently pressed keys. 
+            keys = self.get_pressed_keys() 
+
+        # Measure how much real time passed since the last frame. Headless runs always advance exactly one tick.
+        with self.frame_profiler.measure('wait'): 
+            frame_time = self.clock.tick(self.target_fps) / 1000
+        if self.headless:
+            frame_time = self.TICK_SECONDS
+
+        # A replay uses the recorded frame time instead, so every frame runs the same number of ticks.
+        if self.input_driver:
+            frame_time = self.input_driver.get_frame_time(frame_time)
+
+        # Run the physics and animation in fixed ticks, no matter how long the frame took.
+        if self.scene_stack.top.fixed_ticks: 
+            # Limit the catch-up after a very long frame so the game does not freeze trying to simulate it.
+            self.accumulator += min(frame_time, self.MAX_FRAME_TIME)
+
+            while self.accumulator >= self.TICK_SECONDS and self.scene_stack.top.fixed_ticks: 
+                self.update_simulation(keys)
+                self.accumulator -= self.TICK_SECONDS
+        else:
+            # Other scenes update once per frame.
+            self.accumulator = 0.0
+            self.scene_stack.top.update(frame_time)
+
+        # A static screen that is already on the display is not drawn or presented again until input or a state change. 
+        static_frame_key = self.get_static_frame_key() 
+        self.idle = static_frame_key is not None and static_frame_key == self.static_frame_key and not events 
+        self.static_frame_key = static_frame_key 
+
+        if not self.idle: 
+            # Draw the frame, blending character and enemy positions between the last two ticks.
+            self.draw_frame(keys, self.accumulator / self.TICK_SECONDS)
+
+            # Draw the timing overlay on top. With dirty rectangles, its area is sent to the screen too. 
+            with self.frame_profiler.measure('overlay'): 
+                overlay_rect = self.frame_profiler.draw_overlay(self.screen) 
+                if overlay_rect and self.dirty_rects is not None: 
+                    self.dirty_rects.append(overlay_rect) 
+
+            with self.frame_profiler.measure('present'): 
+                self.present_frame() 
+
+        # Start a newly requested music track if its loader thread has finished decoding it. 
+        self.audio_manager.update() 
+        self.frame_profiler.end_frame()
+
+        # Count the frame. 
+        self.frame_count += 1 
+        return running 
+
+    def get_static_frame_key(self): 
+        # Returns everything the current screen depends on if it only changes on input, or None if it must be drawn every frame. 
+        # The frame timing overlay changes all the time, so no screen is static while it is shown. 
+        if self.frame_profiler.overlay_visible: 
+            return None 
+        return self.scene_stack.top.get_static_frame_key() 
+
+    def wait_for_input(self): 
+        # Blocks until an event arrives or IDLE_WAIT_MS passes, using no CPU while waiting. 
+        # The event is put back in the queue, so the input driver reads it like any other event. 
+        event = pg.event.wait(self.IDLE_WAIT_MS) 
+        if event.type != pg.NOEVENT: 
+            pg.event.post(event) 
+
+    def update_simulation(self, keys): 
+        # Advances the scene on top of the stack (tutorial, gameplay or endless mode) by one fixed tick. 
+        self.scene_stack.top.tick(keys) 
+
+    def load_level_assets(self, level): 
+        # Loads the background and enemies of a level if they are not loaded yet. 
+        self.game_level.load_level(level) 
+        self.enemy_system.load_level(level) 
+
+    def play_level_music(self, level): 
+        # Crossfades to the music of a level, or to the background music if the level has none. 
+        music_path = self.levels.get_music(level) if level in self.levels else None 
+        if music_path: 
+            self.audio_manager.play_track(music_path) 
+        else: 
+            self.audio_manager.play_background_music() 
+
+    def prefetch_level_assets(self, level): 
+        # Starts reading the background and enemy images of a level on the asset prefetch thread. 
+        self.game_level.prefetch_level(level) 
+        self.enemy_system.prefetch_level(level) 
+
+    def present_frame(self): 
+        # Shows the drawn frame. Only the changed areas are sent if the frame was drawn with dirty rectangles.
+        # With a render canvas, the canvas is scaled to the display here, once per frame.
+        if self.render_canvas: 
+            self.render_canvas.present(self.dirty_rects) 
+            self.dirty_rects = None 
+        elif self.dirty_rects is not None: 
+            pg.display.update(self.dirty_rects) 
+            self.dirty_rects = None 
+        else: 
+            pg.display.flip() 
 
-                    # Check each enemy for collision. 
-                    for enemy_rect in enemy_rects_for_level: 
+    def draw_frame(self, keys, alpha): 
+        # Draws the current game state. Alpha (0.0 to 1.0) is how far the frame is between the last two ticks.
 
-                        # If character collides with enemy, set the game to game over and stop checking for more collisions. 
-                        if shrunk_char_rect.colliderect(enemy_rect): 
-                            self.game_state = self.STATE_GAME_OVER
-                            self.game_active = False
-                            self.audio_manager.stop_music()
-                            break 
-                
-                # Checks if not on cooldown and still within game levels
-                if self.current_level <= self.MAX_LEVEL and self.level_transition_cooldown <= 0:
-
-                    # If character moves off right side and still no reach the last level, advance to next level.
-                    if self.character.rect.right >= self.screen_width:
-                        if self.current_level < self.MAX_LEVEL:
-                            self.current_level += 1 
-
-                            # Start new dialogue in each level.
-                            self.game_dialogue.set_level_dialogue(self.current_level) 
-                            self.game_dialogue.start_dialogue() 
-                            self.game_state = self.STATE_LEVEL_DIALOGUE 
-                            self.game_active = False 
-
-                            # Reset cooldown. 
-                            self.level_transition_cooldown = self.game_dialogue.COOLDOWN_FRAMES 
-
-                            # Reset character X position and enemy's position for new level.
-                            self.character.rect.x = 5 
-                            self.enemy_system.reset_for_level(self.current_level) 
-
-                        else:  
-                            # If it's the last level, set game to completed and deactivate gameplay. 
-                            self.game_state = self.STATE_GAME_COMPLETED  
-                            self.game_active = False 
-                            
-                            # Keep character on screen and reset all enemies. 
-                            self.character.rect.right = self.screen_width  
-                            self.enemy_system.reset_all_enemies() 
-
-                    # If character moves off left side, prevent going to previous level.
-                    elif self.character.rect.left <= 0: 
-                        # Keep character on screen at the left edge.
-                        self.character.rect.left = 1 
-                                
-                # Draw background images in each levels. 
-                self.game_level.draw_background(self.screen, self.current_level) 
-                
-                # If within specified gameplay levels, draw character and enemy. 
-                if self.current_level <= self.MAX_LEVEL: 
-                    self.character.draw(self.screen) 
-                    self.enemy_system.draw(self.screen, self.current_level) 
-                
-                # Draw level text. 
-                self.game_level.draw_level_text(self.screen, self.current_level) 
-            
-            pg.display.flip() 
-            self.clock.tick(60) 
+        # If another screen was shown since the last frame, the dirty renderer and the menu screens must redraw everything.
+        if self.game_state != self.last_drawn_state: 
+            self.menu.invalidate() 
+            if self.dirty_renderer: 
+                self.dirty_renderer.invalidate() 
+        self.last_drawn_state = self.game_state 
 
-        self.audio_manager.quit_mixer()
-        pg.quit() 
-        sys.exit() 
+        # Each scene times its drawing steps as frame phases: 'background', 'sprites', 'text' or 'ui' (menu screens). 
+        self.scene_stack.top.draw(keys, alpha) 
 
     def start_game(self): 
         # Start the game through dialogue first.
@@ -270,7 +525,11 @@ class Goblin_Runner:
         self.game_dialogue.start_dialogue() 
 
         # Set game state to dialogue. 
-        self.game_state = self.STATE_LEVEL_DIALOGUE 
+        self.switch_scene(self.STATE_LEVEL_DIALOGUE) 
+
+        # Read the next level's images in the background while the player reads the dialogue. 
+        self.prefetch_level_assets(self.current_level + 1) 
+        self.play_level_music(self.current_level) 
 
         # Deactivate gameplay for dialogue. 
         self.game_active = False 
@@ -279,18 +538,45 @@ class Goblin_Runner:
         self.character.rect.x = 160 
         self.character.rect.y = self.screen_height - 200 
         self.character.update({pg.K_a: 0, pg.K_d: 0})  
+        self.character.snap_position()
         
         # Reset all enemies in each levels. 
         self.enemy_system.reset_all_enemies() 
 
         # Reset cooldown and tutorial state 
         self.level_transition_cooldown = 0 
-        self.game_level.reset_tutorial() 
+        self.game_level.reset_tutorial(self.get_pressed_keys()) 
+
+    def start_endless(self): 
+        # Start an endless run, skipping dialogue and tutorial. 
+        self.menu.menu_active = False 
+        self.playing_endless = True 
+
+        # Load the backgrounds and enemies of every level, then start the world from the beginning. 
+        self.endless_mode.load() 
+        self.endless_mode.reset() 
+        self.audio_manager.play_background_music() 
+
+        # Reset character position and set character to idle. 
+        self.character.rect.x = 160 
+        self.character.rect.y = self.screen_height - 200 
+        self.character.update({pg.K_a: 0, pg.K_d: 0}) 
+        self.character.snap_position() 
+
+        # Everything loaded so far lives for the whole session. Collect it once and move it out of the 
+        # garbage collector's way, so later collections during the run only look at new objects. 
+        gc.collect() 
+        gc.freeze() 
+
+        # Set game state to endless mode and activate gameplay. 
+        self.switch_scene(self.STATE_ENDLESS) 
+        self.game_active = True 
 
     def reset_game_for_menu(self): 
         # Reset to level 1 and Deactivate gameplay and dialogue. 
         self.current_level = 1 
         self.game_active = False 
+        self.playing_endless = False 
         self.game_dialogue.dialogue_active = False 
 
         # Reset dialogue in game levels. 
@@ -302,19 +588,81 @@ class Goblin_Runner:
         self.character.rect.x = 160 
         self.character.rect.y = self.screen_height - 220 
         self.character.update({pg.K_a: 0, pg.K_d: 0}) 
+        self.character.snap_position()
 
         # Reset all enemies. 
         self.enemy_system.reset_all_enemies() 
 
         # Reset cooldown and tutorial state 
         self.level_transition_cooldown = 0 
-        self.game_level.reset_tutorial() 
+        self.game_level.reset_tutorial(self.get_pressed_keys()) 
         
         # Set game state to main menu and activate the menu. 
-        self.game_state = self.STATE_MAIN_MENU 
+        self.switch_scene(self.STATE_MAIN_MENU) 
         self.menu.menu_active = True 
 
+        # Start the background music again (it stops when the character dies). 
+        self.audio_manager.play_background_music() 
+
+def parse_resolution(value):
+    # Turns a "WIDTHxHEIGHT" string into a (width, height) tuple.
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
 if __name__ == '__main__': 
+    # Read the command line options.
+    parser = argparse.ArgumentParser(description='Goblin Runner')
+    parser.add_argument('--headless', action='store_true', help='run without a window or sound and play automatically as fast as possible')
+    parser.add_argument('--frames', type=int, default=None, help='stop after this many frames')
+    parser.add_argument('--resolution', type=parse_resolution, default=None, help='screen size as WIDTHxHEIGHT')
+    parser.add_argument('--dirty-rects', action='store_true', help='during gameplay, only redraw and update the screen areas that changed')
+    parser.add_argument('--enemy-backend', choices=['dict', 'numpy'], default='dict', help='how enemy data is stored and updated')
+    parser.add_argument('--stress-enemies', type=int, default=0, help='fill level 1 with this many enemies (needs --enemy-backend numpy)')
+    parser.add_argument('--collision', choices=['mask', 'rect'], default='mask', help='check collisions with pixel masks or with shrunken boxes')
+    parser.add_argument('--no-asset-cache', action='store_true', help='always decode and scale images instead of using the disk cache')
+    parser.add_argument('--frame-profiler', action='store_true', help='show the frame timing overlay from the start (F3 toggles it)')
+    parser.add_argument('--trace', default=None, metavar='FILE', help='write every frame phase to a Chrome/Perfetto trace-event JSON file')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the random enemy directions (random if not given)')
+    parser.add_argument('--record', default=None, metavar='FILE', help='record the input of this run into a replay file')
+    parser.add_argument('--replay', default=None, metavar='FILE', help='play a recorded replay file instead of reading the keyboard and mouse')
+    parser.add_argument('--profile-startup', action='store_true', help='print how long each part of the startup took')
+    parser.add_argument('--minimal-init', action='store_true', help='only start the Pygame modules the game uses (display, font and mixer) instead of pg.init()')
+    parser.add_argument('--startup-budget', type=float, default=None, metavar='MS', help='exit with an error if startup takes longer than this many milliseconds (turns on --profile-startup)')
+    parser.add_argument('--no-mirror-sprites', action='store_true', help='load the left-facing sprite images from their own files instead of flipping the right-facing ones')
+    parser.add_argument('--endless', action='store_true', help='start in endless mode instead of the main menu')
+    parser.add_argument('--canvas', type=parse_resolution, default=None, metavar='WIDTHxHEIGHT', help='draw the game at this size and scale it up to the display once per frame (like 1920x1080 on a 4K display)')
+    parser.add_argument('--canvas-scaling', choices=RenderCanvas.SCALING_MODES, default='scaled', help="how the canvas is scaled: 'scaled' by SDL on the GPU, or 'integer' by whole-number nearest-neighbour steps")
+    parser.add_argument('--level-pack', default=LEVEL_PACK_PATH, metavar='FILE', help='compiled level pack to play (made with level_pack.py)')
+    args = parser.parse_args()
+
+    # Only the NumPy enemy backend can fill a level with stress-test enemies.
+    if args.stress_enemies and args.enemy_backend != 'numpy':
+        parser.error('--stress-enemies needs --enemy-backend numpy')
+
+    # Stop with a usage error if the game's layout or the display cannot fit the canvas.
+    if args.canvas:
+        display_size = args.resolution or (Goblin_Runner.HEADLESS_RESOLUTION if args.headless else None)
+        try:
+            check_canvas_size(args.canvas, display_size, args.canvas_scaling)
+        except ValueError as error:
+            parser.error(str(error))
+
     # Create a new game instance and run it. 
-    game = Goblin_Runner() 
-    game.run_game()
+    game = Goblin_Runner(headless=args.headless, resolution=args.resolution, 
+                         use_asset_cache=not args.no_asset_cache, dirty_rects=args.dirty_rects, 
+                         enemy_backend=args.enemy_backend, stress_enemies=args.stress_enemies, 
+                         collision_mode=args.collision, mirror_sprites=not args.no_mirror_sprites, 
+                         profile_startup=args.profile_startup or args.startup_budget is not None, 
+                         minimal_init=args.minimal_init, startup_budget_ms=args.startup_budget, 
+                         show_frame_profiler=args.frame_profiler, trace_path=args.trace, 
+                         seed=args.seed, record_path=args.record, replay_path=args.replay, 
+                         level_pack_path=args.level_pack, endless=args.endless, 
+                         canvas_size=args.canvas, canvas_scaling=args.canvas_scaling) 
+
+    # Stop with an error code if the startup was too slow, so build machines can enforce the budget. 
+    if game.is_over_startup_budget(): 
+        game.assets.shutdown() 
+        pg.quit() 
+        sys.exit(1) 
+
+    game.run_game(max_frames=args.frames)
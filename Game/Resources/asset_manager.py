@@ -0,0 +1,397 @@
+# ASSET MANAGEMENT SYSTEM
+
+import pygame as pg
+import hashlib
+import io
+import json
+import mmap
+import os
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from sprite_atlas import SpriteAtlas
+from text_cache import TextCache
+
+class AssetManager:
+    # Flags that change how an image is prepared. They are part of the cache key.
+    OPAQUE = 0  # Convert to the display format without transparency (backgrounds).
+    ALPHA = 1   # Convert to the display format and keep per-pixel transparency (sprites).
+    FLIP_X = 2  # Mirror the image left to right (before scaling, so it matches a mirrored copy of the file).
+
+    # Raw pixel byte orders that Pygame can both write and read back with frombuffer().
+    RAW_PIXEL_FORMATS = ('BGRA', 'RGBA', 'ARGB', 'ABGR')
+
+    def __init__(self, cache_dir=None, profiler=None):
+        # Optional StartupProfiler that times every image, atlas and font that has to be loaded.
+        self.profiler = profiler
+
+        # Store every loaded image under its (path, size, flags) key.
+        self.images = {}
+
+        # Store every packed sprite atlas under its (name, image keys) key.
+        self.atlases = {}
+
+        # Folder for already scaled, display-format pixel data. None turns the disk cache off.
+        self.cache_dir = cache_dir
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Byte order of the display's pixels, found the first time the disk cache is used.
+        self._raw_pixel_format = None
+
+        # Store every opened font under its (path, size) key.
+        self.fonts = {}
+
+        # Store the collision mask made for each loaded image, together with the image it belongs to.
+        self.masks = {}
+
+        # Keep recently rendered text surfaces so repeated text is not rasterized every frame.
+        self.text_cache = TextCache()
+
+        # Count how many requests were served from the cache (hits) or had to be loaded (misses).
+        self.hits = 0
+        self.misses = 0
+
+        # Count how many images were read from the disk cache or had to be decoded and scaled.
+        self.disk_hits = 0
+        self.disk_misses = 0
+
+        # Images and atlases being read on the prefetch thread: {image or atlas key: future}.
+        self.prefetching = {}
+        self.prefetch_executor = None
+
+        # Count prefetched assets that were ready when needed, and those the main thread had to wait for.
+        self.prefetch_hits = 0
+        self.prefetch_waits = 0
+
+    def load_image(self, path, size=None, flags=ALPHA):
+        # Returns the image at path, converted to the display format and scaled to size (width, height).
+        # The same surface is returned to every caller asking for the same path, size and flags.
+        key = (path, size, flags)
+        image = self.images.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+
+        self.misses += 1
+
+        # Use the image read by the prefetch thread if there is one. Otherwise read it now.
+        with self._profile('image', path):
+            read_image = self._take_prefetched(key)
+            if read_image is None:
+                read_image = self._read_image(path, size, flags)
+
+            image = self._finish_image(flags, *read_image)
+        self.images[key] = image
+        return image
+
+    def load_atlas(self, name, image_keys):
+        # Packs the images for a list of (path, size, flags) keys into one atlas surface and returns the SpriteAtlas.
+        # Afterwards, load_image() with any of these keys returns that frame's sub-rect of the atlas.
+        image_keys = list(dict.fromkeys(image_keys))
+        atlas_key = (name, tuple(image_keys))
+        atlas = self.atlases.get(atlas_key)
+        if atlas is not None:
+            self.hits += 1
+            return atlas
+
+        self.misses += 1
+
+        # Use the atlas read by the prefetch thread if there is one. Otherwise read it now.
+        with self._profile('atlas', f"{name} ({len(image_keys)} frames)"):
+            read_atlas = self._take_prefetched(atlas_key)
+            if read_atlas is None:
+                read_atlas = self._read_atlas(name, image_keys)
+
+            atlas = self._finish_atlas(name, image_keys, *read_atlas)
+
+        # Share the atlas frames with every later load_image() call.
+        self.images.update(atlas.frames)
+        self.atlases[atlas_key] = atlas
+        return atlas
+
+    def prefetch_images(self, image_keys):
+        # Starts reading and scaling images of (path, size, flags) keys on the prefetch thread.
+        # load_image() later only has to convert them, or waits for the thread if it is not done yet.
+        for key in image_keys:
+            if key not in self.images and key not in self.prefetching:
+                self.prefetching[key] = self._submit_prefetch(self._read_image, *key)
+
+    def prefetch_atlas(self, name, image_keys):
+        # Starts reading an atlas (from the disk cache, or frame by frame) on the prefetch thread.
+        # load_atlas() with the same name and keys later picks it up.
+        image_keys = list(dict.fromkeys(image_keys))
+        atlas_key = (name, tuple(image_keys))
+        if atlas_key not in self.atlases and atlas_key not in self.prefetching:
+            self.prefetching[atlas_key] = self._submit_prefetch(self._read_atlas, name, image_keys)
+
+    def shutdown(self):
+        # Stops the prefetch thread. Prefetches that have not started yet are dropped.
+        if self.prefetch_executor is not None:
+            self.prefetch_executor.shutdown(wait=True, cancel_futures=True)
+            self.prefetch_executor = None
+        self.prefetching.clear()
+
+    def _profile(self, category, name):
+        # Times a load with the profiler, if there is one.
+        return self.profiler.measure(category, name) if self.profiler else nullcontext()
+
+    def _submit_prefetch(self, read_function, *args):
+        # Runs a read function on the prefetch thread. The thread is started the first time it is needed.
+        # The display's pixel format is found here first, because only the main thread may use the display.
+        if self.cache_dir:
+            self._get_raw_pixel_format()
+        if self.prefetch_executor is None:
+            self.prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='asset-prefetch')
+        return self.prefetch_executor.submit(read_function, *args)
+
+    def _take_prefetched(self, key):
+        # Returns what the prefetch thread read for key, or None if key was never prefetched.
+        # If the thread is not done with it yet, this waits for it (the blocking fallback).
+        future = self.prefetching.pop(key, None)
+        if future is None:
+            return None
+
+        if future.done():
+            self.prefetch_hits += 1
+        else:
+            self.prefetch_waits += 1
+
+        try:
+            return future.result()
+        except Exception:
+            # Read it again on the main thread, so an error (like a missing file) is raised where the asset is used.
+            return None
+
+    def _read_image(self, path, size, flags):
+        # Reads an image and scales it, without converting it to the display format.
+        # Nothing here touches the display, so it can run on the prefetch thread.
+        # Returns the image, the disk cache file to save it to (or None) and if it came from the disk cache.
+        if not self.cache_dir or size is None:
+            return self._decode_image(path, size, flags), None, False
+
+        # The cache file name holds the source file's hash, the target size and the pixel format,
+        # so a changed image, a different resolution or another display format all get their own file.
+        with open(path, 'rb') as source_file:
+            source_bytes = source_file.read()
+
+        pixel_format = self._get_raw_pixel_format()
+        source_hash = hashlib.sha1(source_bytes).hexdigest()
+        kind = ('alpha' if flags & self.ALPHA else 'opaque') + ('_flipped' if flags & self.FLIP_X else '')
+        cache_path = os.path.join(self.cache_dir, f"{source_hash}_{size[0]}x{size[1]}_{pixel_format}_{kind}.raw")
+
+        # Memory-map the cached pixels. No PNG decoding or scaling. The surface reads the map directly, but only until
+        # _finish_image() converts it, which copies the pixels. The map is then freed with the unconverted surface.
+        if os.path.exists(cache_path):
+            with open(cache_path, 'rb') as cache_file:
+                pixels = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(pixels) == size[0] * size[1] * 4:
+                return pg.image.frombuffer(pixels, size, pixel_format), None, True
+            pixels.close()
+
+        # Not cached yet (or the file is broken): decode and scale, then save the pixels after converting.
+        return self._decode_image(io.BytesIO(source_bytes), size, flags, namehint=path), cache_path, False
+
+    def _finish_image(self, flags, image, cache_path, from_disk_cache):
+        # Converts an image from _read_image() to the display format, so blitting it later needs no conversion.
+        # This must run on the main thread. New images are also saved to the disk cache for the next launch.
+        image = self._convert_image(image, flags)
+        if from_disk_cache:
+            self.disk_hits += 1
+        elif cache_path:
+            self.disk_misses += 1
+
+            # Write to a temporary file first so a crash never leaves a half-written cache file.
+            temporary_path = cache_path + '.tmp'
+            with open(temporary_path, 'wb') as cache_file:
+                cache_file.write(pg.image.tobytes(image, self._get_raw_pixel_format()))
+            os.replace(temporary_path, cache_path)
+        return image
+
+    def _read_atlas(self, name, image_keys):
+        # Reads the whole atlas from the disk cache in one go, or decodes and scales every frame. Nothing is
+        # converted, so it can run on the prefetch thread. Returns (atlas surface, frame rects) for a cached atlas,
+        # or (None, {frame key: image}) for decoded frames.
+        if self.cache_dir:
+            cached_atlas = self._read_atlas_from_disk_cache(name, image_keys)
+            if cached_atlas is not None:
+                return cached_atlas
+
+        # Each file is decoded at most once per atlas, even when both the image and its mirrored version are in it.
+        source_images = {}
+        frames = {}
+        for path, size, flags in image_keys:
+            source_key = (path, flags & ~self.FLIP_X)
+            if source_key not in source_images:
+                source_images[source_key] = self._decode_image(path, None, source_key[1])
+            frames[(path, size, flags)] = self._transform_image(source_images[source_key], size, flags)
+        return None, frames
+
+    def _finish_atlas(self, name, image_keys, cached_surface, frames):
+        # Turns what _read_atlas() returned into a display-format SpriteAtlas. This must run on the main thread.
+        if cached_surface is not None:
+            self.disk_hits += 1
+            return SpriteAtlas(cached_surface.convert_alpha(), frames)
+
+        # Frames that are already loaded are reused. The others are converted, then all are packed.
+        images = {key: self.images.get(key) or self._convert_image(image, key[2]) for key, image in frames.items()}
+        atlas = SpriteAtlas.pack(images)
+        if self.cache_dir:
+            self.disk_misses += 1
+            self._save_atlas_to_disk_cache(name, image_keys, atlas)
+        return atlas
+
+    def _get_atlas_cache_path(self, name, image_keys):
+        # Returns the cache file path (without extension) for an atlas.
+        # The name is built from the file size and change time of every source image instead of its contents,
+        # so a cached atlas is found without opening a single PNG file.
+        fingerprint = hashlib.sha1(self._get_raw_pixel_format().encode())
+        for path, size, flags in image_keys:
+            source_stat = os.stat(path)
+            fingerprint.update(repr((path, size, flags, source_stat.st_size, source_stat.st_mtime_ns)).encode())
+        return os.path.join(self.cache_dir, f"atlas_{name}_{fingerprint.hexdigest()}")
+
+    def _read_atlas_from_disk_cache(self, name, image_keys):
+        # Returns the cached atlas surface (not converted yet) and its frame rects, or None if it is not cached yet.
+        cache_path = self._get_atlas_cache_path(name, image_keys)
+        if not os.path.exists(cache_path + '.raw') or not os.path.exists(cache_path + '.json'):
+            return None
+
+        with open(cache_path + '.json') as index_file:
+            index = json.load(index_file)
+        atlas_size = tuple(index['size'])
+        frame_rects = {(path, (width, height), flags): pg.Rect(x, y, width, height)
+                       for path, width, height, flags, x, y in index['frames']}
+
+        # Memory-map the packed pixels. The surface reads the map directly, but only until _finish_atlas() converts it,
+        # which copies the pixels. The map is then freed with the unconverted surface.
+        with open(cache_path + '.raw', 'rb') as cache_file:
+            pixels = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(pixels) != atlas_size[0] * atlas_size[1] * 4 or set(frame_rects) != set(image_keys):
+            pixels.close()
+            return None
+        return pg.image.frombuffer(pixels, atlas_size, self._get_raw_pixel_format()), frame_rects
+
+    def _save_atlas_to_disk_cache(self, name, image_keys, atlas):
+        # Writes the atlas pixels and the position of every frame to the disk cache.
+        cache_path = self._get_atlas_cache_path(name, image_keys)
+        index = {
+            'size': list(atlas.surface.get_size()),
+            'frames': [[path, size[0], size[1], flags, rect.x, rect.y]
+                       for (path, size, flags), rect in atlas.frame_rects.items()]
+        }
+
+        # Write to temporary files first so a crash never leaves a half-written cache file.
+        with open(cache_path + '.raw.tmp', 'wb') as cache_file:
+            cache_file.write(pg.image.tobytes(atlas.surface, self._get_raw_pixel_format()))
+        with open(cache_path + '.json.tmp', 'w') as index_file:
+            json.dump(index, index_file)
+        os.replace(cache_path + '.raw.tmp', cache_path + '.raw')
+        os.replace(cache_path + '.json.tmp', cache_path + '.json')
+
+    def _decode_image(self, source, size, flags, namehint=''):
+        # Decodes the image file and mirrors and scales it. The result is not converted to the display format yet.
+        return self._transform_image(pg.image.load(source, namehint), size, flags)
+
+    def _transform_image(self, image, size, flags):
+        # Mirrors the image if asked, then scales it to the requested size.
+        # Flipping before scaling gives exactly the pixels of a mirrored image file scaled the same way.
+        if flags & self.FLIP_X:
+            image = pg.transform.flip(image, True, False)
+        if size is not None:
+            image = pg.transform.scale(image, size)
+        return image
+
+    def _convert_image(self, image, flags):
+        # Converts an image to the display format, with or without per-pixel transparency.
+        return image.convert_alpha() if flags & self.ALPHA else image.convert()
+
+    def _get_raw_pixel_format(self):
+        # Finds the byte order that matches the display's own pixel layout (like 'BGRA'),
+        # so loading cached pixels back is a straight copy instead of a conversion.
+        if self._raw_pixel_format is None:
+            self._raw_pixel_format = 'RGBA'
+            masks = pg.Surface((1, 1), pg.SRCALPHA).convert_alpha().get_masks()
+
+            if sys.byteorder == 'little' and all(masks):
+                # Sort the channels by which byte of the 32-bit pixel they use.
+                channels = sorted(zip(masks, 'RGBA'), key=lambda channel: channel[0])
+                pixel_format = ''.join(name for mask, name in channels)
+                if pixel_format in self.RAW_PIXEL_FORMATS:
+                    self._raw_pixel_format = pixel_format
+
+        return self._raw_pixel_format
+
+    def get_mask(self, image):
+        # Returns the pixel collision mask of a loaded image. Each image's mask is only made once.
+        # Masks should be asked for at load time, so no mask is ever built during gameplay.
+        entry = self.masks.get(id(image))
+        if entry is not None and entry[0] is image:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        mask = pg.mask.from_surface(image)
+        self.masks[id(image)] = (image, mask)
+        return mask
+
+    def load_font(self, path, size):
+        # Returns the font at path with the given size. Each font file and size is opened only once.
+        key = (path, size)
+        font = self.fonts.get(key)
+        if font is not None:
+            self.hits += 1
+            return font
+
+        self.misses += 1
+        with self._profile('font', f"{os.path.basename(path)} size {size}"):
+            font = pg.font.Font(path, size)
+        self.fonts[key] = font
+        return font
+
+    def render_text(self, font, text, color, antialias=True):
+        # Returns the text rendered with font and color, reusing the surface if it was rendered before.
+        return self.text_cache.render(font, text, color, antialias)
+
+    def make_alpha_surface(self, size, color):
+        # Creates a semi-transparent surface filled with one color, for boxes and overlays that are drawn every frame.
+        # It is converted to the display's pixel format (when there is a display), which blits much faster.
+        surface = pg.Surface(size, pg.SRCALPHA)
+        if pg.display.get_surface():
+            surface = surface.convert_alpha()
+        surface.fill(color)
+        return surface
+
+    def get_stats(self):
+        # Returns the cache statistics as a dictionary.
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0.0,
+            'images': len(self.images),
+            'fonts': len(self.fonts),
+            'masks': len(self.masks),
+            'atlases': len(self.atlases),
+            'disk_hits': self.disk_hits,
+            'disk_misses': self.disk_misses,
+            'prefetch_hits': self.prefetch_hits,
+            'prefetch_waits': self.prefetch_waits,
+            'text': self.text_cache.get_stats()
+        }
+
+    def report(self):
+        # Returns the cache statistics as a short readable line.
+        stats = self.get_stats()
+        return (f"Assets: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+                f"{stats['images']} images, {stats['fonts']} fonts, "
+                f"disk cache {stats['disk_hits']} hits / {stats['disk_misses']} misses, "
+                f"prefetch {stats['prefetch_hits']} ready / {stats['prefetch_waits']} waited, "
+                f"text cache {stats['text']['hit_rate']:.0%} hit rate ({stats['text']['entries']} surfaces, "
+                f"{stats['text']['bytes'] // 1024} KB)")
+
+
+# One asset manager shared by all game modules that are not given their own.
+shared_assets = AssetManager()
@@ -0,0 +1,330 @@
+# BENCHMARK SYSTEM
+
+# Times the game's hot paths and full frames under SDL's dummy driver and writes the results as JSON.
+# Run it from the folder that holds GAME_DEV_FINAL, like the game itself:
+#   python GAME_DEV_FINAL/benchmark.py --output results.json
+#   python GAME_DEV_FINAL/benchmark.py --compare results.json
+
+import os
+
+# Use SDL's dummy video and audio drivers. These must be set before Pygame starts.
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame as pg
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+
+from Goblin_Runner import Goblin_Runner, parse_resolution
+from headless import SimulatedKeys
+
+
+class BenchmarkSuite:
+    # Runs every benchmark and collects the per-call timings: {benchmark name: statistics in microseconds}.
+    # The suite can be run in several rounds. Every round adds samples to the same benchmarks, so the samples of each
+    # benchmark are spread over the whole run instead of a fraction of a second of it.
+
+    # Character key states for the Character.update benchmarks.
+    CHARACTER_KEY_STATES = {
+        'idle': (),
+        'left': (pg.K_a,),
+        'right': (pg.K_d,),
+        'both': (pg.K_a, pg.K_d),
+        'jump_right': (pg.K_d, pg.K_SPACE)
+    }
+
+    def __init__(self, resolution=(1920, 1080), repeat=15, min_batch_seconds=0.005, name_filter=None, seed=0):
+        # Screen size for the single-function benchmarks.
+        self.resolution = resolution
+
+        # Every benchmark is timed in repeat batches. A batch calls the function often enough to take min_batch_seconds,
+        # so the timer's own cost does not matter even for very fast functions.
+        self.repeat = repeat
+        self.min_batch_seconds = min_batch_seconds
+
+        # Only benchmarks whose name contains this text are run (all if None).
+        self.name_filter = name_filter
+
+        # Seed for the game, so every benchmark run starts from the same enemy directions.
+        self.seed = seed
+
+        # Store the samples (in seconds) and the number of calls of every benchmark over all rounds so far,
+        # and their statistics: {name: [samples]}, {name: calls} and {name: statistics}.
+        self.samples = {}
+        self.calls = {}
+        self.results = {}
+        self.rounds = 0
+
+    def should_run(self, name):
+        # Returns True if the benchmark with this name passes the filter.
+        return self.name_filter is None or self.name_filter in name
+
+    def time_function(self, name, function):
+        # Times function() and stores the per-call statistics under name.
+        if not self.should_run(name):
+            return
+
+        # Find how many calls one batch needs, by doubling until a batch is long enough.
+        calls_per_batch = 1
+        while True:
+            batch_seconds = self._time_batch(function, calls_per_batch)
+            if batch_seconds >= self.min_batch_seconds or calls_per_batch >= 1 << 20:
+                break
+            calls_per_batch *= 2
+
+        samples = [self._time_batch(function, calls_per_batch) / calls_per_batch for _ in range(self.repeat)]
+        self._add_samples(name, samples, calls_per_batch * self.repeat)
+        print(f"  {name:<45} {self.results[name]['median_us']:>10.2f} us")
+
+    def time_frames(self, name, game, frame_count, warmup_frames=60):
+        # Times frame_count full frames of the game loop (one sample per frame) and stores the statistics under name.
+        if not self.should_run(name):
+            return
+
+        for _ in range(warmup_frames):
+            game.run_frame()
+
+        samples = []
+        for _ in range(frame_count):
+            start_time = time.perf_counter()
+            game.run_frame()
+            samples.append(time.perf_counter() - start_time)
+
+        self._add_samples(name, samples, frame_count)
+        print(f"  {name:<45} {self.results[name]['median_us']:>10.2f} us  (p95 {self.results[name]['p95_us']:.2f} us)")
+
+    def run_rounds(self, rounds, frame_resolutions, frame_count):
+        # Runs the component and full-frame benchmarks rounds times. The printed times include all rounds so far.
+        for round_index in range(rounds):
+            print(f"Round {round_index + 1} of {rounds}")
+            self.run_component_benchmarks()
+            self.run_frame_benchmarks(frame_resolutions, frame_count)
+            self.rounds += 1
+
+    def run_component_benchmarks(self):
+        # Times the single functions the game calls every frame, on one game at the benchmark resolution.
+        print(f"Component benchmarks at {self.resolution[0]}x{self.resolution[1]}:")
+        game = self._create_game(self.resolution)
+        screen = game.screen
+
+        # Character.update under different key states. The character is put back in the middle so it never stops at an edge.
+        character = game.character
+        for state_name, held_keys in self.CHARACTER_KEY_STATES.items():
+            keys = SimulatedKeys(held_keys)
+
+            def update_character(keys=keys, jump=pg.K_SPACE in held_keys):
+                if jump:
+                    character.jump()
+                character.update(keys)
+                character.rect.x = game.screen_width // 2
+            self.time_function(f'character.update/{state_name}', update_character)
+
+        for level in range(1, game.MAX_LEVEL + 1):
+            game.current_level = level
+            game.load_level_assets(level)
+            enemy_system = game.enemy_system
+            enemy_system.reset_for_level(level)
+            enemy_system.start_movement_for_level(level)
+
+            self.time_function(f'enemy.update/level{level}', lambda level=level: enemy_system.update(level, character.rect))
+            self.time_function(f'enemy.draw/level{level}', lambda level=level: enemy_system.draw(screen, level, 0.5))
+
+            # The collision block of the game loop, in both collision modes. The character stands where the enemies walk.
+            character.rect.midbottom = (game.screen_width // 2, game.screen_height - 110)
+            game.collision_mode = 'mask'
+            self.time_function(f'collision/mask/level{level}', lambda: self._check_collision(game))
+            game.collision_mode = 'rect'
+            self.time_function(f'collision/rect/level{level}', lambda: self._check_collision(game))
+
+            self.time_function(f'level.draw_background/level{level}', lambda level=level: game.game_level.draw_background(screen, level))
+
+        # Rendering a level's dialogue pages (done the first time its dialogue starts), then the dialogue box and the whole first page.
+        self.time_function('dialogue.set_level_dialogue', lambda: (game.game_dialogue.rendered_dialogue_pages.clear(), game.game_dialogue.set_level_dialogue(1)))
+        game.game_dialogue.set_level_dialogue(1)
+        game.game_dialogue.start_dialogue()
+        game.game_dialogue.finish_reveal()
+        self.time_function('dialogue.draw_dialogue', lambda: game.game_dialogue.draw_dialogue(screen))
+
+        # Main menu and credits screen: painted completely (after another screen was shown), 
+        # and again while they are already on screen, when only the changed buttons are drawn.
+        game.menu.menu_active = True
+        self.time_function('menu.draw', lambda: (game.menu.invalidate(), game.menu.draw()))
+        self.time_function('menu.draw/retained', game.menu.draw)
+        game.menu.menu_active = False
+        self.time_function('menu.draw_credits_screen', lambda: (game.menu.invalidate(), game.menu.draw_credits_screen()))
+        self.time_function('menu.draw_credits_screen/retained', game.menu.draw_credits_screen)
+        game.assets.shutdown()
+
+        # One step of the game environment: a gameplay tick with the character running right, and its observation.
+        if self.should_run('env.step'):
+            # Import here so NumPy is only needed when this benchmark runs.
+            from game_env import GameEnv
+            env = GameEnv(resolution=self.resolution, seed=self.seed)
+            env.reset(seed=self.seed)
+
+            def step_env():
+                _, _, terminated, truncated, _ = env.step(2)
+                if terminated or truncated:
+                    env.reset(seed=self.seed)
+            self.time_function('env.step', step_env)
+            env.close()
+
+    def run_frame_benchmarks(self, resolutions, frame_count):
+        # Times whole frames while the headless driver plays the game (menu, dialogue, tutorial and levels),
+        # once with full redraws and once with dirty rectangles, at every resolution.
+        print(f"Full-frame benchmarks ({frame_count} frames each):")
+        for width, height in resolutions:
+            for dirty_rects in (False, True):
+                name = f"frame/{width}x{height}/{'dirty' if dirty_rects else 'full'}"
+                if not self.should_run(name):
+                    continue
+                game = self._create_game((width, height), dirty_rects=dirty_rects)
+                game.clock.tick()
+                self.time_frames(name, game, frame_count)
+                game.assets.shutdown()
+
+    def get_report(self):
+        # Returns the results together with information about the machine and versions they were measured on.
+        return {
+            'meta': {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'pygame': pg.version.ver,
+                'sdl': '.'.join(str(part) for part in pg.get_sdl_version()),
+                'platform': platform.platform(),
+                'video_driver': os.environ.get('SDL_VIDEODRIVER'),
+                'resolution': list(self.resolution),
+                'repeat': self.repeat,
+                'rounds': self.rounds
+            },
+            'results': self.results
+        }
+
+    def _create_game(self, resolution, dirty_rects=False):
+        # Creates a headless game with a fixed seed. The game is never started with run_game(), which would quit Pygame.
+        return Goblin_Runner(headless=True, resolution=resolution, dirty_rects=dirty_rects, seed=self.seed)
+
+    def _check_collision(self, game):
+        # Same collision check as GameplayScene.tick.
+        if game.collision_mode == 'mask':
+            return game.enemy_system.find_colliding_enemy(game.current_level, game.character.rect, game.character.mask)
+        shrunk_char_rect = game.character.rect.inflate(-game.collision_offset * 2, -game.collision_offset * 2)
+        return game.enemy_system.find_colliding_enemy(game.current_level, shrunk_char_rect)
+
+    def _time_batch(self, function, calls):
+        # Returns how many seconds calls calls of function take.
+        start_time = time.perf_counter()
+        for _ in range(calls):
+            function()
+        return time.perf_counter() - start_time
+
+    def _add_samples(self, name, samples, calls):
+        # Adds the samples of one round to a benchmark and updates its statistics.
+        self.samples.setdefault(name, []).extend(samples)
+        self.calls[name] = self.calls.get(name, 0) + calls
+        self.results[name] = self._summarize(self.samples[name], self.calls[name])
+
+    def _summarize(self, samples, calls):
+        # Turns per-call times in seconds into statistics in microseconds.
+        samples_us = sorted(sample * 1000000 for sample in samples)
+        return {
+            'calls': calls,
+            'samples': len(samples_us),
+            'min_us': samples_us[0],
+            'median_us': statistics.median(samples_us),
+            'mean_us': statistics.fmean(samples_us),
+            'p95_us': samples_us[min(len(samples_us) - 1, int(len(samples_us) * 0.95))],
+            'max_us': samples_us[-1],
+            'stdev_us': statistics.stdev(samples_us) if len(samples_us) > 1 else 0.0
+        }
+
+
+def compare_results(current, baseline, threshold=0.1):
+    # Compares the medians of two benchmark reports. Returns the comparison rows and the names that got slower
+    # by more than threshold (0.1 = 10%).
+    # Timings on a busy machine move by more than 10% from moment to moment, so a benchmark only counts as slower
+    # (or faster) if both its median and its fastest sample moved by more than threshold. The fastest sample of
+    # all rounds is the least noisy, and the median catches slowdowns that only some calls have.
+    rows = []
+    regressions = []
+    for name, result in current['results'].items():
+        baseline_result = baseline['results'].get(name)
+        if baseline_result is None:
+            rows.append((name, None, result['median_us'], None, 'new'))
+            continue
+
+        ratio = _get_ratio(result['median_us'], baseline_result['median_us'])
+        min_ratio = _get_ratio(result['min_us'], baseline_result['min_us'])
+        if ratio > 1 + threshold and min_ratio > 1 + threshold:
+            status = 'SLOWER'
+            regressions.append(name)
+        elif ratio < 1 - threshold and min_ratio < 1 - threshold:
+            status = 'faster'
+        else:
+            status = 'same'
+        rows.append((name, baseline_result['median_us'], result['median_us'], ratio, status))
+
+    for name in baseline['results']:
+        if name not in current['results']:
+            rows.append((name, baseline['results'][name]['median_us'], None, None, 'missing'))
+    return rows, regressions
+
+
+def _get_ratio(current_us, baseline_us):
+    # Returns how many times longer the current time is than the baseline time.
+    return current_us / baseline_us if baseline_us else float('inf')
+
+
+def format_comparison(rows):
+    # Returns the comparison rows as a readable table.
+    lines = [f"{'benchmark':<45} {'baseline us':>12} {'current us':>12} {'ratio':>7}  status"]
+    for name, baseline_us, current_us, ratio, status in rows:
+        baseline_text = f"{baseline_us:.2f}" if baseline_us is not None else '-'
+        current_text = f"{current_us:.2f}" if current_us is not None else '-'
+        ratio_text = f"{ratio:.2f}x" if ratio is not None else '-'
+        lines.append(f"{name:<45} {baseline_text:>12} {current_text:>12} {ratio_text:>7}  {status}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    # Read the command line options.
+    parser = argparse.ArgumentParser(description='Goblin Runner benchmarks')
+    parser.add_argument('--output', default=None, metavar='FILE', help='write the results to this JSON file')
+    parser.add_argument('--compare', default=None, metavar='FILE', help='compare the results with a saved baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown counted as a regression (default 0.1 = 10%%)')
+    parser.add_argument('--resolution', type=parse_resolution, default=(1920, 1080), help='screen size for the component benchmarks')
+    parser.add_argument('--frame-resolutions', default='640x360,1280x720,1920x1080', help='comma-separated screen sizes for the full-frame benchmarks')
+    parser.add_argument('--frames', type=int, default=600, help='number of timed frames per full-frame benchmark in each round')
+    parser.add_argument('--repeat', type=int, default=15, help='number of timed batches per component benchmark in each round')
+    parser.add_argument('--rounds', type=int, default=5, help='number of times the whole suite is run, adding samples to every benchmark')
+    parser.add_argument('--filter', default=None, help='only run benchmarks whose name contains this text')
+    args = parser.parse_args()
+
+    suite = BenchmarkSuite(resolution=args.resolution, repeat=args.repeat, name_filter=args.filter)
+    suite.run_rounds(args.rounds, [parse_resolution(value) for value in args.frame_resolutions.split(',')], args.frames)
+    report = suite.get_report()
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"Wrote {len(report['results'])} results to {args.output}")
+
+    # Compare with the baseline. Exit with an error code if anything got slower, so build machines can catch it.
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        # Benchmarks skipped by the filter are not reported as missing.
+        baseline['results'] = {name: result for name, result in baseline['results'].items() if suite.should_run(name)}
+        rows, regressions = compare_results(report, baseline, args.threshold)
+        print(format_comparison(rows))
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}")
+            pg.quit()
+            sys.exit(1)
+
+    pg.quit()
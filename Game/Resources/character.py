@@ -2,6 +2,8 @@
 
 import pygame as pg
 
+from asset_manager import AssetManager, shared_assets
+
 class Character:
     # Stores all the image file paths for character animations. (Using List Comprehension for short code)
     CHARACTER_ANIMATIONS = {
@@ -19,7 +21,16 @@ class Character:
         'jump_right': [f'GAME_DEV_FINAL/assets/sprite/shinji/shinji jump right/jump{i}.png' for i in range(1, 3)]
     }
 
-    def __init__(self, screen_width, screen_height, start_x, start_y, character_size):
+    # Left-facing animations and the right-facing animations they mirror.
+    MIRRORED_ANIMATIONS = {'idle_left': 'idle_right', 'left': 'right', 'jump_left': 'jump_right'}
+
+    def __init__(self, screen_width, screen_height, start_x, start_y, character_size, assets=None, mirror_frames=False):
+        # Use the given asset manager, or the shared one.
+        self.assets = assets or shared_assets
+
+        # If True, only the right-facing images are loaded and the left-facing ones are made by flipping them.
+        self.mirror_frames = mirror_frames
+
         # Save the game screen's width and height.
         self.screen_width = screen_width
         self.screen_height = screen_height
@@ -29,6 +40,9 @@ class Character:
 
         # Create a rectangle that represents the character's position and size.
         self.rect = pg.Rect(start_x, start_y, self.character_size, self.character_size)
+
+        # Remember the position from the previous tick so drawing can blend between ticks.
+        self.previous_position = self.rect.topleft
         
         # Set the character's horizontal movement speed.
         self.speed = 15
@@ -57,6 +71,9 @@ class Character:
             'jump_left': [], 
             'jump_right': []
         }
+
+        # Hold the pixel collision mask of every animation image, in the same order as the images.
+        self.character_masks = {direction: [] for direction in self.character_animations}
         
         # Remembers the last horizontal direction the character was facing.
         self.last_horizontal_direction = 'right'
@@ -73,24 +90,42 @@ class Character:
         # Counts game frames to control animation speed.
         self.animation_frame_counter = 0
 
-        # Loop through all animation directions and their image paths.
-        for direction, paths in self.CHARACTER_ANIMATIONS.items():
-            for path in paths:
-                # Load the image from the provided path files.
-                image = pg.image.load(path).convert_alpha()
+        # Pack every character frame into one atlas. The images loaded below are sub-rects of it.
+        animation_keys = self.get_animation_keys((self.character_size, self.character_size))
+        self.atlas = self.assets.load_atlas('character', [key for keys in animation_keys.values() for key in keys])
 
-                # Scale the image to the correct character size.
-                image = pg.transform.scale(image, (self.character_size, self.character_size))
+        # Loop through all animation directions and their image keys.
+        for direction, keys in animation_keys.items():
+            for key in keys:
+                # Load the image from the provided path files, scaled to the correct character size.
+                image = self.assets.load_image(*key)
 
-                # Add the loaded image to the correct animation list.
+                # Add the loaded image to the correct animation list, and its collision mask to the mask list.
                 self.character_animations[direction].append(image)
+                self.character_masks[direction].append(self.assets.get_mask(image))
         
-        # Set the character's first image to be displayed.
+        # Set the character's first image to be displayed, and its collision mask.
         self.image = self.character_animations[self.current_direction][self.current_frame_index]
+        self.mask = self.character_masks[self.current_direction][self.current_frame_index]
+
+    def get_animation_keys(self, frame_size):
+        # Returns the (path, size, flags) image key of every animation frame, for each direction.
+        # With mirror_frames, the left-facing frames are the right-facing images flipped.
+        animation_keys = {}
+        for direction, paths in self.CHARACTER_ANIMATIONS.items():
+            if self.mirror_frames and direction in self.MIRRORED_ANIMATIONS:
+                source_paths = self.CHARACTER_ANIMATIONS[self.MIRRORED_ANIMATIONS[direction]]
+                animation_keys[direction] = [(path, frame_size, AssetManager.ALPHA | AssetManager.FLIP_X) for path in source_paths]
+            else:
+                animation_keys[direction] = [(path, frame_size, AssetManager.ALPHA) for path in paths]
+        return animation_keys
 
     def update(self, keys):
         # Updates the character's position, handles jumps, and changes animations.
         moving_horizontally = False
+
+        # Save the position before moving for drawing between ticks.
+        self.previous_position = self.rect.topleft
         
         # Check if 'A' key is pressed for left movement.
         if keys[pg.K_a] and not keys[pg.K_d]:
@@ -165,10 +200,24 @@ class Character:
         # It gets the image from the current animation set, using the current frame index.
         # If the current direction isn't found, it defaults to the first idle_right image.
         self.image = self.character_animations.get(self.current_direction, self.character_animations['idle_right'])[self.current_frame_index]
-
-    def draw(self, screen):
-        # Draws the character's current image in the game screen with fixed position.
-        screen.blit(self.image, self.rect)
+        self.mask = self.character_masks.get(self.current_direction, self.character_masks['idle_right'])[self.current_frame_index]
+
+    def draw(self, screen, alpha=1.0):
+        # Draws the character's current image in the game screen.
+        # Alpha (0.0 to 1.0) blends the position between the previous and the current tick.
+        screen.blit(self.image, self.get_draw_position(alpha))
+
+    def get_draw_position(self, alpha=1.0):
+        # Returns the top-left position to draw at, between the previous and the current tick.
+        if alpha >= 1.0:
+            return self.rect.topleft
+        previous_x, previous_y = self.previous_position
+        return (round(previous_x + (self.rect.x - previous_x) * alpha),
+                round(previous_y + (self.rect.y - previous_y) * alpha))
+
+    def snap_position(self):
+        # Stops blending from the old position after the character was moved directly (like a level reset).
+        self.previous_position = self.rect.topleft
 
     def jump(self):
         # Make the character jump if they are on the ground.
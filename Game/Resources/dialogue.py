@@ -2,12 +2,21 @@
 
 import pygame as pg
 
+from asset_manager import shared_assets
+from level_pack import load_level_pack
+
 class Dialogue:
 
-    def __init__(self, screen_width, screen_height):
+    def __init__(self, screen_width, screen_height, assets=None, levels=None):
         # Store the width and height of the game screen.
         self.screen_width = screen_width
         self.screen_height = screen_height
+
+        # Use the given asset manager, or the shared one.
+        self.assets = assets or shared_assets
+
+        # Use the given level pack, or load it. It holds the dialogue lines of each level.
+        self.levels = levels or load_level_pack()
         
         # Set the font size for the text.
         self.font_size = 50
@@ -34,7 +43,17 @@ class Dialogue:
 
         # Set the file path for the custom font and load the font with the specified size.
         self.font_path = "GAME_DEV_FINAL/assets/font/bytebounce/ByteBounce.ttf"
-        self.font = pg.font.Font(self.font_path, self.font_size)
+        self.font = self.assets.load_font(self.font_path, self.font_size)
+
+        # Set the space (in pixels) kept free between the text and the edges of the dialogue box.
+        self.text_padding = 40
+
+        # Set how many letters of text appear per second. Pressing SPACE while text appears shows all of it.
+        self.reveal_speed = 60
+
+        # Create the dialogue box and the dark overlay once. They never change, so every frame reuses them.
+        self.box_surface = self.assets.make_alpha_surface(self.dialogue_box_rect.size, self.box_color)
+        self.overlay_surface = self.assets.make_alpha_surface((self.screen_width, self.screen_height), (0, 0, 0, 230))
         
         # A flag to check if dialogue is currently active and should be shown.
         self.dialogue_active = False
@@ -45,6 +64,19 @@ class Dialogue:
         # An index to keep track of which line is currently being displayed.
         self.current_dialogue_line_index = 0
 
+        # The pre-rendered pages of every line in the current sequence. A line too long for the box gets more than one page.
+        self.current_dialogue_pages = []
+
+        # The pages of every level rendered so far: {level key: pages of each line}. The text of a level never changes,
+        # so starting a level again reuses its pages.
+        self.rendered_dialogue_pages = {}
+
+        # An index to keep track of which page of the current line is displayed.
+        self.current_page_index = 0
+
+        # How many letters of the current page have appeared so far (can be a fraction between frames).
+        self.revealed_letters = 0.0
+
         # Stores the key of the last dialogue sequence that finished.
         self.last_dialogue_level_completed = None
 
@@ -53,40 +85,10 @@ class Dialogue:
 
         # Create a dictionary to store all the dialogue lines for different parts of the game (levels/keys).
         # Each keys connect to a list of strings, where each string is a dialogue line. (values)
-        self.level_dialogues = {
-            1: [
-                "Shinji: uhhhh my head hurts, huh where am I?",
-                "Shinji: Is this a cave!? Why am I in a cave!?",
-                "Shinji: Wait I see light maybe it\'s the exit?", 
-                "Shinji: It\'s so bright outside.",
-                "Shinji: Huh? am I in a forest?",
-                "Shinji: Wait, why am I in the middle of the forest",
-                "- A familiar voice you hear - ",
-                "Shinji: Wait that voice,",
-                "Shinji: she really did send me to another world.",
-                "Shinji: But, why? Why me? And why am I a goblin!?",
-                "Shinji: No, I won\'t give up, ",
-                "Shinji: I\'ll defeat this demon king and once I do,",
-                "Shinji: I\'ll tell her how I really feel."
-            ],
-            2: [
-                "- Shinji saw three goblins -",
-                "Shinji: That\'s another goblins.",
-                "Shinji: I think were friends, right? ",
-                "Shinji: I mean were both goblins, right?"
-            ],
-            3: [
-                "- Shinji see ogres -",
-                "Shinji: Is that? An ogres!?",
-                "Shinji: They're big, could I even defeat them?",
-                "Shinji: Wait a sec.",
-                "Shinji: That forest looks mysterious...",
-                "Shinji: Maybe I could past my way there."
-            ]
-        }
-
-        # Defines the index of the dialogue line in level 1 after which a dark screen overlay should disappear.
-        self.REMOVE_OVERLAY_INDEX_LVL1 = 3 
+        self.level_dialogues = {level: self.levels.get_level(level)['dialogue'] for level in range(1, self.levels.max_level + 1)}
+
+        # Defines, for each level, the number of dialogue lines shown over a dark screen overlay before it disappears.
+        self.dark_overlay_lines = {level: self.levels.get_level(level)['dark_overlay_lines'] for level in range(1, self.levels.max_level + 1)}
 
     def set_level_dialogue(self, level_key):
         # Sets the dialogue lines to be displayed based on a given level key.
@@ -94,8 +96,14 @@ class Dialogue:
         # Get the list of dialogue lines for the given key, or an empty list if key not found.
         self.current_dialogue_lines = self.level_dialogues.get(level_key, [])
 
+        # Render every line into word-wrapped page surfaces now (the first time only), so drawing only has to blit them.
+        if level_key not in self.rendered_dialogue_pages:
+            self.rendered_dialogue_pages[level_key] = [self._render_pages(line) for line in self.current_dialogue_lines]
+        self.current_dialogue_pages = self.rendered_dialogue_pages[level_key]
+
         # Reset the current line index to the beginning of the new dialogue.
         self.current_dialogue_line_index = 0
+        self._show_page(0)
 
         # Store the key of the dialogue currently being set.
         self._current_dialogue_key = level_key
@@ -105,11 +113,21 @@ class Dialogue:
         self.dialogue_active = True
 
     def advance_dialogue(self):
-        # Moves to the next line of dialogue.
+        # Moves to the next page or line of dialogue. If the text is still appearing, it is shown completely first.
         # Returns True if there are more lines to show, False if the dialogue has ended.
+        page = self._get_current_page()
+        if page and self.revealed_letters < page['letters']:
+            self.revealed_letters = page['letters']
+            return True
+
+        # Show the next page if the current line has one.
+        if self.current_page_index + 1 < len(self.current_dialogue_pages[self.current_dialogue_line_index]):
+            self._show_page(self.current_page_index + 1)
+            return True
 
         # Increment the index to show the next line.
         self.current_dialogue_line_index += 1
+        self._show_page(0)
 
         # Check if there are still more lines left in the current dialogue sequence.
         if self.current_dialogue_line_index < len(self.current_dialogue_lines):
@@ -126,6 +144,23 @@ class Dialogue:
             # Return False, indicating dialogue is over.
             return False
 
+    def update(self, frame_time):
+        # Lets more letters of the current page appear. Frame_time is the time (in seconds) since the last frame.
+        page = self._get_current_page()
+        if self.dialogue_active and page:
+            self.revealed_letters = min(page['letters'], self.revealed_letters + frame_time * self.reveal_speed)
+
+    def finish_reveal(self):
+        # Shows all the text of the current page at once.
+        page = self._get_current_page()
+        if page:
+            self.revealed_letters = page['letters']
+
+    def is_page_revealed(self):
+        # Checks if all the text of the current page has appeared.
+        page = self._get_current_page()
+        return page is None or self.revealed_letters >= page['letters']
+
     def is_dialogue_active(self):
         # Checks if the dialogue box is currently on the screen.
         return self.dialogue_active
@@ -133,47 +168,103 @@ class Dialogue:
     def _draw_dark_overlay(self, screen):
         # Draws a semi-transparent dark layer over the entire game screen.
         # This is used to darken the background when dialogue is showing.
-
-        # Create a new transparent surface the size of the screen.
-        overlay = pg.Surface((self.screen_width, self.screen_height), pg.SRCALPHA)
-        
-        # Fill the overlay with a dark color and some transparency (alpha 230).
-        overlay.fill((0, 0, 0, 230))
-        
-        # Draw the overlay onto the main game screen.
-        screen.blit(overlay, (0, 0))
+        screen.blit(self.overlay_surface, (0, 0))
 
     def draw_dialogue(self, screen):
-        # Draws the dialogue box and the current line of text on the screen.
+        # Draws the dialogue box and the current page of text on the screen.
   
         # If dialogue is not active, do nothing and return.
         if not self.dialogue_active:
             return
 
-        # Check if it's level 1 dialogue and check if the current line index is before the specific point
-        # where the overlay should disappear.
-        if self._current_dialogue_key == 1 and self.current_dialogue_line_index < self.REMOVE_OVERLAY_INDEX_LVL1:
+        # Check if the current line index is before the specific point where this level's overlay should disappear.
+        if self.current_dialogue_line_index < self.dark_overlay_lines.get(self._current_dialogue_key, 0):
             self._draw_dark_overlay(screen)
 
-        # Create a semi-transparent surface for the dialogue box itself. (s for surface)
-        s = pg.Surface((self.dialogue_box_rect.width, self.dialogue_box_rect.height), pg.SRCALPHA)
-
-        # Fill this surface with the dialogue box color.
-        s.fill(self.box_color)
-
         # Draw the dialogue box background onto the main screen.
-        screen.blit(s, self.dialogue_box_rect)
-
-        # This will only proceed to render text if there are actual dialogue lines loaded.
-        if self.current_dialogue_lines:
-            # Get the current line of dialogue to display.
-            current_line = self.current_dialogue_lines[self.current_dialogue_line_index]
+        screen.blit(self.box_surface, self.dialogue_box_rect)
 
-            # Render the text surface from the current line using the chosen font and color.
-            text_surface = self.font.render(current_line, True, self.text_color)
-            
-            # Get the rectangle for the rendered text and center it within the dialogue box.
-            text_rect = text_surface.get_rect(center=(self.dialogue_box_rect.centerx, self.dialogue_box_rect.centery))
+        # This will only proceed to draw text if there are actual dialogue lines loaded.
+        page = self._get_current_page()
+        if not page:
+            return
 
-            # Draw the text surface onto the main screen at its centered position.
-            screen.blit(text_surface, text_rect)
+        # Center the page within the dialogue box.
+        page_rect = page['surface'].get_rect(center=self.dialogue_box_rect.center)
+
+        # Draw the rows that already appeared completely as one part of the page.
+        letters = int(self.revealed_letters)
+        row_index = 0
+        while row_index < len(page['rows']) and letters >= page['rows'][row_index]['letters']:
+            letters -= page['rows'][row_index]['letters']
+            row_index += 1
+        if row_index:
+            screen.blit(page['surface'], page_rect.topleft, (0, 0, page_rect.width, row_index * page['row_height']))
+
+        # Draw the appearing row only up to the right edge of its last visible letter.
+        if row_index < len(page['rows']) and letters:
+            row = page['rows'][row_index]
+            row_y = row_index * page['row_height']
+            screen.blit(page['surface'], (page_rect.x, page_rect.y + row_y), (0, row_y, row['letter_edges'][letters - 1], page['row_height']))
+
+    def _get_current_page(self):
+        # Returns the page currently shown, or None if there is no dialogue line.
+        if self.current_dialogue_line_index < len(self.current_dialogue_pages):
+            return self.current_dialogue_pages[self.current_dialogue_line_index][self.current_page_index]
+        return None
+
+    def _show_page(self, page_index):
+        # Shows a page of the current line, starting with no letters visible.
+        self.current_page_index = page_index
+        self.revealed_letters = 0.0
+
+    def _wrap_text(self, text, max_width):
+        # Splits a line of text into rows that fit within max_width pixels, breaking between words.
+        rows = []
+        current_row = ''
+        for word in text.split():
+            candidate = f'{current_row} {word}' if current_row else word
+            if current_row and self.font.size(candidate)[0] > max_width:
+                rows.append(current_row)
+                current_row = word
+            else:
+                current_row = candidate
+        if current_row or not rows:
+            rows.append(current_row)
+        return rows
+
+    def _render_pages(self, text):
+        # Renders a dialogue line into page surfaces that fit in the dialogue box, each row centered.
+        # For every row, the page stores the x position where each letter ends, so the typewriter reveal
+        # can show a growing part of the page without rendering any text while drawing.
+        max_width = self.dialogue_box_rect.width - self.text_padding * 2
+        row_height = self.font.get_linesize()
+        rows_per_page = max(1, (self.dialogue_box_rect.height - self.text_padding * 2) // row_height)
+
+        rows = self._wrap_text(text, max_width)
+        pages = []
+        for first_row in range(0, len(rows), rows_per_page):
+            page_rows = rows[first_row:first_row + rows_per_page]
+            row_surfaces = [self.font.render(row, True, self.text_color) for row in page_rows]
+            page_width = max(1, max(row_surface.get_width() for row_surface in row_surfaces))
+
+            # Fill the page with the text color at zero alpha, so the letter edges blend to the text color, not to black.
+            page_surface = pg.Surface((page_width, row_height * len(page_rows)), pg.SRCALPHA)
+            page_surface.fill((*self.text_color, 0))
+
+            row_info = []
+            for index, (row, row_surface) in enumerate(zip(page_rows, row_surfaces)):
+                row_x = (page_width - row_surface.get_width()) // 2
+                page_surface.blit(row_surface, (row_x, index * row_height))
+                letter_edges = [row_x + self.font.size(row[:length])[0] for length in range(1, len(row) + 1)]
+                row_info.append({'letters': len(row), 'letter_edges': letter_edges})
+
+            if pg.display.get_surface():
+                page_surface = page_surface.convert_alpha()
+            pages.append({
+                'surface': page_surface,
+                'rows': row_info,
+                'row_height': row_height,
+                'letters': sum(row['letters'] for row in row_info)
+            })
+        return pages
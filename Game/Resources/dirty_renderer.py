@@ -0,0 +1,97 @@
+# DIRTY RECTANGLE RENDERING SYSTEM
+
+import pygame as pg
+
+class ActorSprite(pg.sprite.DirtySprite):
+    # A sprite that shows a character or enemy image. It is only redrawn when its image or position changes.
+
+    def __init__(self, layer):
+        super().__init__()
+        self._layer = layer
+        self.image = pg.Surface((0, 0))
+        self.rect = pg.Rect(0, 0, 0, 0)
+        self.visible = 0
+
+    def show(self, image, position):
+        # Sets the image and top-left position. Marks the sprite dirty only if something changed.
+        if image is not self.image or position != self.rect.topleft:
+            self.image = image
+            self.rect = image.get_rect(topleft=position)
+            self.dirty = 1
+        if not self.visible:
+            self.visible = 1
+            self.dirty = 1
+
+    def hide(self):
+        # Stops drawing the sprite. The background behind it is restored on the next draw.
+        if self.visible:
+            self.visible = 0
+            self.dirty = 1
+
+
+class DirtyRenderer:
+    # Draws gameplay by only repainting the parts of the screen that changed.
+    # The background behind moving sprites is restored from a cached copy and only those
+    # rectangles are sent to the display with pg.display.update(rects).
+
+    # Layers for drawing order, the same as the full redraw: character, then enemies, then the level text.
+    CHARACTER_LAYER = 1
+    ENEMY_LAYER = 2
+    TEXT_LAYER = 3
+
+    def __init__(self, screen):
+        # Stores the Pygame screen surface.
+        self.screen = screen
+
+        # Create the sprite group that tracks the changed areas.
+        self.group = pg.sprite.LayeredDirty()
+
+        # Create one sprite for the character. Enemy sprites are added when needed.
+        self.character_sprite = ActorSprite(self.CHARACTER_LAYER)
+        self.group.add(self.character_sprite)
+        self.enemy_sprites = []
+
+        # Create one sprite for the text drawn above everything (like "Level 1").
+        self.text_sprite = ActorSprite(self.TEXT_LAYER)
+        self.group.add(self.text_sprite)
+
+        # Stores the key of the background that is currently on the screen.
+        self.background_key = None
+
+        # A flag to force drawing the whole screen on the next frame.
+        self.needs_full_redraw = True
+
+    def invalidate(self):
+        # Makes the next frame draw the whole screen (for example after another screen was shown).
+        self.needs_full_redraw = True
+
+    def draw(self, background_key, background, character_image, character_position, enemy_draw_list, text_image, text_position):
+        # Draws one gameplay frame and returns the list of screen rectangles that changed.
+        # background_key identifies the background (like the level number), so a new one is drawn in full.
+        if background_key != self.background_key:
+            self.background_key = background_key
+            self.group.clear(self.screen, background)
+            self.needs_full_redraw = True
+
+        # Update the character and text sprites.
+        self.character_sprite.show(character_image, character_position)
+        self.text_sprite.show(text_image, text_position)
+
+        # Make sure there is one sprite for every enemy, then update them.
+        while len(self.enemy_sprites) < len(enemy_draw_list):
+            sprite = ActorSprite(self.ENEMY_LAYER)
+            self.enemy_sprites.append(sprite)
+            self.group.add(sprite)
+
+        for index, sprite in enumerate(self.enemy_sprites):
+            if index < len(enemy_draw_list):
+                sprite.show(*enemy_draw_list[index])
+            else:
+                sprite.hide()
+
+        # On a full redraw, repaint the whole background and every sprite, then update the entire screen.
+        if self.needs_full_redraw:
+            self.needs_full_redraw = False
+            self.group.repaint_rect(self.screen.get_rect())
+
+        return self.group.draw(self.screen)
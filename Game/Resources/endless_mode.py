@@ -0,0 +1,299 @@
+# ENDLESS MODE MANAGEMENT SYSTEM
+
+import pygame as pg
+import random
+
+from asset_manager import AssetManager, shared_assets
+
+class EndlessMode:
+    # Runs the endless mode: the world scrolls to the left, faster and faster, and waves of enemies are generated
+    # from the enemy types of the level pack (slime, goblin, ogre, ...) until the character is hit.
+    # Enemies live in a fixed-size pool. An enemy that leaves the screen goes back to the pool and is reused for a
+    # later spawn, so a long run creates no new objects and its memory stays flat.
+
+    # World scroll speed in pixels per tick: starting speed, maximum speed and increase per tick.
+    START_SCROLL_SPEED = 5.0
+    MAX_SCROLL_SPEED = 11.0
+    SCROLL_ACCELERATION = 0.0005
+
+    # Number of screen-wide background tiles before the world changes to the next level's background.
+    TILES_PER_BIOME = 4
+
+    # Scrolled distance (in pixels) between a wave and the next one, before it gets shorter with the speed.
+    WAVE_GAP_RANGE = (900, 1500)
+
+    # Scrolled distance (in pixels) after which waves can hold one more enemy, and the largest wave.
+    WAVE_GROWTH_DISTANCE = 20000
+    MAX_WAVE_SIZE = 3
+
+    # Extra space (in pixels) between two enemies of a wave, on top of what the character needs to land and jump again.
+    WAVE_SPACING_MARGIN = (40, 200)
+
+    # Number of scrolled pixels in one meter of the shown distance.
+    PIXELS_PER_METER = 50
+
+    # Font and colors of the distance text.
+    TEXT_COLOR = (0, 0, 0)
+    RESULT_COLOR = (200, 200, 200)
+
+    def __init__(self, screen_width, screen_height, level_display, enemy_system, assets=None, seed=None, pool_size=16, jump_ticks=28, runner_speed=15):
+        # Store the width and height of the game screen.
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+
+        # The level display and enemy system load the backgrounds and enemy images of each level.
+        self.level_display = level_display
+        self.enemy_system = enemy_system
+
+        # Use the given asset manager, or the shared one.
+        self.assets = assets or shared_assets
+
+        # Own random generator for the waves. The same seed always gives the same waves.
+        self.rng = random.Random(seed)
+
+        # Number of ticks the character stays in the air during a jump, and its running speed (pixels per tick).
+        # Enemies of a wave are spaced so the character can run and jump over one, land and jump again.
+        self.jump_ticks = jump_ticks
+        self.runner_speed = runner_speed
+
+        # Set the custom font for the distance text.
+        self.font_path = "GAME_DEV_FINAL/assets/font/bytebounce/ByteBounce.ttf"
+        self.distance_font = self.assets.load_font(self.font_path, 80)
+        self.result_font = self.assets.load_font(self.font_path, 60)
+
+        # The distance text changes every meter, so it is rendered here only when it changes. Going through the shared
+        # text cache would fill it with one surface per meter and push out the menu and dialogue text.
+        self.distance_text = None
+        self.distance_surface = None
+
+        # Store each level's background and its mirror image. Every other tile is mirrored, so the edges of
+        # neighbouring tiles always match even though the backgrounds were not drawn to repeat.
+        self.backgrounds = {}
+
+        # Store one entry per enemy type (one per level): its frames, masks, size, walking speed and ground height.
+        # Filled by load() when endless mode starts for the first time.
+        self.enemy_types = []
+
+        # Create every pooled enemy up front. Spawning only changes the values of a free entry.
+        self.pool = [{
+            # If this pool entry is an enemy on screen.
+            'active': False,
+
+            # Enemy type (index into enemy_types), position and the X position from the previous tick.
+            'type': None,
+            'x': 0.0,
+            'previous_x': 0.0,
+            'rect': pg.Rect(0, 0, 0, 0),
+
+            # Current animation image, its collision mask and the game frames counted since the last image change.
+            'frame_index': 0,
+            'frame_counter': 0,
+            'image': None,
+            'mask': None
+        } for _ in range(pool_size)]
+
+        # Indexes of the free pool entries. Used as a stack, so taking and returning an entry allocates nothing.
+        self.free_indexes = list(range(pool_size))
+
+        # Count spawned and recycled enemies, spawns that found no free pool entry and the most enemies on screen at once.
+        self.spawned = 0
+        self.recycled = 0
+        self.spawns_skipped = 0
+        self.peak_active = 0
+
+        # The longest distance (in meters) reached in any run.
+        self.best_distance = 0
+
+        self.reset()
+
+    def load(self):
+        # Loads the backgrounds and enemy types of every level, if they are not loaded yet.
+        if self.enemy_types:
+            return
+
+        levels = self.enemy_system.levels
+        for level in range(1, levels.max_level + 1):
+            self.level_display.load_level(level)
+            path, size, flags = self.level_display.get_background_key(level)
+            self.backgrounds[level] = (self.level_display.backgrounds[level], self.assets.load_image(path, size, flags | AssetManager.FLIP_X))
+
+            # The images come from the shared asset manager, so levels that were already played add no memory.
+            animations = self.enemy_system.load_level_animations(level)
+            masks = self.enemy_system.load_level_masks(animations)
+            enemy_width, enemy_height = self.enemy_system.get_enemy_size(level)
+            positions = self.enemy_system.enemy_initial_positions.get(level) or [(0, self.screen_height - 110 - enemy_height)]
+            self.enemy_types.append({
+                'frames': animations['left'],
+                'masks': masks['left'],
+                'width': enemy_width,
+                'height': enemy_height,
+                'y': positions[0][1],
+                'speed': self.enemy_system.get_enemy_speed(level, 0),
+                'animation_speed_frames': self.enemy_system.get_animation_speed_frames(level)
+            })
+
+    def reset(self):
+        # Starts a new run: returns every enemy to the pool and scrolls back to the start.
+        for index, enemy in enumerate(self.pool):
+            if enemy['active']:
+                enemy['active'] = False
+                self.free_indexes.append(index)
+
+        # Scrolled distance in pixels, at this tick and at the previous tick (for drawing between ticks).
+        self.distance = 0.0
+        self.previous_distance = 0.0
+        self.scroll_speed = self.START_SCROLL_SPEED
+
+        # Scrolled distance at which the next wave appears.
+        self.next_wave_distance = float(self.WAVE_GAP_RANGE[0])
+
+    def update(self):
+        # Advances the world by one tick: scrolls, moves and animates the enemies, recycles those that left the
+        # screen and spawns a new wave when it is time.
+        self.previous_distance = self.distance
+        self.distance += self.scroll_speed
+        self.scroll_speed = min(self.MAX_SCROLL_SPEED, self.scroll_speed + self.SCROLL_ACCELERATION)
+
+        active_count = 0
+        for index, enemy in enumerate(self.pool):
+            if not enemy['active']:
+                continue
+
+            # Enemies walk towards the character while the world scrolls under them.
+            enemy_type = self.enemy_types[enemy['type']]
+            enemy['previous_x'] = enemy['x']
+            enemy['x'] -= self.scroll_speed + enemy_type['speed']
+            enemy['rect'].x = int(enemy['x'])
+
+            # Return enemies that left the screen on the left to the pool.
+            if enemy['rect'].right < 0:
+                enemy['active'] = False
+                self.free_indexes.append(index)
+                self.recycled += 1
+                continue
+            active_count += 1
+
+            # Move to the next animation image when enough frames have passed.
+            enemy['frame_counter'] += 1
+            if enemy['frame_counter'] >= enemy_type['animation_speed_frames']:
+                enemy['frame_counter'] = 0
+                enemy['frame_index'] = (enemy['frame_index'] + 1) % len(enemy_type['frames'])
+                enemy['image'] = enemy_type['frames'][enemy['frame_index']]
+                enemy['mask'] = enemy_type['masks'][enemy['frame_index']]
+
+        if self.distance >= self.next_wave_distance:
+            active_count += self.spawn_wave()
+        self.peak_active = max(self.peak_active, active_count)
+
+    def spawn_wave(self):
+        # Places a wave of enemies just past the right edge of the screen and schedules the next wave.
+        # Returns the number of spawned enemies.
+        wave_size = min(self.MAX_WAVE_SIZE, 1 + int(self.distance // self.WAVE_GROWTH_DISTANCE))
+        wave_size = self.rng.randint(1, wave_size)
+
+        # Enemy types unlock as the world passes through their level's background.
+        unlocked_types = min(len(self.enemy_types), self.get_biome_index(self.distance + self.screen_width) + 1)
+
+        x = self.screen_width + 50
+        spawned = 0
+        for _ in range(wave_size):
+            type_index = self.rng.randrange(unlocked_types)
+            if self.spawn_enemy(type_index, x):
+                spawned += 1
+
+            # The character must be able to land between two enemies and jump again. While it runs and jumps,
+            # the enemies approach at the scroll speed plus their walking speed plus the character's running speed.
+            enemy_type = self.enemy_types[type_index]
+            approach_speed = self.scroll_speed + enemy_type['speed'] + self.runner_speed
+            x += enemy_type['width'] + int(approach_speed * self.jump_ticks) + self.rng.randint(*self.WAVE_SPACING_MARGIN)
+
+        # Waves come closer together as the world gets faster.
+        gap = self.rng.randint(*self.WAVE_GAP_RANGE) * self.START_SCROLL_SPEED / self.scroll_speed
+        self.next_wave_distance = self.distance + (x - self.screen_width) + gap
+        return spawned
+
+    def spawn_enemy(self, type_index, x):
+        # Takes a free enemy from the pool and places it at screen position x. Returns False if the pool is empty.
+        if not self.free_indexes:
+            self.spawns_skipped += 1
+            return False
+
+        enemy_type = self.enemy_types[type_index]
+        enemy = self.pool[self.free_indexes.pop()]
+        enemy['active'] = True
+        enemy['type'] = type_index
+        enemy['x'] = float(x)
+        enemy['previous_x'] = float(x)
+        enemy['rect'].update(x, enemy_type['y'], enemy_type['width'], enemy_type['height'])
+        enemy['frame_index'] = 0
+        enemy['frame_counter'] = 0
+        enemy['image'] = enemy_type['frames'][0]
+        enemy['mask'] = enemy_type['masks'][0]
+        self.spawned += 1
+        return True
+
+    def find_collision(self, rect, mask=None):
+        # Returns True if an enemy on screen collides with rect (and with mask, if given).
+        for enemy in self.pool:
+            if enemy['active'] and enemy['rect'].colliderect(rect):
+                enemy_rect = enemy['rect']
+                if mask is None or mask.overlap(enemy['mask'], (enemy_rect.x - rect[0], enemy_rect.y - rect[1])):
+                    return True
+        return False
+
+    def get_enemy_rects(self):
+        # Returns the rects of the enemies on screen.
+        return [enemy['rect'] for enemy in self.pool if enemy['active']]
+
+    def get_biome_index(self, distance):
+        # Returns the index of the level whose background is shown at a scrolled distance.
+        return int(distance // (self.screen_width * self.TILES_PER_BIOME)) % max(1, len(self.enemy_types))
+
+    def get_distance_meters(self):
+        # Returns the distance of the current run in meters.
+        return int(self.distance // self.PIXELS_PER_METER)
+
+    def finish_run(self):
+        # Ends the current run and keeps its distance if it is the best one.
+        self.best_distance = max(self.best_distance, self.get_distance_meters())
+
+    def draw_background(self, screen, alpha=1.0):
+        # Draws the two background tiles visible at the current scroll position.
+        # Alpha (0.0 to 1.0) blends the scroll position between the previous and the current tick.
+        distance = self.previous_distance + (self.distance - self.previous_distance) * alpha
+        tile_index = int(distance // self.screen_width)
+        tile_x = tile_index * self.screen_width - int(distance)
+        for tile in (tile_index, tile_index + 1):
+            level = self.get_biome_index(tile * self.screen_width) + 1
+            screen.blit(self.backgrounds[level][tile % 2], (tile_x, 0))
+            tile_x += self.screen_width
+
+    def draw(self, screen, alpha=1.0):
+        # Draws every enemy on screen, between its previous and current position.
+        for enemy in self.pool:
+            if enemy['active']:
+                previous_x = enemy['previous_x']
+                screen.blit(enemy['image'], (int(previous_x + (enemy['x'] - previous_x) * alpha), enemy['rect'].y))
+
+    def draw_distance(self, screen):
+        # Shows the distance of the current run at the top of the screen.
+        distance_text = f"{self.get_distance_meters()} m"
+        if distance_text != self.distance_text:
+            self.distance_text = distance_text
+            self.distance_surface = self.distance_font.render(distance_text, True, self.TEXT_COLOR)
+        screen.blit(self.distance_surface, self.distance_surface.get_rect(center=(self.screen_width // 2, 120)))
+
+    def draw_result(self, screen):
+        # Shows the distance of the finished run and the best distance, below the game over message.
+        text_surface = self.assets.render_text(self.result_font, f"Distance: {self.get_distance_meters()} m    Best: {self.best_distance} m", self.RESULT_COLOR)
+        screen.blit(text_surface, text_surface.get_rect(center=(self.screen_width // 2, self.screen_height // 2 + 150)))
+
+    def get_stats(self):
+        # Returns the pool statistics as a dictionary.
+        return {
+            'pool_size': len(self.pool),
+            'spawned': self.spawned,
+            'recycled': self.recycled,
+            'spawns_skipped': self.spawns_skipped,
+            'peak_active': self.peak_active
+        }
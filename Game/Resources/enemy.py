@@ -3,33 +3,27 @@
 import pygame as pg
 import random
 
+from asset_manager import AssetManager, shared_assets
+from level_pack import load_level_pack
+from spatial_hash import SpatialHash
+
 class Enemy:
-    # Stores paths to animation images for each enemy type by level and direction.
-    ENEMY_ANIMATION_PATHS = {
-        1: { # Level 1 enemies (Slimes)
-            'left': [f"GAME_DEV_FINAL/assets/sprite/slime/{i}.png" for i in range(1, 7)], 
-            'right': [f"GAME_DEV_FINAL/assets/sprite/slime/{i}.png" for i in range(1, 7)] 
-            },
-
-        2: { # Level 2 enemies (Goblins)
-            'left': [f"GAME_DEV_FINAL/assets/sprite/goblin/pixel-frame-goblin_left/{i}.png" for i in range(1, 5)],
-            'right': [f"GAME_DEV_FINAL/assets/sprite/goblin/pixel-frame-goblin_right/{i}.png" for i in range(1, 5)]
-            },
-
-        3: { # Level 3 enemies (Ogres)
-            'left': [f"GAME_DEV_FINAL/assets/sprite/ogre/pixel-frame-ogre_left/{i}.png" for i in range(1, 7)],
-            'right': [f"GAME_DEV_FINAL/assets/sprite/ogre/pixel-frame-ogre_right/{i}.png" for i in range(1, 7)]
-            }
-    }
+    # Size of one spatial hash cell (in pixels) used for collision checks.
+    COLLISION_CELL_SIZE = 256
+
+    def __init__(self, screen_width, screen_height, max_level, assets=None, mirror_frames=False, seed=None, levels=None):
+        # Use the given asset manager, or the shared one.
+        self.assets = assets or shared_assets
+
+        # Use the given level pack, or load it. It holds each level's enemy type (frames, size, speed) and enemy positions.
+        self.levels = levels or load_level_pack()
 
-    # Defines the image size (width, height) for each enemy type.
-    ENEMY_SIZES = {
-        1: (180, 180),
-        2: (155, 155),
-        3: (210, 210)
-    }
+        # Own random generator for the enemy directions. The same seed always gives the same directions.
+        self.rng = random.Random(seed)
+
+        # If True, the 'left' frames are made by flipping the 'right' images instead of loading their own files.
+        self.mirror_frames = mirror_frames
 
-    def __init__(self, screen_width, screen_height, max_level):
         # Stores the game screen's width and height.
         self.screen_width = screen_width
         self.screen_height = screen_height
@@ -38,103 +32,187 @@ class Enemy:
         self.max_level = max_level
 
         # Defines the enemy's starting position in the game for different levels.
-        self.enemy_initial_positions = {
-            1: [(self.screen_width * 3 // 4 - 75, self.screen_height - 260)],
-
-            2: [(self.screen_width * 1 // 5, self.screen_height - 251),
-                (self.screen_width // 2 - 50, self.screen_height - 251),
-                (self.screen_width * 3 // 4 - 90, self.screen_height - 251)],
-                
-            3: [(self.screen_width * 1 // 1 - 5, self.screen_height - 330),
-                (self.screen_width * 2 // 7 - 110, self.screen_height - 330),
-                (self.screen_width * 3 // 4 - 230, self.screen_height - 330)]
-        }
+        self.enemy_initial_positions = {level: self.levels.get_enemy_positions(level, self.screen_width, self.screen_height)
+                                        for level in range(1, self.levels.max_level + 1)}
 
         # This dictionary will store all the enemy information, grouped by level.
         self.level_enemies_data = {} 
+
+        # Stores a spatial hash for each level, so collision checks only look at enemies near the character.
+        self.level_spatial_hashes = {}
+
+        # Counts pixel mask checks (done only when rects touch) and how many of them really overlapped.
+        self.mask_checks = 0
+        self.mask_hits = 0
         
-        # Calls this method to set up all enemy data when the game starts.
+        # Stores the atlas holding each level's enemy frames.
+        self.level_atlases = {}
+
+        # Set up the enemy data when the game starts.
         self.initialize_all_enemies_data() 
 
+    def get_atlas_keys(self, level):
+        # Returns the image keys of every animation frame of a level's enemy type, for its atlas.
+        return [key for direction_keys in self.get_animation_keys(level).values() for key in direction_keys]
+
+    def load_level_atlas(self, level):
+        # Packs the animation frames of a level's enemy type into one atlas. The images loaded later are sub-rects of it.
+        if level not in self.level_atlases:
+            self.level_atlases[level] = self.assets.load_atlas(f'enemies_level{level}', self.get_atlas_keys(level))
+        return self.level_atlases[level]
+
+    def prefetch_level(self, level):
+        # Starts reading a level's enemy frames on the asset prefetch thread, so load_level() only has to convert them.
+        if level in self.levels and level not in self.level_atlases:
+            self.assets.prefetch_atlas(f'enemies_level{level}', self.get_atlas_keys(level))
+
+    def get_animation_keys(self, level):
+        # Returns the (path, size, flags) image key of every 'left' and 'right' frame for the enemy type of a level.
+        # With mirror_frames, the 'left' frames are the 'right' images flipped. Enemies that use the same
+        # images for both directions (like the slime) are left as they are.
+        enemy_size = self.get_enemy_size(level)
+        level_paths = self.levels.get_level(level)['enemy_type']['frames'] if level in self.levels else {}
+        left_paths = level_paths.get('left', ())
+        right_paths = level_paths.get('right', ())
+
+        animation_keys = {'right': [(path, enemy_size, AssetManager.ALPHA) for path in right_paths]}
+        if self.mirror_frames and right_paths and left_paths != right_paths:
+            animation_keys['left'] = [(path, enemy_size, AssetManager.ALPHA | AssetManager.FLIP_X) for path in right_paths]
+        else:
+            animation_keys['left'] = [(path, enemy_size, AssetManager.ALPHA) for path in left_paths]
+        return animation_keys
+
+    def load_level_animations(self, level):
+        # Loads and scales the 'left' and 'right' animation images for the enemy type of a level.
+        # The frames are packed into the level's atlas first.
+        self.load_level_atlas(level)
+
+        # Gets the image keys (path, size and flags) for enemies in specific level.
+        animation_keys = self.get_animation_keys(level)
+
+        # Create an empty dictionary to hold loaded animation images.
+        loaded_animations = {} 
+
+        # Loops through 'left' and 'right' directions to load animations for each.
+        for direction in ['left', 'right']:
+            # Gets the list of image keys for the current level and direction.
+            direction_keys = animation_keys[direction]
+
+            # Create a list to store loaded images for this direction.
+            loaded_images_for_direction = [] 
+
+            # Load and scale the image from the path. Then add the scaled image to the list.
+            # Frames shared by both directions (like the slime) are only loaded once.
+            for key in direction_keys:
+                scaled_image = self.assets.load_image(*key)
+                loaded_images_for_direction.append(scaled_image)
+            
+            # Store the list of loaded and scaled images under the current direction.
+            loaded_animations[direction] = loaded_images_for_direction
+
+        return loaded_animations
+
+    def load_level_masks(self, loaded_animations):
+        # Returns the pixel collision masks for loaded animation images, in the same order as the images.
+        return {direction: [self.assets.get_mask(image) for image in images]
+                for direction, images in loaded_animations.items()}
+
     def initialize_all_enemies_data(self):
-        # Loops through each game level to set up enemies for it.
-        for level in range(1, self.max_level + 1):
-            # Gets the image size for enemies in specific level
-            enemy_size = self.ENEMY_SIZES.get(level, (80, 80))
-
-            # Create an empty dictionary to hold loaded animation images.
-            loaded_animations = {} 
-
-            # Loops through 'left' and 'right' directions to load animations for each.
-            for direction in ['left', 'right']:
-                # Gets the list of image paths for the current level and direction.
-                # Use .get() with empty dicts/lists to handle missing data.
-                direction_paths = self.ENEMY_ANIMATION_PATHS.get(level, {}).get(direction, [])
-
-                # Create a list to store loaded images for this direction.
-                loaded_images_for_direction = [] 
-
-                # Load and scale the image from the path. Then add the scaled image to the list.
-                for path in direction_paths:
-                    image = pg.image.load(path).convert_alpha()    
-                    scaled_image = pg.transform.scale(image, enemy_size) 
-                    loaded_images_for_direction.append(scaled_image)
-                
-                # Store the list of loaded and scaled images under the current direction.
-                loaded_animations[direction] = loaded_images_for_direction
+        # Sets up the enemies of level 1 when the game starts.
+        # The other levels are set up by load_level() when they are reached.
+        self.load_level(1)
 
-            # Creates an empty list to store individual enemy data for the current level.
-            self.level_enemies_data[level] = [] 
+    def load_level(self, level):
+        # Sets up the enemies of a level, if they are not set up yet.
+        # If the level's frames were prefetched, they only have to be converted (or waited for).
+        if level in self.level_enemies_data or level > self.max_level:
+            return
 
-            # Goes through each predefined starting position for enemies at this level.
-            for i, (enemy_x, enemy_y) in enumerate(self.enemy_initial_positions.get(level, [])):
-                # Randomly decides if the enemy starts moving left (-1) or right (1).
-                initial_direction = random.choice([-1, 1]) 
+        # Gets the image size and animation speed for enemies in specific level
+        enemy_size = self.get_enemy_size(level)
+        animation_speed_frames = self.get_animation_speed_frames(level)
 
-                # Sets the starting animation ('left' or 'right') based on the initial direction. (Using ternary)
-                initial_animation_set = 'right' if initial_direction == 1 else 'left'
+        # Load the animation images for this level's enemy type and their collision masks.
+        loaded_animations = self.load_level_animations(level)
+        loaded_masks = self.load_level_masks(loaded_animations)
 
+        # Creates an empty list to store individual enemy data for the current level.
+        self.level_enemies_data[level] = [] 
+        self.level_spatial_hashes[level] = SpatialHash(self.COLLISION_CELL_SIZE)
 
-                enemy_data = {
-                    # Defines how fast this specific enemy moves, varying by level and index.
-                    'speed': (3 + (level * 0.5)) + (i * 0.2), 
+        # Goes through each predefined starting position for enemies at this level.
+        for i, (enemy_x, enemy_y) in enumerate(self.enemy_initial_positions.get(level, [])):
+            # Randomly decides if the enemy starts moving left (-1) or right (1).
+            initial_direction = self.rng.choice([-1, 1]) 
 
-                    # Stores all loaded animation images for this enemy type.
-                    'animations': loaded_animations,
+            # Sets the starting animation ('left' or 'right') based on the initial direction. (Using ternary)
+            initial_animation_set = 'right' if initial_direction == 1 else 'left'
 
-                    # Creates the enemy's position and size rectangle.
-                    'rect': pg.Rect(enemy_x, enemy_y, *enemy_size),
 
-                    # Stores the enemy's current movement direction (-1 for left, 1 for right).
-                    'direction': initial_direction,
+            enemy_data = {
+                # Defines how fast this specific enemy moves, varying by level and index.
+                'speed': self.get_enemy_speed(level, i), 
 
-                    # Flag to control whether the enemy is allowed to move.       
-                    'can_move': False,  
+                # Stores all loaded animation images for this enemy type.
+                'animations': loaded_animations,
 
-                    # Stores the original starting X position for resets.                     
-                    'initial_x': enemy_x,        
-                    
-                    # Stores the original starting Y position for resets.            
-                    'initial_y': enemy_y, 
+                # Stores the collision masks of all animation images.
+                'masks': loaded_masks,
 
-                    # The index of the current image frame in its animation.                   
-                    'current_frame_index': 0,      
+                # Creates the enemy's position and size rectangle.
+                'rect': pg.Rect(enemy_x, enemy_y, *enemy_size),
 
-                    # Counts game frames to control animation speed.          
-                    'animation_frame_counter': 0,            
+                # Stores the X position from the previous tick so drawing can blend between ticks.
+                'previous_x': enemy_x,
 
-                    # How many game frames pass before the animation changes to the next image.
-                    'animation_speed_frames': 5,  
+                # Stores the enemy's current movement direction (-1 for left, 1 for right).
+                'direction': initial_direction,
+
+                # Flag to control whether the enemy is allowed to move.       
+                'can_move': False,  
+
+                # Stores the original starting X position for resets.                     
+                'initial_x': enemy_x,        
+                
+                # Stores the original starting Y position for resets.            
+                'initial_y': enemy_y, 
 
-                    # Which set of animations (left or right) is currently active.          
-                    'current_animation_set': initial_animation_set 
-                }
+                # The index of the current image frame in its animation.                   
+                'current_frame_index': 0,      
 
-                # Sets the enemy's displayed image to the first frame of its starting animation.
-                enemy_data['image'] = enemy_data['animations'][initial_animation_set][0]
+                # Counts game frames to control animation speed.          
+                'animation_frame_counter': 0,            
 
-                # Adds this enemy's complete data to the level's list.
-                self.level_enemies_data[level].append(enemy_data) 
+                # How many game frames pass before the animation changes to the next image.
+                'animation_speed_frames': animation_speed_frames,  
+
+                # Which set of animations (left or right) is currently active.          
+                'current_animation_set': initial_animation_set 
+            }
+
+            # Sets the enemy's displayed image to the first frame of its starting animation.
+            enemy_data['image'] = enemy_data['animations'][initial_animation_set][0]
+            enemy_data['mask'] = enemy_data['masks'][initial_animation_set][0]
+
+            # Adds this enemy's complete data to the level's list and its rect to the level's spatial hash.
+            self.level_enemies_data[level].append(enemy_data) 
+            self.level_spatial_hashes[level].insert(i, enemy_data['rect'])
+
+    def get_enemy_size(self, level):
+        # Returns the image size (width, height) of a level's enemy type.
+        return self.levels.get_level(level)['enemy_type']['size'] if level in self.levels else (80, 80)
+
+    def get_animation_speed_frames(self, level):
+        # Returns how many game frames pass before a level's enemies change to the next animation image.
+        return self.levels.get_level(level)['enemy_type']['animation_speed_frames'] if level in self.levels else 5
+
+    def get_enemy_speed(self, level, index):
+        # Returns how fast an enemy moves. Each enemy's speed comes from the level definition.
+        # Past the level's enemies, the speed keeps growing by the level's speed step.
+        level_data = self.levels.get_level(level)
+        if index < len(level_data['enemies']):
+            return level_data['enemies'][index]['speed']
+        return level_data['enemy_type']['speed'] + index * level_data['enemy_type']['speed_step']
 
     def update(self, current_level, character_rect):
         # Updates all enemies in the current level, handling their movement and animation.
@@ -143,10 +221,15 @@ class Enemy:
         if current_level not in self.level_enemies_data: 
             return 
 
+        spatial_hash = self.level_spatial_hashes[current_level]
+
         # Loops through each enemy that belongs to the current level.
-        for enemy_data in self.level_enemies_data[current_level]:
+        for index, enemy_data in enumerate(self.level_enemies_data[current_level]):
 
             if enemy_data['can_move']:
+                # Saves the position before moving for drawing between ticks.
+                enemy_data['previous_x'] = enemy_data['rect'].x
+
                 # Changes the enemy's horizontal position based on its speed and direction.
                 enemy_data['rect'].x += enemy_data['speed'] * enemy_data['direction']
 
@@ -159,6 +242,9 @@ class Enemy:
                 elif enemy_data['rect'].left <= 10:
                     enemy_data['direction'] = 1
                     enemy_data['current_animation_set'] = 'right'
+
+                # Moves the enemy to its new cells in the spatial hash (only if it crossed a cell border).
+                spatial_hash.update(index, enemy_data['rect'])
                 
                 # Increments the counter for animation frames.
                 enemy_data['animation_frame_counter'] += 1 
@@ -175,28 +261,44 @@ class Enemy:
 
                 # Sets the enemy's displayed image to the current frame of its active animation.
                 enemy_data['image'] = enemy_data['animations'][enemy_data['current_animation_set']][enemy_data['current_frame_index']]
+                enemy_data['mask'] = enemy_data['masks'][enemy_data['current_animation_set']][enemy_data['current_frame_index']]
 
-    def draw(self, screen, current_level):
+    def draw(self, screen, current_level, alpha=1.0):
         # Draws all active enemies for the given level onto the game screen.
+        # Alpha (0.0 to 1.0) blends each position between the previous and the current tick.
 
         # Do nothing if no enemies are set up for this level.
         if current_level not in self.level_enemies_data: 
             return 
         
         # Draws the enemy's current image at its position.
-        for enemy_data in self.level_enemies_data[current_level]:
-            screen.blit(enemy_data['image'], enemy_data['rect']) 
+        screen.blits(self.get_draw_list(current_level, alpha), doreturn=False)
+
+    def get_draw_list(self, current_level, alpha=1.0):
+        # Returns (image, position) pairs for every enemy in the given level.
+        return [(enemy_data['image'], self.get_draw_position(enemy_data, alpha))
+                for enemy_data in self.level_enemies_data.get(current_level, [])]
+
+    def get_draw_position(self, enemy_data, alpha=1.0):
+        # Returns the top-left position to draw an enemy at, between the previous and the current tick.
+        rect = enemy_data['rect']
+        if alpha >= 1.0:
+            return rect.topleft
+        previous_x = enemy_data['previous_x']
+        return (round(previous_x + (rect.x - previous_x) * alpha), rect.y)
 
     def reset_for_level(self, level):
         # Resets all enemies in a specific level to their original starting states.
         if level in self.level_enemies_data:
-            for enemy_data in self.level_enemies_data[level]:
+            for index, enemy_data in enumerate(self.level_enemies_data[level]):
                 
                 # Moves enemy back to its initial starting X and Y position.
                 enemy_data['rect'].topleft = (enemy_data['initial_x'], enemy_data['initial_y'])
+                enemy_data['previous_x'] = enemy_data['initial_x']
+                self.level_spatial_hashes[level].update(index, enemy_data['rect'])
 
                 # Randomly sets a new starting movement direction.
-                enemy_data['direction'] = random.choice([-1, 1]) 
+                enemy_data['direction'] = self.rng.choice([-1, 1]) 
 
                 # Updates the animation set based on the new random direction. (Using ternary)
                 enemy_data['current_animation_set'] = 'right' if enemy_data['direction'] == 1 else 'left'
@@ -212,6 +314,7 @@ class Enemy:
 
                 # Sets the enemy's image to the first frame of its newly determined animation set.
                 enemy_data['image'] = enemy_data['animations'][enemy_data['current_animation_set']][0]
+                enemy_data['mask'] = enemy_data['masks'][enemy_data['current_animation_set']][0]
 
     def reset_all_enemies(self):
         # Resets all enemies across all levels to their starting positions and states.
@@ -231,3 +334,58 @@ class Enemy:
         # This list is typically used to check for collisions with other game objects.
         # Uses .get() with an empty list as default to safely handle levels without enemies.
         return [enemy_data['rect'] for enemy_data in self.level_enemies_data.get(current_level, [])]
+
+    def find_colliding_enemy(self, current_level, rect, mask=None):
+        # Returns the index of the first enemy in the level that collides with rect, or -1 if none does.
+        # Only enemies in the spatial hash cells around rect are checked.
+        # If a mask is given, enemies whose rect touches rect are also checked pixel by pixel.
+        spatial_hash = self.level_spatial_hashes.get(current_level)
+        if not spatial_hash:
+            return -1
+        if mask is None:
+            return spatial_hash.collidelist(rect)
+
+        colliding = self.find_colliding_enemies(current_level, rect, mask, first_only=True)
+        return colliding[0] if colliding else -1
+
+    def find_colliding_enemies(self, current_level, rect, mask=None, first_only=False):
+        # Returns the indexes of all enemies in the level that collide with rect (and with mask, if given).
+        spatial_hash = self.level_spatial_hashes.get(current_level)
+        if not spatial_hash:
+            return []
+
+        # First check: rects only. This is cheap and rules out almost every enemy.
+        rect_hits = spatial_hash.collidelistall(rect)
+        if mask is None:
+            return rect_hits
+
+        # Second check: pixel masks, only for enemies whose rect touches rect.
+        colliding = []
+        for index in rect_hits:
+            enemy_data = self.level_enemies_data[current_level][index]
+            enemy_rect = enemy_data['rect']
+            if self.masks_overlap(rect, mask, enemy_rect, enemy_data['mask']):
+                colliding.append(index)
+                if first_only:
+                    break
+        return colliding
+
+    def masks_overlap(self, rect, mask, enemy_rect, enemy_mask):
+        # Checks if two masks placed at the top-left of their rects have any solid pixel in common.
+        self.mask_checks += 1
+        if mask.overlap(enemy_mask, (enemy_rect[0] - rect[0], enemy_rect[1] - rect[1])):
+            self.mask_hits += 1
+            return True
+        return False
+
+    def get_collision_stats(self):
+        # Returns the collision statistics of all levels added together.
+        totals = {'objects': 0, 'occupied_cells': 0, 'queries': 0, 'candidate_pairs': 0, 'colliding_pairs': 0}
+        for spatial_hash in self.level_spatial_hashes.values():
+            for name, value in spatial_hash.get_stats().items():
+                if name in totals:
+                    totals[name] += value
+        totals['candidates_per_query'] = totals['candidate_pairs'] / totals['queries'] if totals['queries'] else 0.0
+        totals['mask_checks'] = self.mask_checks
+        totals['mask_hits'] = self.mask_hits
+        return totals
@@ -0,0 +1,267 @@
+# ARRAY-BACKED ENEMY MANAGEMENT SYSTEM
+
+import pygame as pg
+import random
+
+# NumPy is only needed for this enemy backend. The normal Enemy class works without it.
+import numpy as np
+
+from enemy import Enemy
+from spatial_hash import SpatialHash
+
+class EnemyArray(Enemy):
+    # Works like Enemy, but keeps every enemy's data in NumPy arrays instead of one dictionary per enemy.
+    # All enemies of a level move, bounce and animate in one vectorized step, so it scales to thousands of enemies.
+    # Rects are only created for drawing and collisions, when they are asked for.
+
+    # Distance from the screen edges (in pixels) where enemies turn around (same as Enemy).
+    EDGE_MARGIN = 10
+
+    def initialize_all_enemies_data(self):
+        # Stores the arrays for each level, the loaded animation images, their collision masks and the rects for each level.
+        self.level_arrays = {}
+        self.level_animations = {}
+        self.level_masks = {}
+        self.level_rects = {}
+
+        # Keep the same attribute as Enemy, so code checking which levels have enemies still works.
+        self.level_enemies_data = self.level_rects
+
+        # Only level 1 is set up at startup, like Enemy.
+        self.load_level(1)
+
+    def load_level(self, level):
+        # Sets up the enemy arrays of a level, if they are not set up yet.
+        if level in self.level_arrays or level > self.max_level:
+            return
+
+        self.level_animations[level] = self.load_level_animations(level)
+        self.level_masks[level] = self.load_level_masks(self.level_animations[level])
+        positions = self.enemy_initial_positions.get(level, [])
+        speeds = [self.get_enemy_speed(level, i) for i in range(len(positions))]
+        self._create_level_arrays(level, positions, speeds)
+
+    def add_stress_level(self, level, enemy_count, seed=None):
+        # Replaces the enemies of a level with enemy_count enemies of the same type at random positions.
+        # Used to test crowded levels.
+        self.load_level(level)
+        rng = random.Random(seed) if seed is not None else self.rng
+        enemy_width, _ = self.get_enemy_size(level)
+        ground_y = self.enemy_initial_positions.get(level, [(0, self.screen_height - 260)])[0][1]
+
+        # Spread the enemies over the whole screen with speeds between the slowest and fastest normal enemy.
+        max_x = max(self.EDGE_MARGIN + 1, self.screen_width - enemy_width - self.EDGE_MARGIN - 1)
+        positions = [(rng.randint(self.EDGE_MARGIN + 1, max_x), ground_y) for _ in range(enemy_count)]
+        speeds = [rng.uniform(self.get_enemy_speed(level, 0), self.get_enemy_speed(level, 2)) for _ in range(enemy_count)]
+
+        self._create_level_arrays(level, positions, speeds, rng)
+
+    def _create_level_arrays(self, level, positions, speeds, rng=None):
+        # Creates the arrays holding every enemy of a level.
+        enemy_count = len(positions)
+        enemy_width, enemy_height = self.get_enemy_size(level)
+        initial_x = np.array([x for x, y in positions], dtype=np.float64)
+        initial_y = np.array([y for x, y in positions], dtype=np.float64)
+
+        self.level_arrays[level] = {
+            # Position, starting position and the X position from the previous tick.
+            'x': initial_x.copy(),
+            'y': initial_y.copy(),
+            'initial_x': initial_x,
+            'initial_y': initial_y,
+            'previous_x': initial_x.copy(),
+
+            # Size of the enemies in this level.
+            'width': enemy_width,
+            'height': enemy_height,
+
+            # Number of game frames before the animation changes to the next image.
+            'animation_speed_frames': self.get_animation_speed_frames(level),
+
+            # Speed and movement direction (-1 for left, 1 for right).
+            'speed': np.array(speeds, dtype=np.float64),
+            'direction': np.ones(enemy_count, dtype=np.int64),
+
+            # If this level's enemies are allowed to move.
+            'can_move': False,
+
+            # Current animation image and game frames counted since the last image change.
+            'frame_index': np.zeros(enemy_count, dtype=np.int64),
+            'frame_counter': np.zeros(enemy_count, dtype=np.int64),
+
+            # Random generator used for starting directions.
+            'rng': rng or self.rng,
+
+            # First and last spatial hash cell column each enemy covers.
+            'cell_x0': np.zeros(enemy_count, dtype=np.int64),
+            'cell_x1': np.zeros(enemy_count, dtype=np.int64)
+        }
+        self.level_rects[level] = [pg.Rect(int(x), int(y), enemy_width, enemy_height) for x, y in positions]
+
+        # Add every enemy to a new spatial hash for this level.
+        spatial_hash = SpatialHash(self.COLLISION_CELL_SIZE)
+        for index, rect in enumerate(self.level_rects[level]):
+            spatial_hash.insert(index, tuple(rect))
+        self.level_spatial_hashes[level] = spatial_hash
+
+        self.reset_for_level(level)
+
+    def update(self, current_level, character_rect):
+        # Moves, bounces and animates all enemies of the current level in one step.
+        arrays = self.level_arrays.get(current_level)
+        if arrays is None or not arrays['can_move']:
+            return
+
+        x = arrays['x']
+        direction = arrays['direction']
+
+        # Save the positions for drawing between ticks, then move. Positions are whole pixels like a pg.Rect.
+        arrays['previous_x'][:] = x
+        np.trunc(x + arrays['speed'] * direction, out=x)
+
+        # Enemies that hit the right edge turn left. Enemies that hit the left edge turn right.
+        hit_right = x + arrays['width'] >= self.screen_width - self.EDGE_MARGIN
+        hit_left = ~hit_right & (x <= self.EDGE_MARGIN)
+        direction[hit_right] = -1
+        direction[hit_left] = 1
+
+        # Only enemies that crossed a cell border are moved in the spatial hash.
+        self._update_spatial_hash(current_level)
+
+        # Count frames and move to the next animation image when enough frames have passed.
+        frame_counter = arrays['frame_counter']
+        frame_counter += 1
+        next_frame = frame_counter >= arrays['animation_speed_frames']
+        frame_counter[next_frame] = 0
+        frame_count = len(self.level_animations[current_level]['left'])
+        if frame_count:
+            frame_index = arrays['frame_index']
+            frame_index[next_frame] = (frame_index[next_frame] + 1) % frame_count
+
+    def _update_spatial_hash(self, level, update_all=False):
+        # Finds which enemies entered or left a grid cell and moves only those in the level's spatial hash.
+        arrays = self.level_arrays[level]
+        cell_size = self.COLLISION_CELL_SIZE
+        x = arrays['x']
+        cell_x0 = (x // cell_size).astype(np.int64)
+        cell_x1 = ((x + arrays['width'] - 1) // cell_size).astype(np.int64)
+
+        if update_all:
+            changed = range(len(x))
+        else:
+            changed = np.nonzero((cell_x0 != arrays['cell_x0']) | (cell_x1 != arrays['cell_x1']))[0].tolist()
+
+        spatial_hash = self.level_spatial_hashes[level]
+        y = arrays['y']
+        for index in changed:
+            spatial_hash.update(index, (x[index], y[index], arrays['width'], arrays['height']))
+
+        arrays['cell_x0'] = cell_x0
+        arrays['cell_x1'] = cell_x1
+
+    def find_colliding_enemy(self, current_level, rect, mask=None):
+        # Returns the index of the first enemy in the level that collides with rect, or -1 if none does.
+        colliding = self.find_colliding_enemies(current_level, rect, mask, first_only=True)
+        return colliding[0] if colliding else -1
+
+    def find_colliding_enemies(self, current_level, rect, mask=None, first_only=False):
+        # Returns the indexes of all enemies in the level that collide with rect (and with mask, if given).
+        # The spatial hash finds the nearby enemies, then their positions are checked straight from the arrays.
+        spatial_hash = self.level_spatial_hashes.get(current_level)
+        if spatial_hash is None:
+            return []
+
+        candidates = spatial_hash.query(rect)
+        if not candidates:
+            return []
+
+        arrays = self.level_arrays[current_level]
+        rect = pg.Rect(rect)
+        indexes = np.array(candidates, dtype=np.int64)
+        enemy_x = arrays['x'][indexes]
+        enemy_y = arrays['y'][indexes]
+        overlapping = ((enemy_x < rect.right) & (enemy_x + arrays['width'] > rect.left) &
+                       (enemy_y < rect.bottom) & (enemy_y + arrays['height'] > rect.top))
+
+        colliding = indexes[overlapping].tolist()
+        spatial_hash.colliding_pairs += len(colliding)
+        if mask is None:
+            return colliding
+
+        # Check the masks of the enemies whose rect touches rect, using each enemy's current animation image.
+        masks = self.level_masks[current_level]
+        pixel_colliding = []
+        for index in colliding:
+            enemy_mask = masks['right' if arrays['direction'][index] == 1 else 'left'][arrays['frame_index'][index]]
+            enemy_rect = (int(arrays['x'][index]), int(arrays['y'][index]))
+            if self.masks_overlap(rect, mask, enemy_rect, enemy_mask):
+                pixel_colliding.append(index)
+                if first_only:
+                    break
+        return pixel_colliding
+
+    def get_draw_list(self, current_level, alpha=1.0):
+        # Returns (image, position) pairs for every enemy in the given level.
+        arrays = self.level_arrays.get(current_level)
+        if arrays is None:
+            return []
+
+        # Blend between the previous and the current tick, then turn the positions into plain integers.
+        x = arrays['x']
+        if alpha < 1.0:
+            previous_x = arrays['previous_x']
+            x = np.rint(previous_x + (x - previous_x) * alpha)
+        draw_x = x.astype(np.int64).tolist()
+        draw_y = arrays['y'].astype(np.int64).tolist()
+
+        animations = self.level_animations[current_level]
+        left_frames, right_frames = animations['left'], animations['right']
+        if not left_frames or not right_frames:
+            return []
+
+        return [((right_frames if direction == 1 else left_frames)[frame], (enemy_x, enemy_y))
+                for direction, frame, enemy_x, enemy_y
+                in zip(arrays['direction'].tolist(), arrays['frame_index'].tolist(), draw_x, draw_y)]
+
+    def get_current_enemy_rects(self, current_level):
+        # Returns the rects of all enemies in the given level, updated to their current positions.
+        arrays = self.level_arrays.get(current_level)
+        if arrays is None:
+            return []
+
+        rects = self.level_rects[current_level]
+        for rect, enemy_x in zip(rects, arrays['x'].astype(np.int64).tolist()):
+            rect.x = enemy_x
+        return rects
+
+    def reset_for_level(self, level):
+        # Resets all enemies in a specific level to their original starting states.
+        arrays = self.level_arrays.get(level)
+        if arrays is None:
+            return
+
+        arrays['x'][:] = arrays['initial_x']
+        arrays['y'][:] = arrays['initial_y']
+        arrays['previous_x'][:] = arrays['initial_x']
+
+        # Randomly sets a new starting movement direction for every enemy.
+        rng = arrays['rng']
+        arrays['direction'][:] = [rng.choice([-1, 1]) for _ in range(len(arrays['direction']))]
+
+        # Stops the enemies from moving and resets their animation.
+        arrays['can_move'] = False
+        arrays['frame_index'][:] = 0
+        arrays['frame_counter'][:] = 0
+
+        # Put every enemy back in its starting cells.
+        self._update_spatial_hash(level, update_all=True)
+
+    def reset_all_enemies(self):
+        # Resets all enemies across all levels to their starting positions and states.
+        for level in self.level_arrays:
+            self.reset_for_level(level)
+
+    def start_movement_for_level(self, level):
+        # Enables movement for all enemies in a specific level.
+        if level in self.level_arrays:
+            self.level_arrays[level]['can_move'] = True
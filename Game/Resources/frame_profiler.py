@@ -0,0 +1,180 @@
+# FRAME PROFILING SYSTEM
+
+import pygame as pg
+import json
+import math
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+class FrameProfiler:
+    # Measures how long each phase of a frame takes (events, updates, collisions, drawing, presenting).
+    # Keeps the last frames of every phase to show rolling p50/p95/p99 timings in an overlay, and can
+    # record every measured phase as a Chrome / Perfetto trace-event file for offline analysis.
+
+    # Percentiles shown in the overlay.
+    PERCENTILES = (50, 95, 99)
+
+    # Number of frames between overlay text updates. Redrawing the text every frame would cost more than it shows.
+    OVERLAY_REFRESH_FRAMES = 15
+
+    # Colors and spacing of the overlay.
+    OVERLAY_BACKGROUND_COLOR = (20, 20, 20)
+    OVERLAY_TEXT_COLOR = (230, 230, 230)
+    OVERLAY_TITLE_COLOR = (255, 210, 80)
+    OVERLAY_PADDING = 10
+    OVERLAY_COLUMN_WIDTH = 90
+
+    def __init__(self, font=None, window_frames=240, trace_path=None, max_trace_events=2000000, enabled=True):
+        # If phases are timed at all. Runs that only simulate (like the game environments) turn it off to save the timing cost.
+        self.enabled = enabled
+        self.null_measure = nullcontext()
+
+        # Font used for the overlay text. Without a font, the overlay cannot be shown.
+        self.font = font
+
+        # Number of recent frames used for the percentiles.
+        self.window_frames = window_frames
+
+        # Store the time of every phase for the recent frames: {phase: deque of milliseconds}.
+        # Phases are kept in the order they were first seen, which is the order they run in a frame.
+        self.samples = {}
+
+        # Sum of each phase's time in the current frame (a phase can run more than once per frame).
+        self.frame_phase_times = {}
+        self.frame_start_time = None
+        self.frame_count = 0
+
+        # If the overlay is shown, and the last rendered overlay surface.
+        self.overlay_visible = False
+        self.overlay_surface = None
+        self.overlay_position = (self.OVERLAY_PADDING, self.OVERLAY_PADDING)
+
+        # Trace events as (name, start seconds, duration seconds). Only recorded when a trace file is given.
+        self.trace_path = trace_path
+        self.max_trace_events = max_trace_events
+        self.trace_events = []
+        self.trace_origin = time.perf_counter()
+
+    def begin_frame(self):
+        # Starts timing a new frame.
+        self.frame_phase_times = {}
+        self.frame_start_time = time.perf_counter()
+
+    def end_frame(self):
+        # Stores the phase times of the finished frame and its total time.
+        if self.frame_start_time is None:
+            return
+
+        end_time = time.perf_counter()
+        self.frame_phase_times['frame'] = end_time - self.frame_start_time
+        for phase, seconds in self.frame_phase_times.items():
+            samples = self.samples.get(phase)
+            if samples is None:
+                samples = self.samples[phase] = deque(maxlen=self.window_frames)
+            samples.append(seconds * 1000)
+
+        self._add_trace_event(f'frame {self.frame_count}', self.frame_start_time, end_time - self.frame_start_time)
+        self.frame_start_time = None
+        self.frame_count += 1
+
+        # Refresh the overlay text now and then while it is shown.
+        if self.overlay_visible and self.frame_count % self.OVERLAY_REFRESH_FRAMES == 0:
+            self.overlay_surface = None
+
+    def measure(self, phase):
+        # Times the code inside a 'with' block and adds it to the phase's time for this frame. Does nothing while disabled.
+        if not self.enabled:
+            return self.null_measure
+        return self._measure(phase)
+
+    @contextmanager
+    def _measure(self, phase):
+        # Times the block for measure().
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_time
+            self.frame_phase_times[phase] = self.frame_phase_times.get(phase, 0.0) + duration
+            self._add_trace_event(phase, start_time, duration)
+
+    def get_percentiles(self, phase):
+        # Returns the p50, p95 and p99 time (in milliseconds) of a phase over the recent frames.
+        samples = sorted(self.samples.get(phase, ()))
+        if not samples:
+            return tuple(0.0 for _ in self.PERCENTILES)
+
+        # Nearest-rank percentile: the smallest sample with at least p% of the samples at or below it.
+        return tuple(samples[max(0, math.ceil(percentile / 100 * len(samples)) - 1)] for percentile in self.PERCENTILES)
+
+    def get_stats(self):
+        # Returns {phase: {'p50': ms, 'p95': ms, 'p99': ms}} for every measured phase.
+        return {phase: dict(zip((f'p{percentile}' for percentile in self.PERCENTILES), self.get_percentiles(phase)))
+                for phase in self.samples}
+
+    def toggle_overlay(self):
+        # Shows or hides the timing overlay.
+        self.overlay_visible = not self.overlay_visible
+        self.overlay_surface = None
+
+    def draw_overlay(self, screen):
+        # Draws the timing overlay in the top-left corner and returns its rect, or None if it is hidden.
+        if not self.overlay_visible or self.font is None:
+            return None
+
+        if self.overlay_surface is None:
+            self.overlay_surface = self._render_overlay()
+        return screen.blit(self.overlay_surface, self.overlay_position)
+
+    def _render_overlay(self):
+        # Renders the overlay table (phase name and its percentiles) into one opaque surface.
+        # The surface is opaque so drawing it again on top of itself always gives the same pixels.
+        header = ['phase (ms)'] + [f'p{percentile}' for percentile in self.PERCENTILES]
+        phases = [phase for phase in self.samples if phase != 'frame'] + ['frame']
+        rows = [header] + [[phase] + [f'{value:.2f}' for value in self.get_percentiles(phase)] for phase in phases]
+
+        line_height = self.font.get_linesize()
+        name_width = max(self.font.size(row[0])[0] for row in rows)
+        width = name_width + self.OVERLAY_COLUMN_WIDTH * len(self.PERCENTILES) + self.OVERLAY_PADDING * 2
+        height = line_height * len(rows) + self.OVERLAY_PADDING * 2
+
+        surface = pg.Surface((width, height)).convert()
+        surface.fill(self.OVERLAY_BACKGROUND_COLOR)
+        for row_index, row in enumerate(rows):
+            color = self.OVERLAY_TITLE_COLOR if row_index == 0 else self.OVERLAY_TEXT_COLOR
+            y = self.OVERLAY_PADDING + row_index * line_height
+            surface.blit(self.font.render(row[0], True, color), (self.OVERLAY_PADDING, y))
+
+            # Right-align the numbers in their columns.
+            for column_index, value in enumerate(row[1:], start=1):
+                value_surface = self.font.render(value, True, color)
+                column_right = self.OVERLAY_PADDING + name_width + self.OVERLAY_COLUMN_WIDTH * column_index
+                surface.blit(value_surface, (column_right - value_surface.get_width(), y))
+        return surface
+
+    def _add_trace_event(self, name, start_time, duration):
+        # Records one phase for the trace file, if tracing is on and the event limit is not reached.
+        if self.trace_path and len(self.trace_events) < self.max_trace_events:
+            self.trace_events.append((name, start_time, duration))
+
+    def export_trace(self, path=None):
+        # Writes the recorded phases as Chrome trace events (JSON), which chrome://tracing and Perfetto can open.
+        # Returns the number of written events.
+        path = path or self.trace_path
+        if not path:
+            return 0
+
+        events = [{
+            'name': name,
+            'cat': 'frame' if name.startswith('frame ') else 'phase',
+            'ph': 'X',
+            'ts': (start_time - self.trace_origin) * 1000000,
+            'dur': duration * 1000000,
+            'pid': 1,
+            'tid': 1
+        } for name, start_time, duration in self.trace_events]
+
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+        return len(events)
@@ -0,0 +1,399 @@
+# GAME ENVIRONMENT SYSTEM
+
+# Lets automated players train and play against the game without a window, through a reset/step interface
+# like Gym's. Each environment runs a headless game and advances it one fixed tick per step.
+# VectorGameEnv runs many environments in worker processes that write into shared memory.
+# Run it from the folder that holds GAME_DEV_FINAL, like the game itself:
+#   python GAME_DEV_FINAL/game_env.py --envs 16 --steps 200000
+
+import os
+
+# Use SDL's dummy video and audio drivers. These must be set before Pygame starts.
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame as pg
+import argparse
+import multiprocessing
+import time
+import numpy as np
+
+from Goblin_Runner import Goblin_Runner, parse_resolution
+from headless import SimulatedKeys
+from level_pack import LEVEL_PACK_PATH, load_level_pack
+from scenes import STATE_GAMEPLAY, STATE_LEVEL_DIALOGUE, STATE_GAME_OVER, STATE_GAME_COMPLETED
+
+
+def get_observation_size(levels):
+    # Returns the length of the observation of a level pack: the character values and a slot for every enemy
+    # of the level with the most enemies.
+    max_enemies = max(len(levels.get_level(level)['enemies']) for level in range(1, levels.max_level + 1))
+    return GameEnv.CHARACTER_VALUES + max_enemies * GameEnv.ENEMY_VALUES
+
+
+class GameEnv:
+    # One game the player controls one tick at a time.
+    #   reset(seed) -> (observation, info)
+    #   step(action) -> (observation, reward, terminated, truncated, info)
+    # The observation is a float32 array: character x, y (as fractions of the screen size), 1.0 while jumping,
+    # the level (as a fraction of the last level), then x, y and 1.0 for every enemy of the level (zeros for empty slots).
+    # With frame_size, the observation is a dict with that array as 'state' and the downscaled screen as 'frame'
+    # (a height x width x 3 uint8 array). The returned arrays are reused by the next step, copy them to keep them.
+
+    # Actions are indexes into this list of held keys. SPACE makes the character jump, like a key press in the game.
+    ACTIONS = ((), (pg.K_a,), (pg.K_d,), (pg.K_SPACE,), (pg.K_a, pg.K_SPACE), (pg.K_d, pg.K_SPACE))
+    ACTION_NAMES = ('idle', 'left', 'right', 'jump', 'left_jump', 'right_jump')
+
+    # Number of observation values for the character and for each enemy.
+    CHARACTER_VALUES = 4
+    ENEMY_VALUES = 3
+
+    # Rewards: moving right earns the distance as a fraction of the screen width,
+    # reaching the next level (or finishing the last one) earns LEVEL_REWARD and dying costs DEATH_PENALTY.
+    LEVEL_REWARD = 1.0
+    DEATH_PENALTY = 1.0
+
+    def __init__(self, resolution=None, enemy_backend='dict', collision_mode='mask', frame_size=None, max_episode_steps=5000,
+                 start_level=1, seed=None, level_pack_path=LEVEL_PACK_PATH, observation=None, frame=None):
+        # Create a headless game. It never runs its own game loop, every step advances it by one tick.
+        # The screen size decides the game's speeds and distances, so the default is the game's headless size.
+        self.game = Goblin_Runner(headless=True, resolution=resolution, minimal_init=True, enemy_backend=enemy_backend,
+                                  collision_mode=collision_mode, seed=seed, level_pack_path=level_pack_path)
+        self.game.frame_profiler.enabled = False
+        self.start_level = start_level
+        self.max_episode_steps = max_episode_steps
+
+        # Store the observation arrays. The vector environment passes arrays in shared memory, so workers write straight into them.
+        self.observation_size = get_observation_size(self.game.levels)
+        self.observation = observation if observation is not None else np.zeros(self.observation_size, dtype=np.float32)
+        self.enemy_slots = (self.observation_size - self.CHARACTER_VALUES) // self.ENEMY_VALUES
+
+        # The downscaled screen is only drawn if a frame size (width, height) is given, because drawing a frame costs far more than a tick.
+        self.frame_size = frame_size
+        if frame_size:
+            self.frame_surface = pg.Surface(frame_size)
+            self.frame = frame if frame is not None else np.zeros((frame_size[1], frame_size[0], 3), dtype=np.uint8)
+        else:
+            self.frame_surface = None
+            self.frame = None
+
+        # Key states of every action, made once. The jump is sent to the scene as a SPACE key press.
+        self.action_keys = [SimulatedKeys(keys) for keys in self.ACTIONS]
+        self.action_jumps = [pg.K_SPACE in keys for keys in self.ACTIONS]
+        self.jump_event = pg.event.Event(pg.KEYDOWN, key=pg.K_SPACE, mod=0, unicode=' ', scancode=0)
+
+        # Step count and total reward of the current episode.
+        self.episode_steps = 0
+        self.episode_return = 0.0
+
+    def reset(self, seed=None):
+        # Starts a new episode at the start level, skipping the dialogue and the tutorial.
+        # A seed makes the enemy directions of the episode repeat exactly.
+        game = self.game
+
+        # Land the character if the last episode ended in a jump, so the start of the game puts it on the ground.
+        game.character.is_jumping = False
+        game.character.vertical_velocity = 0
+        game.start_game()
+        if self.start_level != 1:
+            game.current_level = self.start_level
+            game.load_level_assets(self.start_level)
+
+        # Reset the enemies of the start level. The enemy directions are drawn after seeding, so they only depend on the seed.
+        if seed is not None:
+            game.enemy_system.rng.seed(seed)
+        game.enemy_system.reset_for_level(game.current_level)
+        self._start_gameplay()
+
+        self.episode_steps = 0
+        self.episode_return = 0.0
+        return self._get_observation(), self._get_info()
+
+    def step(self, action):
+        # Holds the keys of the action for one tick and returns what happened.
+        game = self.game
+        character = game.character
+        if self.action_jumps[action]:
+            game.scene_stack.top.handle_event(self.jump_event)
+
+        previous_x = character.rect.x
+        previous_level = game.current_level
+        game.update_simulation(self.action_keys[action])
+
+        # Reward moving right within a level. Reaching a new level puts the character back at the left edge.
+        reward = 0.0
+        terminated = False
+        state = game.game_state
+        if game.current_level == previous_level:
+            reward = (character.rect.x - previous_x) / game.screen_width
+
+        if state == STATE_LEVEL_DIALOGUE:
+            # The next level started. Skip its dialogue.
+            reward += self.LEVEL_REWARD
+            self._start_gameplay()
+        elif state == STATE_GAME_COMPLETED:
+            reward += self.LEVEL_REWARD
+            terminated = True
+        elif state == STATE_GAME_OVER:
+            reward -= self.DEATH_PENALTY
+            terminated = True
+
+        self.episode_steps += 1
+        self.episode_return += reward
+        truncated = not terminated and self.episode_steps >= self.max_episode_steps
+        return self._get_observation(), reward, terminated, truncated, self._get_info()
+
+    def close(self):
+        # Stops the asset prefetch thread of the game. Pygame is left running for other environments in the process.
+        self.game.assets.shutdown()
+
+    def _start_gameplay(self):
+        # Starts the current level the way the end of its dialogue (or of the tutorial) does.
+        game = self.game
+        game.game_dialogue.dialogue_active = False
+        game.switch_scene(STATE_GAMEPLAY)
+        game.game_active = True
+        game.level_transition_cooldown = game.game_dialogue.COOLDOWN_FRAMES
+        game.enemy_system.start_movement_for_level(game.current_level)
+
+    def _get_observation(self):
+        # Writes the character and enemy positions (and the frame) into the observation arrays.
+        game = self.game
+        width, height = game.screen_width, game.screen_height
+        rect = game.character.rect
+        values = [rect.x / width, rect.y / height, float(game.character.is_jumping), game.current_level / game.MAX_LEVEL]
+        for enemy_rect in game.enemy_system.get_current_enemy_rects(game.current_level)[:self.enemy_slots]:
+            values += (enemy_rect.x / width, enemy_rect.y / height, 1.0)
+
+        self.observation[:len(values)] = values
+        self.observation[len(values):] = 0.0
+        if self.frame is None:
+            return self.observation
+
+        # Draw the screen and scale it down into the frame array (Pygame pixel arrays are x by y, so they are swapped).
+        game.draw_frame(self.action_keys[0], 1.0)
+        pg.transform.scale(game.screen, self.frame_size, self.frame_surface)
+        pixels = pg.surfarray.pixels3d(self.frame_surface)
+        self.frame[...] = pixels.swapaxes(0, 1)
+        del pixels
+        return {'state': self.observation, 'frame': self.frame}
+
+    def _get_info(self):
+        # Extra information about the step that is not part of the observation.
+        return {'level': self.game.current_level, 'episode_steps': self.episode_steps}
+
+
+class VectorGameEnv:
+    # Runs num_envs environments in worker processes and steps them all together.
+    #   reset(seed) -> (observations, infos)
+    #   step(actions) -> (observations, rewards, terminated, truncated, infos)
+    # Observations, frames, rewards and end flags are arrays in shared memory with one row per environment,
+    # so a step only sends one short message to each worker and back. The returned arrays are overwritten by the next step.
+    # An environment whose episode ended is reset by its worker at once: its row already holds the first observation
+    # of the next episode, and infos['episodes'] lists the finished episodes.
+
+    def __init__(self, num_envs, num_workers=None, frame_size=None, level_pack_path=LEVEL_PACK_PATH, seed=None, start_method='spawn', **env_settings):
+        # Split the environments over the workers. Each worker steps its environments one after another.
+        self.num_envs = num_envs
+        self.num_workers = min(num_envs, num_workers or os.cpu_count() or 1)
+        self.frame_size = frame_size
+        self.closed = False
+
+        # Every environment gets its own seed, so their enemies move differently.
+        base_seed = seed if seed is not None else int.from_bytes(os.urandom(4), 'little')
+
+        # Create the shared arrays: {name: (shape, dtype)}. The memory lives as long as any array made from it,
+        # so arrays returned by step stay readable after close.
+        context = multiprocessing.get_context(start_method)
+        self.observation_size = get_observation_size(load_level_pack(level_pack_path))
+        array_layout = {
+            'observations': ((num_envs, self.observation_size), np.float32),
+            'actions': ((num_envs,), np.int64),
+            'rewards': ((num_envs,), np.float32),
+            'terminated': ((num_envs,), np.bool_),
+            'truncated': ((num_envs,), np.bool_),
+            'levels': ((num_envs,), np.int64)
+        }
+        if frame_size:
+            array_layout['frames'] = ((num_envs, frame_size[1], frame_size[0], 3), np.uint8)
+        shared_layout = {name: (context.RawArray('B', int(np.prod(shape)) * np.dtype(dtype).itemsize), shape, dtype)
+                         for name, (shape, dtype) in array_layout.items()}
+        self.arrays = _attach_arrays(shared_layout)
+
+        # Start the workers. Each one creates its games and answers on its pipe when they are ready.
+        self.pipes = []
+        self.workers = []
+        for worker_index in range(self.num_workers):
+            env_indexes = list(range(worker_index, num_envs, self.num_workers))
+            parent_pipe, worker_pipe = context.Pipe()
+            settings = dict(env_settings, frame_size=frame_size, level_pack_path=level_pack_path)
+            worker = context.Process(target=_run_worker, args=(worker_pipe, env_indexes, shared_layout, settings, base_seed),
+                                     name=f'game-env-{worker_index}', daemon=True)
+            worker.start()
+            worker_pipe.close()
+            self.pipes.append(parent_pipe)
+            self.workers.append(worker)
+        self._receive_all()
+
+    def reset(self, seed=None):
+        # Starts a new episode in every environment. Environment i uses seed + i.
+        self._send_all('reset', seed)
+        self._receive_all()
+        return self._get_observations(), {'level': self.arrays['levels']}
+
+    def step(self, actions):
+        # Takes one action per environment and advances every environment by one tick.
+        self.arrays['actions'][:] = actions
+        self._send_all('step', None)
+        episodes = [episode for reply in self._receive_all() for episode in reply]
+        return (self._get_observations(), self.arrays['rewards'], self.arrays['terminated'], self.arrays['truncated'],
+                {'level': self.arrays['levels'], 'episodes': episodes})
+
+    def close(self):
+        # Stops the workers. The shared memory is freed when the last array using it is gone.
+        if self.closed:
+            return
+        self.closed = True
+        for pipe in self.pipes:
+            try:
+                pipe.send(('close', None))
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        for pipe in self.pipes:
+            pipe.close()
+
+    def _get_observations(self):
+        # The observation arrays in the same form as GameEnv's, with one row per environment.
+        if self.frame_size:
+            return {'state': self.arrays['observations'], 'frame': self.arrays['frames']}
+        return self.arrays['observations']
+
+    def _send_all(self, command, data):
+        # Sends a command to every worker.
+        for pipe in self.pipes:
+            pipe.send((command, data))
+
+    def _receive_all(self):
+        # Waits for every worker to answer. A worker that failed sends its error, which is raised here.
+        replies = []
+        for pipe in self.pipes:
+            try:
+                status, reply = pipe.recv()
+            except EOFError:
+                status, reply = 'error', 'The worker process stopped without an answer.'
+            if status == 'error':
+                self.close()
+                raise RuntimeError(f"Game environment worker failed:\n{reply}")
+            replies.append(reply)
+        return replies
+
+
+def _attach_arrays(shared_layout):
+    # Returns {name: NumPy array} viewing the shared memory blocks of {name: (block, shape, dtype)}.
+    return {name: np.frombuffer(block, dtype=dtype).reshape(shape) for name, (block, shape, dtype) in shared_layout.items()}
+
+
+def _run_worker(pipe, env_indexes, shared_layout, settings, base_seed):
+    # Runs in a worker process: creates the environments, then steps or resets them on every command from the pipe.
+    import traceback
+
+    envs = []
+    try:
+        # Attach to the shared arrays. Each environment writes its observation into its own row.
+        arrays = _attach_arrays(shared_layout)
+        for index in env_indexes:
+            envs.append(GameEnv(seed=base_seed + index, observation=arrays['observations'][index],
+                                frame=arrays['frames'][index] if 'frames' in arrays else None, **settings))
+        pipe.send(('ok', None))
+
+        while True:
+            command, data = pipe.recv()
+            if command == 'step':
+                # Step every environment. Finished episodes are reported and started again.
+                # The results are collected in lists and written to the shared arrays at once.
+                episodes = []
+                rewards, terminated_flags, truncated_flags, levels = [], [], [], []
+                for index, env, action in zip(env_indexes, envs, arrays['actions'][env_indexes].tolist()):
+                    _, reward, terminated, truncated, info = env.step(action)
+                    if terminated or truncated:
+                        episodes.append({'env': index, 'return': env.episode_return, 'steps': env.episode_steps, 'level': info['level']})
+                        env.reset()
+                    rewards.append(reward)
+                    terminated_flags.append(terminated)
+                    truncated_flags.append(truncated)
+                    levels.append(env.game.current_level)
+                arrays['rewards'][env_indexes] = rewards
+                arrays['terminated'][env_indexes] = terminated_flags
+                arrays['truncated'][env_indexes] = truncated_flags
+                arrays['levels'][env_indexes] = levels
+                pipe.send(('ok', episodes))
+
+            elif command == 'reset':
+                for index, env in zip(env_indexes, envs):
+                    env.reset(seed=data + index if data is not None else None)
+                    arrays['levels'][index] = env.game.current_level
+                arrays['rewards'][env_indexes] = 0.0
+                arrays['terminated'][env_indexes] = False
+                arrays['truncated'][env_indexes] = False
+                pipe.send(('ok', None))
+
+            elif command == 'close':
+                break
+    except (KeyboardInterrupt, EOFError):
+        pass
+    except Exception:
+        pipe.send(('error', traceback.format_exc()))
+    finally:
+        for env in envs:
+            env.close()
+        pg.quit()
+
+
+if __name__ == '__main__':
+    # Read the command line options.
+    parser = argparse.ArgumentParser(description='Measure how many steps per second the Goblin Runner environments run, with random actions')
+    parser.add_argument('--envs', type=int, default=1, help='number of environments (more than 1 runs them in worker processes)')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (one per CPU by default)')
+    parser.add_argument('--steps', type=int, default=100000, help='total number of environment steps to run')
+    parser.add_argument('--frame-size', type=parse_resolution, default=None, help='also observe the screen, downscaled to WIDTHxHEIGHT')
+    parser.add_argument('--enemy-backend', choices=['dict', 'numpy'], default='dict', help='how enemy data is stored and updated')
+    parser.add_argument('--collision', choices=['mask', 'rect'], default='mask', help='check collisions with pixel masks or with shrunken boxes')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the enemy directions and the random actions')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    action_count = len(GameEnv.ACTIONS)
+    if args.envs == 1:
+        env = GameEnv(frame_size=args.frame_size, enemy_backend=args.enemy_backend, collision_mode=args.collision, seed=args.seed)
+        env.reset(seed=args.seed)
+        episode_count = 0
+        actions = rng.integers(action_count, size=args.steps)
+        start_time = time.perf_counter()
+        for action in actions:
+            _, _, terminated, truncated, _ = env.step(action)
+            if terminated or truncated:
+                episode_count += 1
+                env.reset()
+        elapsed_seconds = time.perf_counter() - start_time
+        env.close()
+        step_count = args.steps
+    else:
+        env = VectorGameEnv(args.envs, num_workers=args.workers, frame_size=args.frame_size, enemy_backend=args.enemy_backend,
+                            collision_mode=args.collision, seed=args.seed)
+        env.reset(seed=args.seed)
+        episode_count = 0
+        batch_count = max(1, args.steps // args.envs)
+        start_time = time.perf_counter()
+        for _ in range(batch_count):
+            _, _, _, _, infos = env.step(rng.integers(action_count, size=args.envs))
+            episode_count += len(infos['episodes'])
+        elapsed_seconds = time.perf_counter() - start_time
+        env.close()
+        step_count = batch_count * args.envs
+
+    print(f"Ran {step_count} steps in {elapsed_seconds:.2f} s ({step_count / elapsed_seconds:.0f} steps per second), {episode_count} episodes finished")
+    pg.quit()
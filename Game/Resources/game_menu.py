@@ -1,63 +1,68 @@
 # GAME MENU MANAGEMENT SYSTEM
 
 import pygame as pg
-import sys
+
+from asset_manager import AssetManager, shared_assets
+from ui_widgets import Button, Label, Panel, WidgetScreen
 
 class GameMenu:
     # Define standard dimensions for buttons.
     BUTTON_DIMS = {'main': (400, 100), 'back': (250, 80)}
 
+    # Define the main menu buttons from top to bottom, the smallest and largest gap between them,
+    # and the space kept free below the last one.
+    MAIN_BUTTONS = ('start', 'endless', 'credits', 'quit')
+    BUTTON_GAP_RANGE = (10, 30)
+    BUTTON_BOTTOM_MARGIN = 40
+
     # Define specified colors for the game menu.
     COLORS = {'button': (104, 37, 37), 'hover': (150, 50, 50), 'text': (255, 255, 255), 'title_text': (0, 0, 0)}
 
-    def __init__(self, screen, game_instance):
+    def __init__(self, screen, game_instance, assets=None):
         # Stores the Pygame screen surface. Keeps a reference to the main game object.
         self.screen = screen
         self.game = game_instance
 
+        # Use the given asset manager, or the shared one.
+        self.assets = assets or shared_assets
+
         # Gets the width and height of the game screen.
         self.screen_width = screen.get_width()
         self.screen_height = screen.get_height()
 
         # Set the file path for the custom font and set the various variable with specified size.
         self.font_path = 'GAME_DEV_FINAL/assets/font/bytebounce/ByteBounce.ttf'
-        self.font_large = pg.font.Font(self.font_path, 220)
-        self.font_medium = pg.font.Font(self.font_path, 100)
-        self.font_regular = pg.font.Font(self.font_path, 70)
-        self.font_small = pg.font.Font(self.font_path, 50)
+        self.font_large = self.assets.load_font(self.font_path, 220)
+        self.font_medium = self.assets.load_font(self.font_path, 100)
+        self.font_regular = self.assets.load_font(self.font_path, 70)
+        # The credits text is smaller on screens shorter than 1080 pixels, so the credits screen fits on them.
+        self.font_small = self.assets.load_font(self.font_path, round(50 * min(1.0, self.screen_height / 1080)))
 
         # Pre-render text surfaces.
         self.text_surfaces = {
             'title': self.font_large.render('Goblin Runner', True, self.COLORS['title_text']),
             'demo': self.font_medium.render('Demo', True, self.COLORS['title_text']),
             'start': self.font_regular.render('Start Game', True, self.COLORS['text']),
+            'endless': self.font_regular.render('Endless', True, self.COLORS['text']),
             'credit_button': self.font_regular.render('Credits', True, self.COLORS['text']),
             'quit': self.font_regular.render('Quit', True, self.COLORS['text']),
             'back': self.font_regular.render('Back', True, self.COLORS['text']),
             'credits_title': self.font_regular.render('Credits', True, self.COLORS['text'])
         }
 
-        # Define rectangles for all buttons.
-        self.button_rects = {
-            'start': pg.Rect(0, 0, *self.BUTTON_DIMS['main']),
-            'credits': pg.Rect(0, 0, *self.BUTTON_DIMS['main']),
-            'quit': pg.Rect(0, 0, *self.BUTTON_DIMS['main']),
-            'back': pg.Rect(0, 0, *self.BUTTON_DIMS['back'])
-        }
-
-        # Position the main menu buttons on the center of the screen.
-        self.button_rects['start'].center = (self.screen_width // 2, self.screen_height // 2 + 50)
-        self.button_rects['credits'].center = (self.screen_width // 2, self.screen_height // 2 + 180)
-        self.button_rects['quit'].center = (self.screen_width // 2, self.screen_height // 2 + 310)
-        self.button_rects['back'].center = (self.screen_width // 2, self.screen_height - 150)
+        # Define rectangles for all buttons. The main menu buttons are placed by _layout_main_buttons(),
+        # and the "Back" button below the credits by _build_credits_screen().
+        self.button_rects = self._layout_main_buttons()
+        self.button_rects['back'] = pg.Rect(0, 0, *self.BUTTON_DIMS['back'])
 
         # Set a flag to know if the main menu is active.
         self.menu_active = True
 
         # Load and scale the background image to fit the screen.
-        self.background_image_scaled = pg.transform.scale(
-            pg.image.load('GAME_DEV_FINAL/assets/background/intro.png'),
-            (self.screen_width, self.screen_height)
+        self.background_image_scaled = self.assets.load_image(
+            'GAME_DEV_FINAL/assets/background/intro.png',
+            (self.screen_width, self.screen_height),
+            AssetManager.OPAQUE
         )
 
         # Add data for the credits screen: roles, names, and copyright.
@@ -71,6 +76,10 @@ class GameMenu:
             {'type': 'message', 'text': 'Copyright 2025. All rights reserved.'},
         ]
 
+        # Lay out the main menu and the credits screen once. Drawing them only paints the widgets that changed.
+        self.main_screen = self._build_main_screen()
+        self.credits_screen = self._build_credits_screen()
+
     def handle_events(self, events):
         # Checks mouse events in game menu. The return statement here will stop processing events.
         if self.menu_active:
@@ -85,70 +94,79 @@ class GameMenu:
                         self.menu_active = False
                         self.game.start_game()
                         return
+
+                    # Check if "Endless" button was clicked.
+                    elif self.button_rects["endless"].collidepoint(mouse_pos):
+                        self.menu_active = False
+                        self.game.start_endless()
+                        return
                     
-                    # Check if "Credits" button was clicked.
+                    # Check if "Credits" button was clicked. The credits are shown on top of the main menu.
                     elif self.button_rects["credits"].collidepoint(mouse_pos): 
                         self.menu_active = False
-                        self.game.game_state = self.game.STATE_CREDITS
+                        self.game.scene_stack.push(self.game.scenes[self.game.STATE_CREDITS])
                         return
                     
-                    # Check if "Quit" button was clicked.
+                    # Check if "Quit" button was clicked. The game loop ends on the QUIT event and shuts down like
+                    # when the window is closed (it writes the trace, closes the recording and stops the loader threads).
                     elif self.button_rects["quit"].collidepoint(mouse_pos): 
-                        pg.quit()
-                        sys.exit()
+                        pg.event.post(pg.event.Event(pg.QUIT))
+                        return
 
         # While in credits screen, check the mouse events.
-        elif self.game.game_state == self.game.STATE_CREDITS:
+        else:
             for event in events:
-                # If the left mouse button was clicked, check if "Back" button was clicked and change game state back to main menu.
+                # If the left mouse button was clicked, check if "Back" button was clicked and go back to the main menu under the credits.
                 if event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
                     if self.button_rects["back"].collidepoint(event.pos): 
-                        self.game.game_state = self.game.STATE_MAIN_MENU 
+                        self.game.scene_stack.pop()
                         self.menu_active = True
                         return
+    def get_hovered_button(self):
+        # Returns the name of the button under the mouse on the current screen, or None.
+        mouse_pos = self.game.get_mouse_position()
+        names = ['start', 'endless', 'credits', 'quit'] if self.menu_active else ['back']
+        for name in names:
+            if self.button_rects[name].collidepoint(mouse_pos):
+                return name
+        return None
+
+    def invalidate(self):
+        # Makes the next menu or credits draw paint the whole screen, after something else was shown on it.
+        self.main_screen.invalidate()
+        self.credits_screen.invalidate()
+
     def draw(self):
-        # Draws the main menu elements on the screen.
+        # Draws the main menu on the screen. Only the buttons whose hover state changed are drawn again.
+        # Returns None if the whole screen was drawn, or the list of screen areas that changed.
         if not self.menu_active:
-            return
-        
-        # Draw the background image.
-        self.screen.blit(self.background_image_scaled, (0, 0))
-
-        # Draw the game title and demo subtitle.
-        self.screen.blit(self.text_surfaces["title"], 
-                         self.text_surfaces["title"].get_rect(center=(self.screen_width // 2, self.screen_height // 2 - 200)))
-        self.screen.blit(self.text_surfaces["demo"], 
-                         self.text_surfaces["demo"].get_rect(center=(self.screen_width // 2, self.screen_height // 2 - 130)))
-
-        # Get the current mouse position.
-        mouse_pos = pg.mouse.get_pos()
-
-        # Change button colors based on whether the mouse is hovering over them.
-        start_color = self.COLORS["hover"] if self.button_rects["start"].collidepoint(mouse_pos) else self.COLORS["button"]
-        credits_color = self.COLORS["hover"] if self.button_rects["credits"].collidepoint(mouse_pos) else self.COLORS["button"]
-        quit_color = self.COLORS["hover"] if self.button_rects["quit"].collidepoint(mouse_pos) else self.COLORS["button"]
-        
-        # Draw the Start Game button and its rectangle. Draw the text on the button.
-        pg.draw.rect(self.screen, start_color, self.button_rects["start"], border_radius=10) # Draws the button rectangle.
-        self.screen.blit(self.text_surfaces["start"], self.text_surfaces["start"].get_rect(center=self.button_rects["start"].center))
+            return []
 
-        # Draw the Credits button and its rectangle. Draw the text on the button.
-        pg.draw.rect(self.screen, credits_color, self.button_rects["credits"], border_radius=10)
-        self.screen.blit(self.text_surfaces["credit_button"], 
-                         self.text_surfaces["credit_button"].get_rect(center=self.button_rects["credits"].center))
-
-        # Draw the Quit button and its rectangle. Draw the text on the button.
-        pg.draw.rect(self.screen, quit_color, self.button_rects["quit"], border_radius=10)
-        self.screen.blit(self.text_surfaces["quit"], self.text_surfaces["quit"].get_rect(center=self.button_rects["quit"].center)) 
-
-        pg.display.flip()
+        # Get the current mouse position (recorded or replayed like the rest of the input).
+        self.main_screen.update_hover(self.game.get_mouse_position())
+        return self.main_screen.draw(self.screen)
 
     def draw_credits_screen(self):
-        # Draws all the elements for the credits screen.
-        self.screen.blit(self.background_image_scaled, (0, 0)) # Draw the background image.
+        # Draws the credits screen. Only the "Back" button is drawn again when the mouse moves onto or off it.
+        # Returns None if the whole screen was drawn, or the list of screen areas that changed.
+        self.credits_screen.update_hover(self.game.get_mouse_position())
+        return self.credits_screen.draw(self.screen)
+
+    def _build_main_screen(self):
+        # Creates the widgets of the main menu: the title, the subtitle and the buttons.
+        widgets = [
+            Label(self.text_surfaces["title"], center=(self.screen_width // 2, self.screen_height // 2 - 200)),
+            Label(self.text_surfaces["demo"], center=(self.screen_width // 2, self.screen_height // 2 - 130))
+        ]
+        for name, text_key in [('start', 'start'), ('endless', 'endless'), ('credits', 'credit_button'), ('quit', 'quit')]:
+            widgets.append(self._make_button(name, text_key))
+        return WidgetScreen(self.background_image_scaled, widgets)
+
+    def _build_credits_screen(self):
+        # Creates the widgets of the credits screen: the title box, the role and name columns, the footer and the "Back" button.
 
         # Constants for layout and spacing on the credits screen.
-        HORIZONTAL_PAD, VERTICAL_PAD, COLUMN_GAP = 20, 30, 20
+        HORIZONTAL_PAD, VERTICAL_PAD, COLUMN_GAP, SECTION_GAP = 20, 30, 20, 50
         LINE_SPACING_ENTRY, LINE_SPACING_NAME = 5, 5 
 
         # Set variables to track content dimensions.
@@ -173,17 +191,15 @@ class GameMenu:
                 if names_surfs:
                     max_names_width = max(max_names_width, max(s.get_width() for s in names_surfs)) 
 
-                # Get height of the role text.
-                role_height = role_surf.get_height()
-
-                # Calculate total height for names.
+                # Calculate total height for names, and the height of the whole entry.
                 names_height = sum(s.get_height() for s in names_surfs) + max(0, (len(names_surfs) - 1)) * LINE_SPACING_NAME 
+                entry_height = max(role_surf.get_height(), names_height)
                 
                 # Add to total height.
-                total_content_height += max(role_height, names_height) + LINE_SPACING_ENTRY 
+                total_content_height += entry_height + LINE_SPACING_ENTRY 
 
                 # Store rendered surfaces.
-                processed_lines.append((role_surf, names_surfs))
+                processed_lines.append((role_surf, names_surfs, entry_height))
 
             # If it's a copyright text, render and store the message.
             elif item['type'] == "message": 
@@ -198,72 +214,75 @@ class GameMenu:
         # X-coordinate to center the columns.
         start_x_columns = (self.screen_width - total_columns_width) // 2 
         
+        # Stack the title box, the columns, the footer messages and the "Back" button, centered on the screen.
+        # The gaps between them shrink on short screens, so everything fits.
+        title_box_height = self.text_surfaces["credits_title"].get_height() + 40
+        footer_height = sum(msg_surf.get_height() for msg_surf in footer_messages)
+        stack_height = title_box_height + common_col_height + footer_height + self.button_rects['back'].height
+        section_gap = max(0, min(SECTION_GAP, (self.screen_height - stack_height) // 5))
+        top_y = (self.screen_height - stack_height - 3 * section_gap) // 2
+
         # Customize position and size for the "Credits" title box.
         title_box_width = max(total_columns_width, self.text_surfaces["credits_title"].get_width() + 80)
-        # Create title box rectangle.
-        credits_title_box_rect = pg.Rect(start_x_columns, self.screen_height // 2 - common_col_height // 2 - 150, 
-                                         title_box_width, self.text_surfaces["credits_title"].get_height() + 40) 
-        credits_title_text_rect = self.text_surfaces["credits_title"].get_rect(center=credits_title_box_rect.center)
-
-        # Draw the title box.
-        pg.draw.rect(self.screen, self.COLORS["button"], credits_title_box_rect, border_radius=10) 
-
-        # Draw the title text.
-        self.screen.blit(self.text_surfaces["credits_title"], credits_title_text_rect)
+        credits_title_box_rect = pg.Rect(start_x_columns, top_y, title_box_width, title_box_height)
 
-        # Calculate starting Y-position for the credit columns.
-        start_y_columns = credits_title_box_rect.bottom + 50
-
-        # Create rectangles for the background of the role and name columns.
+        # Create rectangles for the background of the role and name columns, below the title box.
+        start_y_columns = credits_title_box_rect.bottom + section_gap
         role_column_rect = pg.Rect(start_x_columns, start_y_columns, role_col_width, common_col_height) 
         names_column_rect = pg.Rect(role_column_rect.right + COLUMN_GAP, start_y_columns, names_col_width, common_col_height)
 
-        # Draw role and names column background.
-        pg.draw.rect(self.screen, self.COLORS["button"], role_column_rect, border_radius=10)
-        pg.draw.rect(self.screen, self.COLORS["button"], names_column_rect, border_radius=10)
+        # The title box, its text and the column backgrounds.
+        widgets = [
+            Panel(credits_title_box_rect, self.COLORS["button"]),
+            Label(self.text_surfaces["credits_title"], center=credits_title_box_rect.center),
+            Panel(role_column_rect, self.COLORS["button"]),
+            Panel(names_column_rect, self.COLORS["button"])
+        ]
 
-        # Starting Y for the first credit entry.
+        # Place each credit entry: the role in the left column and its names below each other in the right column.
         current_y_entry = role_column_rect.top + VERTICAL_PAD
+        for role_surf, names_surfs, entry_height in processed_lines:
+            widgets.append(Label(role_surf, centerx=role_column_rect.centerx, top=current_y_entry))
 
-        # Draw each credit entry (role and names). Position the role text and draw it.
-        for role_surf, names_surfs in processed_lines:
-            role_text_rect = role_surf.get_rect(centerx=role_column_rect.centerx, top=current_y_entry) 
-            self.screen.blit(role_surf, role_text_rect)
-
-            # Start Y for names in this entry
             current_y_name = current_y_entry
-
             for name_surf in names_surfs:
-                # Position name text and draw it.
-                name_text_rect = name_surf.get_rect(centerx=names_column_rect.centerx, top=current_y_name) 
-                self.screen.blit(name_surf, name_text_rect)
-
-                # Move Y down for next name.
+                widgets.append(Label(name_surf, centerx=names_column_rect.centerx, top=current_y_name))
                 current_y_name += name_surf.get_height() + LINE_SPACING_NAME
             
-            # Calculate total height of this entry.
-            entry_height = max(role_surf.get_height(), sum(s.get_height() for s in names_surfs) + max(0, (len(names_surfs) - 1)) * LINE_SPACING_NAME)
-            
             # Move Y down for the next credit entry.
             current_y_entry += entry_height + LINE_SPACING_ENTRY
 
-        # Draw footer messages (like copyright).
-        footer_y = max(role_column_rect.bottom, names_column_rect.bottom) + 150
-
-        # Loop through each footer message and draw the message.
+        # Place footer messages (like copyright) below the columns, and the "Back" button below them.
+        footer_y = role_column_rect.bottom + section_gap
         for msg_surf in footer_messages: 
-            self.screen.blit(msg_surf, msg_surf.get_rect(centerx=self.screen_width // 2, top=footer_y))
-
-        # Draw the "Back" button.
-        mouse_pos = pg.mouse.get_pos()
-
-        # Determine button color.
-        back_color = self.COLORS["hover"] if self.button_rects["back"].collidepoint(mouse_pos) else self.COLORS["button"]
-
-        # Draw the back button rectangle.
-        pg.draw.rect(self.screen, back_color, self.button_rects["back"], border_radius=10)
-
-        # Draw the "Back" text.
-        self.screen.blit(self.text_surfaces["back"], self.text_surfaces["back"].get_rect(center=self.button_rects["back"].center))
-
-        pg.display.flip()
+            widgets.append(Label(msg_surf, centerx=self.screen_width // 2, top=footer_y))
+            footer_y += msg_surf.get_height()
+        self.button_rects['back'].midtop = (self.screen_width // 2, footer_y + section_gap)
+
+        # The "Back" button.
+        widgets.append(self._make_button('back', 'back'))
+        return WidgetScreen(self.background_image_scaled, widgets)
+
+    def _layout_main_buttons(self):
+        # Stacks the main menu buttons in the lower half of the screen, so all of them fit on any screen height.
+        # The gap between them shrinks on short screens (like 1280x720), and the buttons get shorter if even the smallest gap is too big.
+        button_width, button_height = self.BUTTON_DIMS['main']
+        min_gap, max_gap = self.BUTTON_GAP_RANGE
+        count = len(self.MAIN_BUTTONS)
+        top = self.screen_height // 2
+        available_height = self.screen_height - self.BUTTON_BOTTOM_MARGIN - top
+
+        button_height = min(button_height, (available_height - (count - 1) * min_gap) // count)
+        gap = min(max_gap, (available_height - count * button_height) // (count - 1))
+
+        button_rects = {}
+        for index, name in enumerate(self.MAIN_BUTTONS):
+            button_rects[name] = pg.Rect(0, 0, button_width, button_height)
+            button_rects[name].midtop = (self.screen_width // 2, top + index * (button_height + gap))
+        return button_rects
+
+    def _make_button(self, name, text_key):
+        # Creates a button widget at the position of button_rects[name], so clicks and drawing use the same rect.
+        button = Button(self.button_rects[name], self.text_surfaces[text_key], self.COLORS["button"], self.COLORS["hover"])
+        self.button_rects[name] = button.rect
+        return button
@@ -0,0 +1,131 @@
+# HEADLESS SIMULATION SYSTEM
+
+import pygame as pg
+
+class SimulatedKeys:
+    # Stands in for pg.key.get_pressed() when no real keyboard is available.
+    # Any key that is not held reads as False, just like the real key state.
+
+    def __init__(self, held_keys=None):
+        # Store the set of keys that are currently held down.
+        self.held_keys = set(held_keys or ())
+
+    def __getitem__(self, key):
+        # Returns True if the given Pygame key constant is held down.
+        return key in self.held_keys
+
+
+class HeadlessDriver:
+    # Plays the game automatically so it can run without a monitor, keyboard or mouse.
+    # It steps through main menu -> dialogue -> tutorial -> gameplay and back to the menu again.
+
+    def __init__(self, game_instance, dialogue_advance_frames=2, jump_distance=260, endless_jump_ticks=5):
+        # Keeps a reference to the main game object.
+        self.game = game_instance
+
+        # Set the number of frames to wait before pressing SPACE on dialogue and end screens.
+        self.dialogue_advance_frames = dialogue_advance_frames
+
+        # Set how close (in pixels) an enemy must be in front of the character before jumping.
+        self.jump_distance = jump_distance
+
+        # In endless mode, jump this many ticks before the enemy would reach the character.
+        self.endless_jump_ticks = endless_jump_ticks
+
+        # Counts frames spent in the current game state.
+        self.state_frame_counter = 0
+        self.last_game_state = None
+
+        # Holds the simulated key state for the current frame.
+        self.keys = SimulatedKeys()
+
+    def get_events(self):
+        # Builds this frame's simulated input and returns it together with the real Pygame events.
+        # The real events are still read so the dummy driver queue never fills up.
+        events = pg.event.get()
+
+        game = self.game
+
+        # Restart the frame counter whenever the game state changes.
+        if game.game_state != self.last_game_state:
+            self.last_game_state = game.game_state
+            self.state_frame_counter = 0
+        self.state_frame_counter += 1
+
+        held_keys = set()
+
+        # If in main menu, click the "Start Game" button (or the "Endless" button if the game started in endless mode).
+        if game.game_state == game.STATE_MAIN_MENU:
+            button = 'endless' if game.start_in_endless else 'start'
+            events.append(pg.event.Event(pg.MOUSEBUTTONDOWN, button=1, pos=game.menu.button_rects[button].center))
+
+        # If in dialogue or an end screen, press SPACE every few frames.
+        elif game.game_state in [game.STATE_LEVEL_DIALOGUE, game.STATE_GAME_OVER, game.STATE_GAME_COMPLETED]:
+            if self.state_frame_counter % self.dialogue_advance_frames == 0:
+                events.append(self._space_event())
+
+        # If in credits, click the "Back" button.
+        elif game.game_state == game.STATE_CREDITS:
+            events.append(pg.event.Event(pg.MOUSEBUTTONDOWN, button=1, pos=game.menu.button_rects['back'].center))
+
+        # If in tutorial, press the key the current tutorial step is asking for.
+        elif game.game_state == game.STATE_TUTORIAL_GAMEPLAY:
+            expected_key = game.game_level.current_expected_pg_key
+            if expected_key == pg.K_SPACE:
+                # SPACE has to be a new press, so only hold it on every other frame.
+                if self.state_frame_counter % 2 == 0:
+                    held_keys.add(pg.K_SPACE)
+            elif expected_key is not None:
+                held_keys.add(expected_key)
+
+        # If in gameplay, run right and jump over any enemy that gets close.
+        elif game.game_state == game.STATE_GAMEPLAY:
+            held_keys.add(pg.K_d)
+            if self._enemy_ahead(game.enemy_system.get_current_enemy_rects(game.current_level), self.jump_distance):
+                held_keys.add(pg.K_SPACE)
+                events.append(self._space_event())
+
+        # If in endless mode, jump over the enemies coming from the right while running forward,
+        # then walk back to the left part of the screen. The jump distance grows with the speed the enemies approach at.
+        elif game.game_state == game.STATE_ENDLESS:
+            character = game.character
+            if character.is_jumping or character.rect.left < game.screen_width // 6:
+                held_keys.add(pg.K_d)
+            elif character.rect.left > game.screen_width // 5:
+                held_keys.add(pg.K_a)
+            jump_distance = (game.endless_mode.scroll_speed + character.speed) * self.endless_jump_ticks
+            if not character.is_jumping and self._enemy_ahead(game.endless_mode.get_enemy_rects(), jump_distance):
+                held_keys.add(pg.K_SPACE)
+                events.append(self._space_event())
+
+        self.keys = SimulatedKeys(held_keys)
+        return events
+
+    def get_pressed_keys(self):
+        # Returns the simulated key state for the current frame.
+        return self.keys
+
+    def get_mouse_position(self):
+        # The simulated player never moves the mouse. Its clicks carry their own position.
+        return (0, 0)
+
+    def get_frame_time(self, frame_time):
+        # Uses the frame time measured by the game loop.
+        return frame_time
+
+    def close(self):
+        # Nothing to clean up.
+        pass
+
+    def _space_event(self):
+        # Creates a SPACE key press event.
+        return pg.event.Event(pg.KEYDOWN, key=pg.K_SPACE, mod=0, unicode=' ', scancode=0)
+
+    def _enemy_ahead(self, enemy_rects, jump_distance):
+        # Checks if any enemy is in front of the character and within jumping distance.
+        character_rect = self.game.character.rect
+        for enemy_rect in enemy_rects:
+            distance = enemy_rect.left - character_rect.right
+            if -character_rect.width < distance < jump_distance:
+                return True
+        return False
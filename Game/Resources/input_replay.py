@@ -0,0 +1,187 @@
+# INPUT RECORDING AND REPLAY SYSTEM
+
+import pygame as pg
+import gzip
+import json
+import struct
+
+from headless import SimulatedKeys
+
+# Replay files start with this tag and format version.
+REPLAY_MAGIC = b'GRRP'
+REPLAY_VERSION = 1
+
+# File header: tag, version, RNG seed, screen width and height, length of the JSON game settings that follow.
+HEADER_FORMAT = struct.Struct('<4sBQHHH')
+
+# Frame record: frame time (seconds), held key bits, mouse X and Y, number of events that follow.
+FRAME_FORMAT = struct.Struct('<fBhhB')
+
+# Event records: a type code, then the data of that event type.
+EVENT_QUIT = 0
+EVENT_KEYDOWN = 1
+EVENT_MOUSEBUTTONDOWN = 2
+KEYDOWN_FORMAT = struct.Struct('<I')
+MOUSEBUTTON_FORMAT = struct.Struct('<Bhh')
+
+# Held keys the game reads, stored as one bit each (in this order) in every frame record.
+RECORDED_KEYS = (pg.K_a, pg.K_d, pg.K_SPACE)
+
+
+def read_replay_header(path):
+    # Returns the seed, resolution and game settings stored at the start of a replay file.
+    with gzip.open(path, 'rb') as replay_file:
+        return _read_header(replay_file)
+
+
+def _read_header(replay_file):
+    # Reads the header from an open replay file.
+    magic, version, seed, width, height, settings_length = HEADER_FORMAT.unpack(replay_file.read(HEADER_FORMAT.size))
+    if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+        raise ValueError(f"Not a Goblin Runner replay file (version {REPLAY_VERSION})")
+    settings = json.loads(replay_file.read(settings_length).decode('utf-8'))
+    return {'seed': seed, 'resolution': (width, height), 'settings': settings}
+
+
+class InputRecorder:
+    # Records the input of every frame into a compact binary file: the frame time, the held keys,
+    # the mouse position and the events the game reacts to. Together with the RNG seed in the header,
+    # the ReplayDriver can play the exact same run again.
+    # It wraps another input driver (like the HeadlessDriver), or reads the real keyboard and mouse if there is none.
+
+    def __init__(self, path, game_instance, source=None, settings=None):
+        # Keeps a reference to the main game object and the input driver being recorded.
+        self.game = game_instance
+        self.source = source
+
+        # Holds this frame's input until the frame time is known, then it is written as one record.
+        self.events = []
+        self.keys = SimulatedKeys()
+        self.mouse_position = (0, 0)
+        self.frame_count = 0
+
+        # The file is gzip-compressed: most frames repeat the previous one, so they shrink to almost nothing.
+        settings_bytes = json.dumps(settings or {}, sort_keys=True).encode('utf-8')
+        self.replay_file = gzip.open(path, 'wb')
+        self.replay_file.write(HEADER_FORMAT.pack(REPLAY_MAGIC, REPLAY_VERSION, game_instance.seed,
+                                                  game_instance.screen_width, game_instance.screen_height,
+                                                  len(settings_bytes)))
+        self.replay_file.write(settings_bytes)
+
+    def get_events(self):
+        # Returns this frame's events from the wrapped driver (or Pygame) and stores the input of this frame.
+        if self.source:
+            events = self.source.get_events()
+            keys = self.source.get_pressed_keys()
+            self.mouse_position = self.source.get_mouse_position()
+        else:
+            events = self.game.get_real_events()
+            keys = pg.key.get_pressed()
+            self.mouse_position = self.game.get_real_mouse_position()
+
+        # Only keep what the game reads, so the replay sees exactly the same input.
+        self.events = [event for event in events if event.type in (pg.QUIT, pg.KEYDOWN, pg.MOUSEBUTTONDOWN)]
+        self.keys = SimulatedKeys(key for key in RECORDED_KEYS if keys[key])
+        return self.events
+
+    def get_pressed_keys(self):
+        # Returns the held keys of this frame.
+        return self.keys
+
+    def get_mouse_position(self):
+        # Returns the mouse position of this frame.
+        return self.mouse_position
+
+    def get_frame_time(self, frame_time):
+        # Writes this frame's record and returns the frame time as it is stored in the file,
+        # so the recorded run uses exactly the same value as its replays.
+        frame_time = struct.unpack('<f', struct.pack('<f', frame_time))[0]
+
+        key_bits = sum(1 << index for index, key in enumerate(RECORDED_KEYS) if self.keys[key])
+        mouse_x, mouse_y = self.mouse_position
+        record = [FRAME_FORMAT.pack(frame_time, key_bits, mouse_x, mouse_y, len(self.events))]
+        for event in self.events:
+            if event.type == pg.KEYDOWN:
+                record.append(bytes([EVENT_KEYDOWN]) + KEYDOWN_FORMAT.pack(event.key))
+            elif event.type == pg.MOUSEBUTTONDOWN:
+                record.append(bytes([EVENT_MOUSEBUTTONDOWN]) + MOUSEBUTTON_FORMAT.pack(event.button, *event.pos))
+            else:
+                record.append(bytes([EVENT_QUIT]))
+        self.replay_file.write(b''.join(record))
+
+        self.frame_count += 1
+        return frame_time
+
+    def close(self):
+        # Finishes the replay file.
+        if self.source:
+            self.source.close()
+        if self.replay_file:
+            self.replay_file.close()
+            self.replay_file = None
+
+
+class ReplayDriver:
+    # Feeds the input of a recorded replay file back into the game, frame by frame.
+    # When the recording runs out, it sends a QUIT event so the game loop ends.
+
+    def __init__(self, path):
+        # Read the whole file at once. Even long replays are small.
+        with gzip.open(path, 'rb') as replay_file:
+            self.header = _read_header(replay_file)
+            self.data = replay_file.read()
+        self.offset = 0
+        self.frame_count = 0
+
+        # Holds the input of the current frame.
+        self.keys = SimulatedKeys()
+        self.mouse_position = (0, 0)
+        self.frame_time = 0.0
+        self.finished = False
+
+    def get_events(self):
+        # Reads the next frame record and returns its events.
+        # The real Pygame events are still read so the event queue never fills up, but they are not used.
+        pg.event.get()
+        if self.offset + FRAME_FORMAT.size > len(self.data):
+            self.finished = True
+            return [pg.event.Event(pg.QUIT)]
+
+        self.frame_time, key_bits, mouse_x, mouse_y, event_count = FRAME_FORMAT.unpack_from(self.data, self.offset)
+        self.offset += FRAME_FORMAT.size
+        self.keys = SimulatedKeys(key for index, key in enumerate(RECORDED_KEYS) if key_bits & (1 << index))
+        self.mouse_position = (mouse_x, mouse_y)
+
+        events = []
+        for _ in range(event_count):
+            event_type = self.data[self.offset]
+            self.offset += 1
+            if event_type == EVENT_KEYDOWN:
+                (key,) = KEYDOWN_FORMAT.unpack_from(self.data, self.offset)
+                self.offset += KEYDOWN_FORMAT.size
+                events.append(pg.event.Event(pg.KEYDOWN, key=key, mod=0, unicode='', scancode=0))
+            elif event_type == EVENT_MOUSEBUTTONDOWN:
+                button, x, y = MOUSEBUTTON_FORMAT.unpack_from(self.data, self.offset)
+                self.offset += MOUSEBUTTON_FORMAT.size
+                events.append(pg.event.Event(pg.MOUSEBUTTONDOWN, button=button, pos=(x, y)))
+            else:
+                events.append(pg.event.Event(pg.QUIT))
+
+        self.frame_count += 1
+        return events
+
+    def get_pressed_keys(self):
+        # Returns the recorded held keys of the current frame.
+        return self.keys
+
+    def get_mouse_position(self):
+        # Returns the recorded mouse position of the current frame.
+        return self.mouse_position
+
+    def get_frame_time(self, frame_time):
+        # Returns the recorded frame time, so the same number of ticks run in every frame.
+        return self.frame_time
+
+    def close(self):
+        # Nothing to close, the file was read completely at the start.
+        pass
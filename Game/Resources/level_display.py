@@ -2,36 +2,43 @@
 
 import pygame as pg
 
+from asset_manager import AssetManager, shared_assets
+from level_pack import load_level_pack
+
 class LevelDisplay:
     
-    def __init__(self, screen_width, screen_height, level_font_size=60, level_text_pos_y=50):
+    def __init__(self, screen_width, screen_height, level_font_size=60, level_text_pos_y=50, assets=None, levels=None):
         # Store the width and height of the game screen.
         self.screen_width = screen_width
         self.screen_height = screen_height
 
-        # Load and scale background images for each level.
-        self.backgrounds = {
-            1: pg.transform.scale(pg.image.load("GAME_DEV_FINAL/assets/background/lvl1.png"), (self.screen_width, self.screen_height)),
-            2: pg.transform.scale(pg.image.load("GAME_DEV_FINAL/assets/background/lvl2.png"), (self.screen_width, self.screen_height)),
-            3: pg.transform.scale(pg.image.load("GAME_DEV_FINAL/assets/background/lvl3.png"), (self.screen_width, self.screen_height))
-        }
+        # Use the given asset manager, or the shared one.
+        self.assets = assets or shared_assets
+
+        # Use the given level pack, or load it. It holds the background image file of each level.
+        self.levels = levels or load_level_pack()
+
+        # Store the loaded background image of each level. Only level 1 is loaded at startup,
+        # the other levels are loaded by load_level() when they are reached.
+        self.backgrounds = {}
+        self.load_level(1)
 
         # Set the custom font for all text.
         self.font_path = "GAME_DEV_FINAL/assets/font/bytebounce/ByteBounce.ttf"
 
         # Customize font and color for level numbers.
-        self.level_font = pg.font.Font(self.font_path, level_font_size)
+        self.level_font = self.assets.load_font(self.font_path, level_font_size)
         self.level_text_color = (0, 0, 0)
         self.level_text_pos_y = level_text_pos_y
 
         # Customize fonts and colors for "Thank You" screen.
-        self.thank_you_font = pg.font.Font(self.font_path, 100)
+        self.thank_you_font = self.assets.load_font(self.font_path, 100)
         self.thank_you_color = (255, 255, 0)
-        self.menu_prompt_font = pg.font.Font(self.font_path, 60)
+        self.menu_prompt_font = self.assets.load_font(self.font_path, 60)
         self.menu_prompt_color = (200, 200, 200)
 
         # Customize Font and color for "Game Over" screen.
-        self.game_over_font = pg.font.Font(self.font_path, 100)
+        self.game_over_font = self.assets.load_font(self.font_path, 100)
         self.game_over_color = (255, 0, 0)
 
         # Tutorial state and setup.
@@ -46,11 +53,11 @@ class LevelDisplay:
         ]
 
         # Customize font and color for tutorial text.
-        self.tutorial_font = pg.font.Font(self.font_path, 50)
+        self.tutorial_font = self.assets.load_font(self.font_path, 50)
         self.tutorial_text_color = (255, 255, 255)
 
         # Customize font and color for tutorial title.
-        self.tutorial_title_font = pg.font.Font(self.font_path, 100)
+        self.tutorial_title_font = self.assets.load_font(self.font_path, 100)
         self.tutorial_title_color = (0, 0, 0)
 
         # Customize tutorial box dimensions and position.
@@ -58,6 +65,12 @@ class LevelDisplay:
         self.tutorial_rect_height = self.screen_height * 0.1
         self.tutorial_rect_y_offset = self.screen_height * 0.50
 
+        # Create the semi-transparent tutorial box once for each box color, instead of every frame.
+        self.tutorial_box_surfaces = {}
+        for _, _, rect_color in self.tutorial_prompts:
+            if rect_color not in self.tutorial_box_surfaces:
+                self.tutorial_box_surfaces[rect_color] = self.assets.make_alpha_surface((self.tutorial_rect_width, self.tutorial_rect_height), rect_color)
+
         # Map string keys to Pygame key constants.
         self._key_map = {
             'A': pg.K_a,
@@ -69,6 +82,22 @@ class LevelDisplay:
         self.previous_keys_pressed = pg.key.get_pressed()
         self.current_expected_pg_key = None
 
+    def get_background_key(self, level):
+        # Returns the (path, size, flags) image key of a level's background.
+        # Backgrounds have no transparency, so they are converted opaque.
+        return (self.levels.get_level(level)['background'], (self.screen_width, self.screen_height), AssetManager.OPAQUE)
+
+    def load_level(self, level):
+        # Loads and scales the background of a level, if it is not loaded yet.
+        # If it was prefetched, this only converts it (or waits for the prefetch thread to finish it).
+        if level in self.levels and level not in self.backgrounds:
+            self.backgrounds[level] = self.assets.load_image(*self.get_background_key(level))
+
+    def prefetch_level(self, level):
+        # Starts reading and scaling the background of a level on the asset prefetch thread.
+        if level in self.levels and level not in self.backgrounds:
+            self.assets.prefetch_images([self.get_background_key(level)])
+
     def draw_background(self, screen, current_level):
         # Shows the right background image for the current level.
         if current_level in self.backgrounds:
@@ -79,10 +108,14 @@ class LevelDisplay:
 
     def draw_level_text(self, screen, current_level):
         # Customize and display "Level X" text at the top of the screen.
-        if current_level <= 3:
-            text_surface = self.level_font.render(f"Level {current_level}", True, self.level_text_color)
-            text_rect = text_surface.get_rect(center=(self.screen_width // 2, self.level_text_pos_y))
-            screen.blit(text_surface, text_rect)
+        if current_level <= self.levels.max_level:
+            screen.blit(*self.get_level_text(current_level))
+
+    def get_level_text(self, current_level):
+        # Returns the rendered "Level X" text and the rectangle where it is drawn.
+        text_surface = self.assets.render_text(self.level_font, f"Level {current_level}", self.level_text_color)
+        text_rect = text_surface.get_rect(center=(self.screen_width // 2, self.level_text_pos_y))
+        return text_surface, text_rect
 
     def draw_thank_you_screen(self, screen):
         # Shows the "Thank You for Playing" message and menu prompt.
@@ -91,11 +124,11 @@ class LevelDisplay:
         screen.fill((0, 0, 0))
         
         # Customize the position and color of "Thank You for Playing" message and menu prompt.
-        message_surface = self.thank_you_font.render("Thank You For Playing Our Game!", True, self.thank_you_color)
+        message_surface = self.assets.render_text(self.thank_you_font, "Thank You For Playing Our Game!", self.thank_you_color)
         message_rect = message_surface.get_rect(center=(self.screen_width // 2, self.screen_height // 2 - 50))
         screen.blit(message_surface, message_rect)
 
-        menu_prompt_surface = self.menu_prompt_font.render("Press SPACE to go back to Main Menu", True, self.menu_prompt_color)
+        menu_prompt_surface = self.assets.render_text(self.menu_prompt_font, "Press SPACE to go back to Main Menu", self.menu_prompt_color)
         menu_prompt_rect = menu_prompt_surface.get_rect(center=(self.screen_width // 2, self.screen_height // 2 + 50))
         screen.blit(menu_prompt_surface, menu_prompt_rect)
 
@@ -104,16 +137,17 @@ class LevelDisplay:
         screen.fill((0, 0, 0))
         
         # Customize the position and color of "GAME OVER!" message and menu prompt.
-        game_over_surface = self.game_over_font.render("GAME OVER!", True, self.game_over_color)
+        game_over_surface = self.assets.render_text(self.game_over_font, "GAME OVER!", self.game_over_color)
         game_over_rect = game_over_surface.get_rect(center=(self.screen_width // 2, self.screen_height // 2 - 50))
         screen.blit(game_over_surface, game_over_rect)
 
-        menu_prompt_surface = self.menu_prompt_font.render("You've been killed by enemy. Press SPACE to reset.", True, self.menu_prompt_color)
+        menu_prompt_surface = self.assets.render_text(self.menu_prompt_font, "You've been killed by enemy. Press SPACE to reset.", self.menu_prompt_color)
         menu_prompt_rect = menu_prompt_surface.get_rect(center=(self.screen_width // 2, self.screen_height // 2 + 50))
         screen.blit(menu_prompt_surface, menu_prompt_rect)
 
-    def start_tutorial(self):
+    def start_tutorial(self, current_keys_pressed=None):
         # Starts the tutorial, setting it to the first step.
+        # current_keys_pressed is the game's key state (from the keyboard if not given).
         self.tutorial_active = True
         self.tutorial_step = 0
         
@@ -126,29 +160,24 @@ class LevelDisplay:
             self.current_expected_pg_key = None
 
         # Reset key state.
-        self.previous_keys_pressed = pg.key.get_pressed()
+        self.previous_keys_pressed = current_keys_pressed if current_keys_pressed is not None else pg.key.get_pressed()
 
-    def reset_tutorial(self):
+    def reset_tutorial(self, current_keys_pressed=None):
         # Turns off and resets the tutorial to the beginning.
         self.tutorial_active = False
         self.tutorial_step = 0
         self.current_expected_pg_key = None
-        self.previous_keys_pressed = pg.key.get_pressed()
+        self.previous_keys_pressed = current_keys_pressed if current_keys_pressed is not None else pg.key.get_pressed()
 
-    def update_and_draw_tutorial(self, screen, current_keys_pressed):
-        # Manages the tutorial progression and draws tutorial messages. Returns True when the tutorial is finished.
+    def update_tutorial(self, current_keys_pressed):
+        # Manages the tutorial progression. Called once per game tick. Returns True when the tutorial is finished.
 
         # Stop tutorial if done or inactive.
         if not self.tutorial_active or self.tutorial_step >= len(self.tutorial_prompts):
             self.tutorial_active = False 
             return True
 
-        # Draw the "Tutorial" title.
-        title_surface = self.tutorial_title_font.render("TUTORIAL", True, self.tutorial_title_color)
-        title_rect = title_surface.get_rect(center=(self.screen_width // 2, self.tutorial_rect_y_offset - 80))
-        screen.blit(title_surface, title_rect)
-
-        key_string, prompt_text, rect_color = self.tutorial_prompts[self.tutorial_step]
+        key_string = self.tutorial_prompts[self.tutorial_step][0]
         expected_pg_key = self._key_map.get(key_string)
 
         # Check if the correct key is pressed to advance the tutorial.
@@ -171,17 +200,26 @@ class LevelDisplay:
         # Save current key states for the next check.
         self.previous_keys_pressed = current_keys_pressed
 
+        # Run this if tutorial is still running.
+        return False
+
+    def draw_tutorial(self, screen):
+        # Draws the tutorial title and the prompt of the current step. It does not change the tutorial state.
+        if not self.tutorial_active or self.tutorial_step >= len(self.tutorial_prompts):
+            return
+
+        # Draw the "Tutorial" title.
+        title_surface = self.assets.render_text(self.tutorial_title_font, "TUTORIAL", self.tutorial_title_color)
+        title_rect = title_surface.get_rect(center=(self.screen_width // 2, self.tutorial_rect_y_offset - 80))
+        screen.blit(title_surface, title_rect)
+
         # Draw the semi-transparent box for tutorial text.
-        box_surface = pg.Surface((self.tutorial_rect_width, self.tutorial_rect_height), pg.SRCALPHA)
-        box_surface.fill(rect_color)
+        _, prompt_text, rect_color = self.tutorial_prompts[self.tutorial_step]
         box_x = (self.screen_width - self.tutorial_rect_width) // 2
         box_y = self.tutorial_rect_y_offset
-        screen.blit(box_surface, (box_x, box_y))
+        screen.blit(self.tutorial_box_surfaces[rect_color], (box_x, box_y))
 
         # Draw the tutorial instruction text inside the box.
-        text_surface = self.tutorial_font.render(prompt_text, True, self.tutorial_text_color)
+        text_surface = self.assets.render_text(self.tutorial_font, prompt_text, self.tutorial_text_color)
         text_rect = text_surface.get_rect(center=(box_x + self.tutorial_rect_width // 2, box_y + self.tutorial_rect_height // 2))
         screen.blit(text_surface, text_rect)
-
-        # Run this if tutorial is still running.
-        return False
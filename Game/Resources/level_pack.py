@@ -0,0 +1,318 @@
+# LEVEL PACK MANAGEMENT SYSTEM
+
+# Levels are written as JSON files (levels/level1.json, levels/level2.json, ...) and compiled into one binary
+# level pack. The game only reads the pack, so no text is parsed at startup or between levels.
+# Compile the levels after editing them, from the folder that holds GAME_DEV_FINAL, like the game itself:
+#   python GAME_DEV_FINAL/level_pack.py
+#   python GAME_DEV_FINAL/level_pack.py --check
+
+import argparse
+import glob
+import json
+import marshal
+import os
+import re
+import struct
+import sys
+
+# Folder with the level definition files and the compiled level pack.
+LEVEL_SOURCE_DIR = 'GAME_DEV_FINAL/levels'
+LEVEL_PACK_PATH = 'GAME_DEV_FINAL/levels/levels.pack'
+
+# Level pack files start with this tag, the pack format version and the Python version that compiled them,
+# followed by the level definitions written with marshal. The pack is a trusted file made by the build from the JSON files:
+# marshal is not safe against malicious data, and its format can change between Python versions, so a pack is only read
+# by the Python version that wrote it. The loaded levels are also checked against the fields below before the game uses them.
+PACK_MAGIC = b'GRLP'
+PACK_VERSION = 3
+PACK_HEADER_FORMAT = struct.Struct('<4sBBB')
+
+# Marshal format version of the level data. Version 2 writes no object references, so the same levels always compile to the same bytes.
+MARSHAL_VERSION = 2
+
+# Fields of a compiled level, its enemy type and its enemies, with the types their values must have.
+LEVEL_FIELDS = {'background': str, 'dialogue': tuple, 'dark_overlay_lines': int, 'music': (str, type(None)), 'enemy_type': dict, 'enemies': tuple}
+ENEMY_TYPE_FIELDS = {'name': str, 'size': tuple, 'frames': dict, 'animation_speed_frames': int, 'speed': (int, float), 'speed_step': (int, float)}
+ENEMY_FIELDS = {'screen_x': tuple, 'screen_y': tuple, 'offset_x': int, 'offset_y': int, 'speed': (int, float)}
+
+# Level definition files are named level<number>.json.
+LEVEL_FILE_PATTERN = re.compile(r'^level(\d+)\.json$')
+
+
+class LevelPackError(Exception):
+    # Raised when a level definition is invalid or a level pack cannot be read.
+    pass
+
+
+class LevelPack:
+    # Holds the compiled definition of every level: background, dialogue, enemy type and enemy positions.
+    # Levels are numbered from 1 to max_level without gaps.
+
+    def __init__(self, levels):
+        # Store the level definitions: {level number: definition}.
+        self.levels = levels
+        self.max_level = len(levels)
+
+    def __contains__(self, level):
+        # Allows 'level in level_pack'.
+        return level in self.levels
+
+    def get_level(self, level):
+        # Returns the definition of a level.
+        return self.levels[level]
+
+    def get_music(self, level):
+        # Returns the music file of a level, or None if it plays the background music.
+        return self.levels[level].get('music')
+
+    def get_enemy_positions(self, level, screen_width, screen_height):
+        # Returns the starting (x, y) position of every enemy in a level for the given screen size.
+        # Positions are fractions of the screen size plus a pixel offset, with the same integer rounding the game always used.
+        positions = []
+        for enemy in self.levels[level]['enemies']:
+            x_numerator, x_denominator = enemy['screen_x']
+            y_numerator, y_denominator = enemy['screen_y']
+            positions.append((screen_width * x_numerator // x_denominator + enemy['offset_x'],
+                              screen_height * y_numerator // y_denominator + enemy['offset_y']))
+        return positions
+
+    def save(self, path):
+        # Writes the level pack to a file. It is written to a temporary file first, so a half-written pack is never read.
+        data = PACK_HEADER_FORMAT.pack(PACK_MAGIC, PACK_VERSION, *sys.version_info[:2]) + marshal.dumps(self.levels, MARSHAL_VERSION)
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as pack_file:
+            pack_file.write(data)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path=LEVEL_PACK_PATH):
+        # Reads a compiled level pack with a single read, and checks that it only holds valid level definitions.
+        with open(path, 'rb') as pack_file:
+            data = pack_file.read()
+
+        if len(data) < PACK_HEADER_FORMAT.size:
+            raise LevelPackError(f"{path} is not a Goblin Runner level pack. Compile the levels again.")
+        magic, version, python_major, python_minor = PACK_HEADER_FORMAT.unpack_from(data)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise LevelPackError(f"{path} is not a Goblin Runner level pack (version {PACK_VERSION}). Compile the levels again.")
+        if (python_major, python_minor) != sys.version_info[:2]:
+            raise LevelPackError(f"{path} was compiled by Python {python_major}.{python_minor}. Compile the levels again with this Python.")
+        try:
+            levels = marshal.loads(data[PACK_HEADER_FORMAT.size:])
+        except Exception as error:
+            raise LevelPackError(f"{path} is damaged: {error}. Compile the levels again.")
+        _check_pack_levels(levels, path)
+        return cls(levels)
+
+    @classmethod
+    def compile(cls, source_dir=LEVEL_SOURCE_DIR, check_files=True):
+        # Reads and validates every level definition file in source_dir and returns the compiled level pack.
+        # Raises LevelPackError listing every problem found.
+        level_files = {}
+        for path in glob.glob(os.path.join(source_dir, 'level*.json')):
+            match = LEVEL_FILE_PATTERN.match(os.path.basename(path))
+            if match:
+                level_files[int(match.group(1))] = path
+
+        errors = []
+        if not level_files:
+            errors.append(f"{source_dir}: no level files (level1.json, level2.json, ...) found")
+        missing_levels = [level for level in range(1, max(level_files, default=0) + 1) if level not in level_files]
+        if missing_levels:
+            errors.append(f"{source_dir}: levels must be numbered from 1 without gaps, missing {missing_levels}")
+
+        levels = {}
+        for level, path in sorted(level_files.items()):
+            try:
+                with open(path, encoding='utf-8') as level_file:
+                    source = json.load(level_file)
+            except (OSError, ValueError) as error:
+                errors.append(f"{path}: {error}")
+                continue
+            levels[level] = _compile_level(source, path, errors, check_files)
+
+        if errors:
+            raise LevelPackError('Invalid level definitions:\n  ' + '\n  '.join(errors))
+        return cls(levels)
+
+
+def is_level_pack_stale(pack_path=LEVEL_PACK_PATH, source_dir=LEVEL_SOURCE_DIR):
+    # Returns True if the level pack is missing or older than one of the level definition files.
+    # Only the file times are compared, the files are not read.
+    if not os.path.exists(pack_path):
+        return True
+    pack_time = os.path.getmtime(pack_path)
+    return any(os.path.getmtime(path) > pack_time for path in glob.glob(os.path.join(source_dir, 'level*.json')))
+
+
+def load_level_pack(pack_path=LEVEL_PACK_PATH, source_dir=LEVEL_SOURCE_DIR):
+    # Returns the level pack used by the game. Compiling is a separate step (python GAME_DEV_FINAL/level_pack.py),
+    # so startup normally never parses text and never writes files.
+    # If a definition file looks newer than the pack, only a warning is printed (file times after a checkout can be misleading).
+    # If the game's own pack cannot be read (like a pack from another Python version), the levels are compiled from
+    # the JSON files in memory instead. A pack given on the command line has no JSON files, so its errors are raised.
+    own_pack = pack_path == LEVEL_PACK_PATH
+    if not os.path.exists(pack_path):
+        raise LevelPackError(f"Level pack {pack_path} not found. Compile the levels with: python GAME_DEV_FINAL/level_pack.py")
+    if own_pack and is_level_pack_stale(pack_path, source_dir):
+        print(f"Warning: level pack {pack_path} may be out of date with {source_dir}. Compile the levels with: python GAME_DEV_FINAL/level_pack.py")
+    try:
+        return LevelPack.load(pack_path)
+    except (LevelPackError, OSError) as error:
+        if not own_pack:
+            raise
+        print(f"Warning: {error} Reading the levels from {source_dir} instead.")
+        return LevelPack.compile(source_dir)
+
+
+def _compile_level(source, path, errors, check_files):
+    # Checks one level definition and returns it in the form the game uses.
+    # Every problem is added to errors. Frame path patterns are expanded and speeds are worked out here.
+    def require(container, key, expected_type, where):
+        # Returns container[key] if it exists and has the expected type, otherwise records an error.
+        value = container.get(key) if isinstance(container, dict) else None
+        if isinstance(value, bool) or not isinstance(value, expected_type):
+            type_names = ' or '.join(t.__name__ for t in (expected_type if isinstance(expected_type, tuple) else (expected_type,)))
+            errors.append(f"{path}: {where}'{key}' must be a {type_names}")
+            return None
+        return value
+
+    def check_file(file_path, where):
+        # Records an error if a file the level uses does not exist.
+        if check_files and file_path and not os.path.exists(file_path):
+            errors.append(f"{path}: {where}file not found: {file_path}")
+
+    background = require(source, 'background', str, '')
+    check_file(background, 'background ')
+
+    dialogue = require(source, 'dialogue', list, '') or []
+    if not all(isinstance(line, str) for line in dialogue):
+        errors.append(f"{path}: every 'dialogue' line must be a str")
+    dark_overlay_lines = require(source, 'dark_overlay_lines', int, '') or 0
+
+    # Music is optional. Levels without it play the game's background music.
+    music = source.get('music')
+    if music is not None and not isinstance(music, str):
+        errors.append(f"{path}: 'music' must be a str")
+        music = None
+    check_file(music, 'music ')
+
+    enemy_type = require(source, 'enemy_type', dict, '') or {}
+    size = require(enemy_type, 'size', list, 'enemy_type ')
+    if size is not None and (len(size) != 2 or not all(isinstance(value, int) and value > 0 for value in size)):
+        errors.append(f"{path}: enemy_type 'size' must be [width, height] in pixels")
+        size = None
+    frame_count = require(enemy_type, 'frame_count', int, 'enemy_type ') or 0
+    animation_speed_frames = require(enemy_type, 'animation_speed_frames', int, 'enemy_type ')
+    if animation_speed_frames is not None and animation_speed_frames < 1:
+        errors.append(f"{path}: enemy_type 'animation_speed_frames' must be at least 1")
+    speed = require(enemy_type, 'speed', (int, float), 'enemy_type ') or 0.0
+    speed_step = enemy_type.get('speed_step', 0.0)
+    if isinstance(speed_step, bool) or not isinstance(speed_step, (int, float)):
+        errors.append(f"{path}: enemy_type 'speed_step' must be a number")
+        speed_step = 0.0
+
+    # Frame files are numbered from 1, like 'sprite/goblin/{}.png' for 1.png, 2.png, ...
+    frames = {}
+    for direction in ('left', 'right'):
+        pattern = require(enemy_type, f'{direction}_frames', str, 'enemy_type ')
+        frames[direction] = tuple(pattern.format(index) for index in range(1, frame_count + 1)) if pattern else ()
+        for frame_path in frames[direction]:
+            check_file(frame_path, f'{direction} frame ')
+
+    enemies = []
+    for index, enemy in enumerate(require(source, 'enemies', list, '') or []):
+        where = f"enemies[{index}] "
+        screen_x = _parse_fraction(enemy.get('screen_x', '0') if isinstance(enemy, dict) else None)
+        screen_y = _parse_fraction(enemy.get('screen_y', '0') if isinstance(enemy, dict) else None)
+        if screen_x is None or screen_y is None:
+            errors.append(f"{path}: {where}'screen_x' and 'screen_y' must be fractions like \"3/4\" or \"1\"")
+            continue
+        offset_x = require(enemy, 'offset_x', int, where)
+        offset_y = require(enemy, 'offset_y', int, where)
+        enemy_speed = enemy.get('speed', speed + index * speed_step)
+        if isinstance(enemy_speed, bool) or not isinstance(enemy_speed, (int, float)) or enemy_speed <= 0:
+            errors.append(f"{path}: {where}'speed' must be a positive number")
+        enemies.append({'screen_x': screen_x, 'screen_y': screen_y, 'offset_x': offset_x, 'offset_y': offset_y, 'speed': enemy_speed})
+
+    return {
+        'background': background,
+        'dialogue': tuple(dialogue),
+        'dark_overlay_lines': dark_overlay_lines,
+        'music': music,
+        'enemy_type': {
+            'name': enemy_type.get('name', ''),
+            'size': tuple(size) if size else (80, 80),
+            'frames': frames,
+            'animation_speed_frames': animation_speed_frames or 5,
+            'speed': speed,
+            'speed_step': speed_step
+        },
+        'enemies': tuple(enemies)
+    }
+
+
+def _check_pack_levels(levels, path):
+    # Raises LevelPackError if data loaded from a level pack is not a set of compiled levels numbered from 1.
+    def check_fields(container, fields, where):
+        # Checks that container is a dict with exactly the given fields and value types.
+        if not isinstance(container, dict) or set(container) != set(fields):
+            raise LevelPackError(f"{path}: {where} does not have the fields of a compiled level")
+        for key, expected_type in fields.items():
+            if isinstance(container[key], bool) or not isinstance(container[key], expected_type):
+                raise LevelPackError(f"{path}: {where} '{key}' has the wrong type")
+
+    def check_items(values, expected_type, count, where):
+        # Checks that values is a tuple of count (any count if None) values of the expected type.
+        if (not isinstance(values, tuple) or (count is not None and len(values) != count)
+                or not all(isinstance(value, expected_type) and not isinstance(value, bool) for value in values)):
+            raise LevelPackError(f"{path}: {where} has the wrong values")
+
+    if not isinstance(levels, dict) or sorted(levels) != list(range(1, len(levels) + 1)):
+        raise LevelPackError(f"{path}: the levels must be numbered from 1 without gaps")
+    for level, definition in levels.items():
+        where = f"level {level}"
+        check_fields(definition, LEVEL_FIELDS, where)
+        check_items(definition['dialogue'], str, None, f"{where} 'dialogue'")
+
+        enemy_type = definition['enemy_type']
+        check_fields(enemy_type, ENEMY_TYPE_FIELDS, f"{where} enemy_type")
+        check_items(enemy_type['size'], int, 2, f"{where} enemy_type 'size'")
+        if not isinstance(enemy_type['frames'], dict) or set(enemy_type['frames']) != {'left', 'right'}:
+            raise LevelPackError(f"{path}: {where} enemy_type 'frames' must have 'left' and 'right' frames")
+        for direction, frames in enemy_type['frames'].items():
+            check_items(frames, str, None, f"{where} enemy_type {direction} frames")
+
+        for index, enemy in enumerate(definition['enemies']):
+            check_fields(enemy, ENEMY_FIELDS, f"{where} enemies[{index}]")
+            check_items(enemy['screen_x'], int, 2, f"{where} enemies[{index}] 'screen_x'")
+            check_items(enemy['screen_y'], int, 2, f"{where} enemies[{index}] 'screen_y'")
+
+
+def _parse_fraction(value):
+    # Turns a fraction like "3/4" or "1" into (numerator, denominator), or returns None if it is not valid.
+    match = re.fullmatch(r'\s*(\d+)\s*(?:/\s*(\d+)\s*)?', value) if isinstance(value, str) else None
+    if not match or match.group(2) == '0':
+        return None
+    return int(match.group(1)), int(match.group(2) or 1)
+
+
+if __name__ == '__main__':
+    # Read the command line options.
+    parser = argparse.ArgumentParser(description='Compile the Goblin Runner level definitions into a level pack')
+    parser.add_argument('--source-dir', default=LEVEL_SOURCE_DIR, help='folder with the level<number>.json files')
+    parser.add_argument('--output', default=LEVEL_PACK_PATH, metavar='FILE', help='where to write the level pack')
+    parser.add_argument('--check', action='store_true', help='only validate the level definitions')
+    args = parser.parse_args()
+
+    try:
+        level_pack = LevelPack.compile(args.source_dir)
+    except LevelPackError as error:
+        print(error)
+        sys.exit(1)
+
+    if args.check:
+        print(f"{level_pack.max_level} levels are valid")
+    else:
+        level_pack.save(args.output)
+        print(f"Compiled {level_pack.max_level} levels into {args.output} ({os.path.getsize(args.output)} bytes)")
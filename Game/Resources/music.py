@@ -1,35 +1,186 @@
 # MUSIC MANAGEMENT SYSTEM
 
+import os
 import pygame as pg
+from concurrent.futures import ThreadPoolExecutor
 
 class Music:
+    # Plays the background music and the level music. Short tracks are decoded into Sounds on a loader thread and played
+    # on two reserved mixer channels, so a new track can crossfade with the old one. Long tracks (like the background music)
+    # are streamed from their file with pg.mixer.music instead, so they are never decoded whole. The game loop calls update()
+    # every frame, and the switch happens on the first frame after the new track is ready, so loading music never stalls a frame.
 
-    def __init__(self):
-        # Initialize all mixer modules inside the pygame.
-        pg.mixer.init()
+    # Mixer channels used by the music. Sound effects use the channels after them.
+    MUSIC_CHANNELS = (0, 1)
 
-        # Set the volume
+    # Tracks with bigger files are streamed. A decoded track takes about 10 MB per minute, so a decoded track is at most
+    # about 5 MB (half a minute of a 128 kbps MP3), and freeing it takes about half a millisecond.
+    # Opening a stream only reads the file header: about 0.2 ms here, even for a 10 minute MP3.
+    MAX_DECODED_FILE_BYTES = 512 * 1024
+
+    def __init__(self, enabled=True, crossfade_ms=1500):
+        # Store if music is played at all. Headless runs disable it.
+        self.enabled = enabled
+
+        # Initialize the mixer with a small buffer, so sound effects play without a noticeable delay.
+        # Reserve the music channels, so sound effects never take them.
+        if self.enabled:
+            pg.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
+            pg.mixer.set_reserved(len(self.MUSIC_CHANNELS))
+            self.channels = [pg.mixer.Channel(channel) for channel in self.MUSIC_CHANNELS]
+        else:
+            self.channels = []
+
+        # Set the volume, and how long (in milliseconds) the old and the new track overlap when the music changes.
         self.music_volume = 0.5
-        pg.mixer.music.set_volume(self.music_volume)
+        self.crossfade_ms = crossfade_ms
+
+        # Set background music path file. Levels without their own music play it too.
+        self.background_music_path = 'GAME_DEV_FINAL/assets/sound/Relaxing Music with Nature Sounds.mp3'
+
+        # Decoded tracks: {path: Sound}. Tracks being checked or decoded on the loader thread: {path: future}.
+        # Only the playing, fading out and requested tracks are kept decoded. Tracks that are streamed are remembered,
+        # so they are not checked again, and tracks that could not be loaded are not tried again.
+        self.tracks = {}
+        self.loading = {}
+        self.streamed_paths = set()
+        self.failed_paths = set()
+        self.loader = None
 
-        # Set background music path file.
-        self.background_music_path = 'GAME_DEV_FINAL/assets/sound/Relaxing Music with Nature Sounds.mp3' 
+        # The track that is playing, the index of the channel of the last decoded track, and the track each channel plays.
+        self.current_path = None
+        self.current_channel = 0
+        self.channel_paths = [None] * len(self.channels)
+
+        # The track that should play as soon as it is decoded, and how often it repeats (-1 forever).
+        self.requested_path = None
+        self.requested_loops = -1
 
     def play_background_music(self, loop=-1):
         # Starts playing the background music track. loop=-1 means it will repeat indefinitely.
-        if not pg.mixer.music.get_busy() or pg.mixer.music.get_file() != self.background_music_path:
-            pg.mixer.music.load(self.background_music_path)
-            pg.mixer.music.play(loop)
+        self.play_track(self.background_music_path, loop)
+
+    def play_track(self, path, loop=-1):
+        # Switches the music to another track, crossfading from the one playing. Nothing changes if it is already playing.
+        # If the track is not decoded yet, it is decoded on the loader thread and starts on a later frame.
+        if not self.enabled or path in self.failed_paths:
+            return
+        if path == self.current_path and self._is_current_track_playing():
+            self.requested_path = None
+            return
+
+        self.requested_path = path
+        self.requested_loops = loop
+        if path not in self.tracks and path not in self.streamed_paths and path not in self.loading:
+            if self.loader is None:
+                self.loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='music-loader')
+            self.loading[path] = self.loader.submit(_load_track, path)
+        self.update()
+
+    def update(self):
+        # Starts the requested track once it is decoded, and frees tracks that are no longer used.
+        # Called every frame. It never waits for the loader thread.
+        if not self.enabled:
+            return
+        if self.tracks or self.loading:
+            self._release_unused_tracks()
+        if self.requested_path is None:
+            return
+        path = self.requested_path
+
+        future = self.loading.get(path)
+        if future is not None:
+            if not future.done():
+                return
+            del self.loading[path]
+            try:
+                track = future.result()
+            except (pg.error, OSError) as error:
+                self._fail(path, error)
+                return
+            if track is None:
+                self.streamed_paths.add(path)
+            else:
+                self.tracks[path] = track
+
+        try:
+            self._crossfade_to(path, self.requested_loops)
+        except pg.error as error:
+            self._fail(path, error)
+            return
+        self.requested_path = None
 
     def stop_music(self):
         # Stops any currently playing music.
-        pg.mixer.music.stop()
+        self.requested_path = None
+        self.current_path = None
+        for channel in self.channels:
+            channel.stop()
+        if self.enabled:
+            pg.mixer.music.stop()
 
     def set_music_volume(self, volume):
         # Sets the music volume from 0.0 to 1.0.
         self.music_volume = max(0.0, min(1.0, volume))
-        pg.mixer.music.set_volume(self.music_volume)
+        for track in self.tracks.values():
+            track.set_volume(self.music_volume)
+        if self.enabled:
+            pg.mixer.music.set_volume(self.music_volume)
 
     def quit_mixer(self):
-        # Uninitializes the mixer module.
-        pg.mixer.quit()
+        # Stops the loader thread, then uninitializes the mixer module.
+        if self.loader is not None:
+            self.loader.shutdown(wait=True, cancel_futures=True)
+            self.loader = None
+        if self.enabled:
+            pg.mixer.quit()
+
+    def _crossfade_to(self, path, loop):
+        # Fades the playing track out while the new track fades in, each on its own channel or on the music stream.
+        fade_ms = self.crossfade_ms if self._is_current_track_playing() else 0
+        if fade_ms:
+            if self.current_path in self.streamed_paths:
+                pg.mixer.music.fadeout(fade_ms)
+            else:
+                self.channels[self.current_channel].fadeout(fade_ms)
+
+        if path in self.streamed_paths:
+            # There is only one music stream, so loading a new one stops a stream that is still fading out.
+            pg.mixer.music.load(path)
+            pg.mixer.music.set_volume(self.music_volume)
+            pg.mixer.music.play(loop, fade_ms=fade_ms)
+        else:
+            self.current_channel = (self.current_channel + 1) % len(self.channels)
+            track = self.tracks[path]
+            track.set_volume(self.music_volume)
+            self.channels[self.current_channel].play(track, loops=loop, fade_ms=fade_ms)
+            self.channel_paths[self.current_channel] = path
+        self.current_path = path
+
+    def _is_current_track_playing(self):
+        # Returns True if the current track is playing (or fading in) on its channel or on the music stream.
+        if self.current_path in self.streamed_paths:
+            return pg.mixer.music.get_busy()
+        return self.channels[self.current_channel].get_busy()
+
+    def _fail(self, path, error):
+        # Plays without music rather than stopping the game, and does not try the track again.
+        print(f"Could not load music {path}: {error}")
+        self.failed_paths.add(path)
+        self.requested_path = None
+
+    def _release_unused_tracks(self):
+        # Frees the decoded tracks that are not playing, fading out or requested, and the loads of tracks no longer requested.
+        used_paths = {self.current_path, self.requested_path}
+        used_paths.update(path for path, channel in zip(self.channel_paths, self.channels) if channel.get_busy())
+        for path in [path for path in self.tracks if path not in used_paths]:
+            del self.tracks[path]
+        for path in [path for path, future in self.loading.items() if path not in used_paths and (future.done() or future.cancel())]:
+            del self.loading[path]
+
+
+def _load_track(path):
+    # Runs on the music loader thread. Decodes a short track into a Sound, or returns None for a long track, which is streamed instead.
+    if os.path.getsize(path) > Music.MAX_DECODED_FILE_BYTES:
+        return None
+    return pg.mixer.Sound(path)
@@ -0,0 +1,100 @@
+# RENDER CANVAS SYSTEM
+
+import pygame as pg
+
+class RenderCanvas:
+    # Lets the game draw everything on a fixed-size canvas (like 1920x1080) and scales it to the display once per frame,
+    # so big displays do not make every fill and blit more expensive.
+    #   'scaled':  Pygame's SCALED mode. SDL stretches the canvas to the display on the GPU when the frame is shown,
+    #              and converts mouse positions to canvas positions by itself.
+    #   'integer': the canvas is scaled up by the largest whole number that fits the display, with nearest-neighbour
+    #              pixels, and centered with black borders. Every canvas pixel becomes the same square of display pixels.
+    SCALING_MODES = ('scaled', 'integer')
+
+    # The smallest canvas the layout fits on. Font sizes, sprites and text positions are made for 1080p,
+    # and smaller canvases (like 960x540) cut off the title and push menu buttons and dialogue off the canvas.
+    MIN_CANVAS_SIZE = (1280, 720)
+
+    def __init__(self, canvas_size, display_size=None, scaling='scaled', display_flags=0):
+        # Store the canvas size and the scaling mode.
+        check_canvas_size(canvas_size)
+        self.canvas_size = canvas_size
+        self.scaling = scaling
+
+        if scaling == 'scaled':
+            # The display surface is the canvas. SDL scales it when the frame is shown.
+            self.display = pg.display.set_mode(canvas_size, display_flags | pg.SCALED)
+            self.surface = self.display
+            self.scale = 1
+            self.offset = (0, 0)
+            self.target = None
+        else:
+            # Open the display at its own size (the desktop size if none is given).
+            self.display = pg.display.set_mode(display_size or (0, 0), display_flags)
+            display_width, display_height = self.display.get_size()
+            canvas_width, canvas_height = canvas_size
+
+            # Find the largest whole-number scale that fits, and center the scaled canvas on the display.
+            # A canvas bigger than the display would have to be shrunk by a fraction, which is not integer scaling.
+            check_canvas_size(canvas_size, (display_width, display_height), scaling)
+            self.scale = min(display_width // canvas_width, display_height // canvas_height)
+            target_width = canvas_width * self.scale
+            target_height = canvas_height * self.scale
+            self.offset = ((display_width - target_width) // 2, (display_height - target_height) // 2)
+
+            # The part of the display that shows the canvas. The borders around it stay black.
+            self.display.fill((0, 0, 0))
+            self.target = self.display.subsurface(pg.Rect(self.offset, (target_width, target_height)))
+
+            # The canvas has the display's pixel format, so scaling it needs no conversion.
+            self.surface = pg.Surface(canvas_size).convert()
+
+    def present(self, dirty_rects=None):
+        # Scales the canvas to the display and shows it. If dirty_rects is given, only those canvas areas are sent.
+        if self.target is None:
+            if dirty_rects is not None:
+                pg.display.update(dirty_rects)
+            else:
+                pg.display.flip()
+            return
+
+        if dirty_rects is None:
+            pg.transform.scale(self.surface, self.target.get_size(), self.target)
+            pg.display.flip()
+            return
+
+        # Scale only the changed areas, each into its own place on the display.
+        canvas_rect = self.surface.get_rect()
+        display_rects = []
+        for rect in dirty_rects:
+            rect = canvas_rect.clip(rect)
+            if rect.width and rect.height:
+                scaled_rect = pg.Rect(rect.x * self.scale, rect.y * self.scale, rect.width * self.scale, rect.height * self.scale)
+                pg.transform.scale(self.surface.subsurface(rect), scaled_rect.size, self.target.subsurface(scaled_rect))
+                display_rects.append(scaled_rect.move(self.offset))
+        pg.display.update(display_rects)
+
+    def to_canvas(self, position):
+        # Converts a display position (like the mouse position) to a canvas position.
+        if self.target is None:
+            return position
+        return ((position[0] - self.offset[0]) // self.scale, (position[1] - self.offset[1]) // self.scale)
+
+    def map_events(self, events):
+        # Changes the positions of mouse events from display to canvas positions.
+        if self.target is not None:
+            for event in events:
+                if event.type in (pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP, pg.MOUSEMOTION):
+                    event.pos = self.to_canvas(event.pos)
+        return events
+
+
+def check_canvas_size(canvas_size, display_size=None, scaling='scaled'):
+    # Raises ValueError if the layout does not fit on the canvas, or if integer scaling cannot fit the canvas on the display.
+    # The display size is the given resolution, or None if it is only known once the display is open.
+    canvas_width, canvas_height = canvas_size
+    min_width, min_height = RenderCanvas.MIN_CANVAS_SIZE
+    if canvas_width < min_width or canvas_height < min_height:
+        raise ValueError(f"The {canvas_width}x{canvas_height} canvas is too small for the game's layout. It needs at least {min_width}x{min_height}.")
+    if scaling == 'integer' and display_size and (canvas_width > display_size[0] or canvas_height > display_size[1]):
+        raise ValueError(f"The {canvas_width}x{canvas_height} canvas does not fit the {display_size[0]}x{display_size[1]} display with integer scaling. Use a smaller canvas or 'scaled' scaling.")
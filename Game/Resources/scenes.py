@@ -0,0 +1,394 @@
+# SCENE MANAGEMENT SYSTEM
+
+import pygame as pg
+
+# Game states. Every scene has one, and the game's game_state is the state of the scene on top of the stack.
+STATE_MAIN_MENU = 0
+STATE_LEVEL_DIALOGUE = 1
+STATE_TUTORIAL_GAMEPLAY = 2
+STATE_GAMEPLAY = 3
+STATE_GAME_OVER = 4
+STATE_GAME_COMPLETED = 5
+STATE_CREDITS = 6
+STATE_ENDLESS = 7
+
+
+class SceneStack:
+    # Holds the active scenes. Only the scene on top gets events, updates and draws,
+    # so scenes below it (like the main menu under the credits) cost nothing per frame.
+
+    def __init__(self):
+        # The scenes, bottom first.
+        self.scenes = []
+
+    @property
+    def top(self):
+        # The scene that is shown and played.
+        return self.scenes[-1]
+
+    def push(self, scene):
+        # Shows a scene on top of the current one, which waits until the new scene is popped.
+        self.scenes.append(scene)
+
+    def pop(self):
+        # Removes the top scene and returns it. The scene below it continues.
+        return self.scenes.pop()
+
+    def switch(self, scene):
+        # Replaces every scene on the stack with the given scene.
+        self.scenes.clear()
+        self.scenes.append(scene)
+
+
+class Scene:
+    # One screen of the game. A scene handles its own events, updates and drawing.
+
+    # The game state this scene stands for.
+    state = None
+
+    # True if the scene runs the fixed-tick simulation (physics and animation) instead of one update per frame.
+    fixed_ticks = False
+
+    def __init__(self, game_instance):
+        # Keeps a reference to the main game object.
+        self.game = game_instance
+
+    def handle_event(self, event):
+        # Reacts to one event (quitting and F3 are handled by the game for every scene).
+        pass
+
+    def update(self, frame_time):
+        # Runs once per frame for scenes without fixed ticks. Frame_time is the time (in seconds) since the last frame.
+        pass
+
+    def tick(self, keys):
+        # Advances the scene by one fixed tick.
+        pass
+
+    def draw(self, keys, alpha):
+        # Draws the scene. Alpha (0.0 to 1.0) is how far the frame is between the last two ticks.
+        pass
+
+    def get_static_frame_key(self):
+        # Returns everything the scene's screen depends on if it only changes on input, or None if it must be drawn every frame.
+        return None
+
+
+class MenuScene(Scene):
+    # The main menu.
+    state = STATE_MAIN_MENU
+
+    def handle_event(self, event):
+        # Checks for clicks on the menu buttons.
+        self.game.menu.handle_events([event])
+
+    def draw(self, keys, alpha):
+        # The menu only draws the buttons that changed, and gives the changed areas to present.
+        with self.game.frame_profiler.measure('ui'):
+            self.game.dirty_rects = self.game.menu.draw()
+
+    def get_static_frame_key(self):
+        # The menu changes only when the mouse moves onto or off a button.
+        return (self.state, self.game.menu.menu_active, self.game.menu.get_hovered_button())
+
+
+class CreditsScene(MenuScene):
+    # The credits screen, shown on top of the main menu.
+    state = STATE_CREDITS
+
+    def draw(self, keys, alpha):
+        # Draws the credits. Only the "Back" button is drawn again when its hover state changes.
+        with self.game.frame_profiler.measure('ui'):
+            self.game.dirty_rects = self.game.menu.draw_credits_screen()
+
+
+class DialogueScene(Scene):
+    # The dialogue shown before each level.
+    state = STATE_LEVEL_DIALOGUE
+
+    def handle_event(self, event):
+        # If Spacebar is pressed, appear the next dialogue text. When the dialogue ends, the level starts.
+        game = self.game
+        if event.type == pg.KEYDOWN and event.key == pg.K_SPACE and game.game_dialogue.is_dialogue_active():
+            if not game.game_dialogue.advance_dialogue():
+                self.finish_dialogue()
+
+    def finish_dialogue(self):
+        # Starts the part of the game that comes after the dialogue that just finished.
+        game = self.game
+        completed_level = game.game_dialogue.last_dialogue_level_completed
+
+        # If Level 1 dialogue finished, proceed to tutorial.
+        if completed_level == 1:
+            game.switch_scene(STATE_TUTORIAL_GAMEPLAY)
+            game.game_level.start_tutorial(game.get_pressed_keys())
+            game.game_dialogue.last_dialogue_level_completed = None
+
+        # If the dialogue of a later level finished, gameplay will activate and start enemy movement.
+        elif completed_level is not None and 1 < completed_level <= game.MAX_LEVEL:
+            game.switch_scene(STATE_GAMEPLAY)
+            game.game_active = True
+            game.level_transition_cooldown = game.game_dialogue.COOLDOWN_FRAMES
+            game.enemy_system.start_movement_for_level(game.current_level)
+
+        # If game completion dialogue finished, return to main menu.
+        else:
+            game.reset_game_for_menu()
+
+    def update(self, frame_time):
+        # Dialogue text appears a few letters at a time, by the same (or the recorded) frame time.
+        self.game.game_dialogue.update(frame_time)
+
+    def draw(self, keys, alpha):
+        # Draw level background and dialogue box and text.
+        game = self.game
+        with game.frame_profiler.measure('background'):
+            game.game_level.draw_background(game.screen, game.current_level)
+        with game.frame_profiler.measure('text'):
+            game.game_dialogue.draw_dialogue(game.screen)
+
+    def get_static_frame_key(self):
+        # A dialogue page is static once all of its text has appeared.
+        dialogue = self.game.game_dialogue
+        if dialogue.is_page_revealed():
+            return (self.state, self.game.current_level, dialogue.current_dialogue_line_index, dialogue.current_page_index)
+        return None
+
+
+class PlayScene(Scene):
+    # Base of the scenes where the character runs and jumps, in fixed ticks.
+    fixed_ticks = True
+
+    def handle_event(self, event):
+        # If Spacebar is pressed, make character jump. The jump sound plays only if the character was on the ground.
+        if event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
+            character = self.game.character
+            if not character.is_jumping:
+                self.game.sound_effects.play('jump')
+            character.jump()
+
+    def update_character(self, keys):
+        # Moves the character by one tick and plays the landing sound when a jump ends.
+        character = self.game.character
+        was_jumping = character.is_jumping
+        with self.game.frame_profiler.measure('character'):
+            character.update(keys)
+        if was_jumping and not character.is_jumping:
+            self.game.sound_effects.play('land')
+
+
+class TutorialScene(PlayScene):
+    # The level 1 tutorial, where only the character moves.
+    state = STATE_TUTORIAL_GAMEPLAY
+
+    def tick(self, keys):
+        # Only the character moves, and the tutorial advances when the player presses its key.
+        game = self.game
+        self.update_character(keys)
+
+        # If tutorial is finished, activate gameplay and start enemy movement.
+        if game.game_level.update_tutorial(keys):
+            game.switch_scene(STATE_GAMEPLAY)
+            game.game_active = True
+            game.level_transition_cooldown = game.game_dialogue.COOLDOWN_FRAMES
+            game.enemy_system.start_movement_for_level(game.current_level)
+
+    def draw(self, keys, alpha):
+        # Draw Level 1 background, the character and the tutorial prompt.
+        game = self.game
+        profiler = game.frame_profiler
+        with profiler.measure('background'):
+            game.game_level.draw_background(game.screen, game.current_level)
+        with profiler.measure('sprites'):
+            game.character.draw(game.screen, alpha)
+        with profiler.measure('text'):
+            game.game_level.draw_tutorial(game.screen)
+
+
+class GameplayScene(PlayScene):
+    # A level of the game: the character, the enemies, collisions and level changes.
+    state = STATE_GAMEPLAY
+
+    def tick(self, keys):
+        # Advances character, enemies, collisions and level changes by one fixed tick.
+        game = self.game
+        profiler = game.frame_profiler
+
+        # If cooldown is active, decrease cooldown timer.
+        if game.level_transition_cooldown > 0:
+            game.level_transition_cooldown -= 1
+
+        self.update_character(keys)
+
+        # If within valid gameplay levels, update enemy.
+        if game.current_level <= game.MAX_LEVEL:
+            with profiler.measure('enemies'):
+                game.enemy_system.update(game.current_level, game.character.rect)
+
+            # Check the enemies near the character for collision, pixel by pixel or with a smaller character box.
+            with profiler.measure('collision'):
+                if game.collision_mode == 'mask':
+                    colliding_enemy = game.enemy_system.find_colliding_enemy(game.current_level, game.character.rect, game.character.mask)
+                else:
+                    # Create smaller collision rect for character.
+                    shrunk_char_rect = game.character.rect.inflate(-game.collision_offset * 2, -game.collision_offset * 2)
+                    colliding_enemy = game.enemy_system.find_colliding_enemy(game.current_level, shrunk_char_rect)
+
+            # If character collides with enemy, set the game to game over.
+            if colliding_enemy != -1:
+                game.switch_scene(STATE_GAME_OVER)
+                game.game_active = False
+                game.audio_manager.stop_music()
+                game.sound_effects.play('death')
+
+        # Checks if not on cooldown and still within game levels.
+        if game.current_level <= game.MAX_LEVEL and game.level_transition_cooldown <= 0:
+
+            # If character moves off right side and still no reach the last level, advance to next level.
+            if game.character.rect.right >= game.screen_width:
+                if game.current_level < game.MAX_LEVEL:
+                    game.current_level += 1
+
+                    # Finish loading the new level (waiting for the prefetch if it is not done),
+                    # then start reading the level after it during this level's dialogue.
+                    game.load_level_assets(game.current_level)
+                    game.prefetch_level_assets(game.current_level + 1)
+
+                    # Start new dialogue in each level.
+                    game.game_dialogue.set_level_dialogue(game.current_level)
+                    game.game_dialogue.start_dialogue()
+                    game.play_level_music(game.current_level)
+                    game.switch_scene(STATE_LEVEL_DIALOGUE)
+                    game.game_active = False
+
+                    # Reset cooldown.
+                    game.level_transition_cooldown = game.game_dialogue.COOLDOWN_FRAMES
+
+                    # Reset character X position and enemy's position for new level.
+                    game.character.rect.x = 5
+                    game.character.snap_position()
+                    game.enemy_system.reset_for_level(game.current_level)
+
+                else:
+                    # If it's the last level, set game to completed and deactivate gameplay.
+                    game.switch_scene(STATE_GAME_COMPLETED)
+                    game.game_active = False
+
+                    # Keep character on screen and reset all enemies.
+                    game.character.rect.right = game.screen_width
+                    game.character.snap_position()
+                    game.enemy_system.reset_all_enemies()
+
+            # If character moves off left side, prevent going to previous level.
+            elif game.character.rect.left <= 0:
+                # Keep character on screen at the left edge.
+                game.character.rect.left = 1
+
+    def draw(self, keys, alpha):
+        # Draws the level, the character, the enemies and the level text.
+        game = self.game
+        profiler = game.frame_profiler
+
+        # With dirty rectangles, only repaint the character and enemies that changed.
+        # The dirty renderer restores the background, draws the sprites and the text in one step.
+        if game.dirty_renderer and game.current_level <= game.MAX_LEVEL:
+            with profiler.measure('text'):
+                level_text, level_text_rect = game.game_level.get_level_text(game.current_level)
+            with profiler.measure('sprites'):
+                game.dirty_rects = game.dirty_renderer.draw(
+                    game.current_level,
+                    game.game_level.backgrounds[game.current_level],
+                    game.character.image,
+                    game.character.get_draw_position(alpha),
+                    game.enemy_system.get_draw_list(game.current_level, alpha),
+                    level_text,
+                    level_text_rect.topleft)
+            return
+
+        # Draw background images in each levels.
+        with profiler.measure('background'):
+            game.game_level.draw_background(game.screen, game.current_level)
+
+        # If within specified gameplay levels, draw character and enemy.
+        if game.current_level <= game.MAX_LEVEL:
+            with profiler.measure('sprites'):
+                game.character.draw(game.screen, alpha)
+                game.enemy_system.draw(game.screen, game.current_level, alpha)
+
+        # Draw level text.
+        with profiler.measure('text'):
+            game.game_level.draw_level_text(game.screen, game.current_level)
+
+
+class EndlessScene(PlayScene):
+    # Endless mode: the scrolling world with pooled enemies.
+    state = STATE_ENDLESS
+
+    def tick(self, keys):
+        # Advances the character and the endless world by one fixed tick.
+        game = self.game
+        profiler = game.frame_profiler
+        self.update_character(keys)
+        with profiler.measure('enemies'):
+            game.endless_mode.update()
+
+        # Check the enemies on screen for collision, pixel by pixel or with a smaller character box.
+        with profiler.measure('collision'):
+            if game.collision_mode == 'mask':
+                collided = game.endless_mode.find_collision(game.character.rect, game.character.mask)
+            else:
+                collided = game.endless_mode.find_collision(game.character.rect.inflate(-game.collision_offset * 2, -game.collision_offset * 2))
+
+        # If character collides with enemy, the run is over.
+        if collided:
+            game.endless_mode.finish_run()
+            game.switch_scene(STATE_GAME_OVER)
+            game.game_active = False
+            game.audio_manager.stop_music()
+            game.sound_effects.play('death')
+
+    def draw(self, keys, alpha):
+        # Draw the scrolling world, the character, the pooled enemies and the distance.
+        game = self.game
+        profiler = game.frame_profiler
+        with profiler.measure('background'):
+            game.endless_mode.draw_background(game.screen, alpha)
+        with profiler.measure('sprites'):
+            game.character.draw(game.screen, alpha)
+            game.endless_mode.draw(game.screen, alpha)
+        with profiler.measure('text'):
+            game.endless_mode.draw_distance(game.screen)
+
+
+class GameOverScene(Scene):
+    # The game over screen.
+    state = STATE_GAME_OVER
+
+    def handle_event(self, event):
+        # If Spacebar is pressed, return to main menu.
+        if event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
+            self.game.reset_game_for_menu()
+
+    def draw(self, keys, alpha):
+        # Draw game over screen.
+        game = self.game
+        with game.frame_profiler.measure('text'):
+            game.game_level.draw_game_over_screen(game.screen)
+
+            # After an endless run, also show its distance and the best distance.
+            if game.playing_endless:
+                game.endless_mode.draw_result(game.screen)
+
+    def get_static_frame_key(self):
+        # End screens never change.
+        return (self.state, self.game.playing_endless)
+
+
+class GameCompletedScene(GameOverScene):
+    # The thank you screen after the last level.
+    state = STATE_GAME_COMPLETED
+
+    def draw(self, keys, alpha):
+        # Draw game completion screen like thank you message.
+        with self.game.frame_profiler.measure('text'):
+            self.game.game_level.draw_thank_you_screen(self.game.screen)
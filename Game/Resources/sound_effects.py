@@ -0,0 +1,79 @@
+# SOUND EFFECT MANAGEMENT SYSTEM
+
+import os
+import pygame as pg
+
+from music import Music
+
+class SoundEffects:
+    # Plays short sound effects (jump, landing, death). Every effect is decoded into a Sound once at startup
+    # and has its own reserved mixer channel, so playing it is instant, never interrupts the music, and a
+    # repeated effect restarts instead of piling up.
+
+    # Folder with optional effect files. An effect named 'jump' uses jump.wav (or .ogg) from here if it exists.
+    SOUND_DIR = 'GAME_DEV_FINAL/assets/sound'
+    SOUND_EXTENSIONS = ('.wav', '.ogg')
+
+    # Effects without a file are made from a short tone:
+    # (start frequency in Hz, end frequency in Hz, length in seconds, volume from 0.0 to 1.0).
+    # The .wav files shipped in SOUND_DIR were made from these tones, so startup only decodes them.
+    SYNTHESIZED_EFFECTS = {
+        'jump': (320, 720, 0.14, 0.25),
+        'land': (150, 60, 0.07, 0.3),
+        'death': (520, 70, 0.6, 0.3)
+    }
+
+    def __init__(self, enabled=True, volume=0.7):
+        # Store if sound effects are played at all. Headless runs disable them.
+        self.enabled = enabled
+        self.volume = volume
+
+        # The decoded effects and their channels: {name: Sound} and {name: Channel}.
+        self.sounds = {}
+        self.channels = {}
+        if not self.enabled:
+            return
+
+        # Reserve one channel per effect after the music channels (reserved channels are counted from channel 0).
+        first_channel = len(Music.MUSIC_CHANNELS)
+        channel_count = first_channel + len(self.SYNTHESIZED_EFFECTS)
+        pg.mixer.set_num_channels(max(pg.mixer.get_num_channels(), channel_count))
+        pg.mixer.set_reserved(channel_count)
+
+        for index, name in enumerate(self.SYNTHESIZED_EFFECTS):
+            sound = self._load_effect(name)
+            sound.set_volume(self.volume)
+            self.sounds[name] = sound
+            self.channels[name] = pg.mixer.Channel(first_channel + index)
+
+    def play(self, name):
+        # Plays an effect on its channel, restarting it if it is still playing.
+        if self.enabled:
+            self.channels[name].play(self.sounds[name])
+
+    def _load_effect(self, name):
+        # Decodes the effect's file if there is one, otherwise makes its tone.
+        for extension in self.SOUND_EXTENSIONS:
+            path = os.path.join(self.SOUND_DIR, name + extension)
+            if os.path.exists(path):
+                return pg.mixer.Sound(path)
+        return self._synthesize(*self.SYNTHESIZED_EFFECTS[name])
+
+    def _synthesize(self, start_frequency, end_frequency, duration, volume):
+        # Makes a square wave that slides from start_frequency to end_frequency and fades out,
+        # as 16-bit samples in the mixer's format. All samples are worked out at once with NumPy.
+        # Import here so NumPy is only needed when an effect has no file.
+        import numpy as np
+
+        frequency, _, channels = pg.mixer.get_init()
+        sample_count = int(frequency * duration)
+        progress = np.arange(sample_count) / sample_count
+
+        # The phase is the running sum of the frequency, which slides exponentially from start to end.
+        phase = np.cumsum(start_frequency * (end_frequency / start_frequency) ** progress / frequency)
+        wave = np.where(phase % 1.0 < 0.5, 1.0, -1.0)
+
+        # Fade in over the first few milliseconds (to avoid a click), then fade out to the end.
+        envelope = np.minimum(1.0, np.arange(sample_count) / (frequency * 0.005)) * (1.0 - progress)
+        samples = (wave * envelope * int(32767 * volume)).astype(np.int16)
+        return pg.mixer.Sound(buffer=np.repeat(samples, channels).tobytes())
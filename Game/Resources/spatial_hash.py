@@ -0,0 +1,133 @@
+# SPATIAL HASH COLLISION SYSTEM
+
+import pygame as pg
+
+class SpatialHash:
+    # Sorts objects into a grid of equal square cells, so a collision check only looks at
+    # objects in the cells around the checked rect instead of every object on the screen.
+
+    def __init__(self, cell_size=256):
+        # Set the width and height of one grid cell (in pixels).
+        self.cell_size = cell_size
+
+        # Store which object keys are in each cell: {(cell_x, cell_y): set of keys}.
+        self.cells = {}
+
+        # Store each object's rect and the range of cells it covers: {key: (cell_x0, cell_y0, cell_x1, cell_y1)}.
+        self.rects = {}
+        self.cell_ranges = {}
+
+        # Count queries, candidate pairs handed to the exact rect test and pairs that really collided.
+        self.queries = 0
+        self.candidate_pairs = 0
+        self.colliding_pairs = 0
+
+    def insert(self, key, rect):
+        # Adds an object with the given key and rect (a pg.Rect or an (x, y, width, height) tuple).
+        self.rects[key] = rect
+        cell_range = self._get_cell_range(rect)
+        self.cell_ranges[key] = cell_range
+        for cell in self._iterate_cells(cell_range):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def update(self, key, rect):
+        # Moves an object to its new rect. Cells are only changed if the object entered or left a cell.
+        self.rects[key] = rect
+        cell_range = self._get_cell_range(rect)
+        old_cell_range = self.cell_ranges.get(key)
+        if cell_range == old_cell_range:
+            return
+
+        if old_cell_range is not None:
+            self._remove_from_cells(key, old_cell_range)
+        self.cell_ranges[key] = cell_range
+        for cell in self._iterate_cells(cell_range):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        # Removes an object from the grid.
+        cell_range = self.cell_ranges.pop(key, None)
+        self.rects.pop(key, None)
+        if cell_range is not None:
+            self._remove_from_cells(key, cell_range)
+
+    def clear(self):
+        # Removes every object from the grid.
+        self.cells.clear()
+        self.rects.clear()
+        self.cell_ranges.clear()
+
+    def query(self, rect):
+        # Returns the keys of all objects in the cells that rect touches, sorted (broad phase only).
+        self.queries += 1
+        candidates = set()
+        for cell in self._iterate_cells(self._get_cell_range(rect)):
+            keys = self.cells.get(cell)
+            if keys:
+                candidates.update(keys)
+        self.candidate_pairs += len(candidates)
+        return sorted(candidates)
+
+    def collidelist(self, rect):
+        # Like pg.Rect.collidelist: returns the first (lowest) key whose rect collides with rect, or -1.
+        rect = pg.Rect(rect)
+        for key in self.query(rect):
+            if rect.colliderect(self.rects[key]):
+                self.colliding_pairs += 1
+                return key
+        return -1
+
+    def collidelistall(self, rect):
+        # Like pg.Rect.collidelistall: returns the keys of all objects whose rect collides with rect.
+        rect = pg.Rect(rect)
+        colliding_keys = [key for key in self.query(rect) if rect.colliderect(self.rects[key])]
+        self.colliding_pairs += len(colliding_keys)
+        return colliding_keys
+
+    def collidelist_many(self, rects):
+        # Checks many rects in one call. Returns collidelist() for each rect.
+        return [self.collidelist(rect) for rect in rects]
+
+    def collidelistall_many(self, rects):
+        # Checks many rects in one call. Returns collidelistall() for each rect.
+        return [self.collidelistall(rect) for rect in rects]
+
+    def get_stats(self):
+        # Returns the collision statistics as a dictionary.
+        return {
+            'objects': len(self.rects),
+            'occupied_cells': len(self.cells),
+            'queries': self.queries,
+            'candidate_pairs': self.candidate_pairs,
+            'colliding_pairs': self.colliding_pairs,
+            'candidates_per_query': self.candidate_pairs / self.queries if self.queries else 0.0
+        }
+
+    def reset_stats(self):
+        # Sets the collision statistics back to zero.
+        self.queries = 0
+        self.candidate_pairs = 0
+        self.colliding_pairs = 0
+
+    def _get_cell_range(self, rect):
+        # Returns the first and last cell (x and y) that a rect covers.
+        x, y, width, height = rect
+        cell_size = self.cell_size
+        return (int(x // cell_size), int(y // cell_size),
+                int((x + max(width, 1) - 1) // cell_size), int((y + max(height, 1) - 1) // cell_size))
+
+    def _iterate_cells(self, cell_range):
+        # Goes through every cell in a cell range.
+        cell_x0, cell_y0, cell_x1, cell_y1 = cell_range
+        for cell_x in range(cell_x0, cell_x1 + 1):
+            for cell_y in range(cell_y0, cell_y1 + 1):
+                yield (cell_x, cell_y)
+
+    def _remove_from_cells(self, key, cell_range):
+        # Takes a key out of every cell in a cell range. Empty cells are deleted.
+        for cell in self._iterate_cells(cell_range):
+            keys = self.cells.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.cells[cell]
@@ -0,0 +1,62 @@
+# SPRITE ATLAS SYSTEM
+
+import pygame as pg
+
+class SpriteAtlas:
+    # Packs many small animation images into one large surface.
+    # Each frame is then a sub-rect of that surface, so all frames share one image in memory,
+    # one file in the disk cache and one texture for a batched renderer.
+
+    def __init__(self, surface, frame_rects):
+        # Stores the packed surface and the rect of every frame in it: {frame key: pg.Rect}.
+        self.surface = surface
+        self.frame_rects = frame_rects
+
+        # Create a subsurface for every frame. Subsurfaces share the atlas pixels, so blitting one
+        # blits that sub-rect of the atlas.
+        self.frames = {key: surface.subsurface(rect) for key, rect in frame_rects.items()}
+
+    @classmethod
+    def pack(cls, images, max_width=2048, padding=1):
+        # Builds an atlas from {frame key: surface}. Frames are placed in rows (shelves), tallest first.
+        # The padding keeps neighbouring frames from touching.
+        order = sorted(images, key=lambda key: (-images[key].get_height(), -images[key].get_width()))
+
+        frame_rects = {}
+        shelf_x = shelf_y = shelf_height = atlas_width = 0
+        for key in order:
+            width, height = images[key].get_size()
+
+            # Start a new row when this frame does not fit in the current one.
+            if shelf_x > 0 and shelf_x + width > max_width:
+                shelf_y += shelf_height + padding
+                shelf_x = shelf_height = 0
+
+            frame_rects[key] = pg.Rect(shelf_x, shelf_y, width, height)
+            shelf_x += width + padding
+            shelf_height = max(shelf_height, height)
+            atlas_width = max(atlas_width, shelf_x - padding)
+
+        atlas_height = shelf_y + shelf_height
+
+        # Copy every frame into one transparent surface.
+        surface = pg.Surface((max(atlas_width, 1), max(atlas_height, 1)), pg.SRCALPHA).convert_alpha()
+        surface.fill((0, 0, 0, 0))
+        for key, rect in frame_rects.items():
+            surface.blit(images[key], rect)
+
+        return cls(surface, frame_rects)
+
+    def get_frame(self, key):
+        # Returns the subsurface of one frame.
+        return self.frames[key]
+
+    def get_stats(self):
+        # Returns the atlas size, the number of frames and how much of the atlas is used by frames.
+        atlas_area = self.surface.get_width() * self.surface.get_height()
+        used_area = sum(rect.width * rect.height for rect in self.frame_rects.values())
+        return {
+            'size': self.surface.get_size(),
+            'frames': len(self.frame_rects),
+            'fill_ratio': used_area / atlas_area if atlas_area else 0.0
+        }
@@ -0,0 +1,92 @@
+# STARTUP PROFILING SYSTEM
+
+import time
+from contextlib import contextmanager
+
+class StartupProfiler:
+    # Measures how long each part of the game startup takes: the Pygame modules, every subsystem
+    # constructor, every asset load and every font open. The report lists the slowest parts first,
+    # so it is easy to see what breaks the startup time budget.
+
+    # Headings used in the report for each kind of measured step, in the order they are shown.
+    CATEGORY_TITLES = {
+        'pygame': 'Pygame setup',
+        'subsystem': 'Subsystem constructors',
+        'atlas': 'Atlas loads',
+        'image': 'Image loads',
+        'font': 'Font opens'
+    }
+
+    def __init__(self, enabled=True):
+        # If False, nothing is measured or recorded.
+        self.enabled = enabled
+
+        # Store every measured step as (category, name, seconds), in the order they finished.
+        self.records = []
+
+        # Remember when startup began and ended (None while it is still running).
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    @contextmanager
+    def measure(self, category, name):
+        # Times the code inside a 'with' block and records it under the given category and name.
+        if not self.enabled or self.end_time is not None:
+            yield
+            return
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(category, name, time.perf_counter() - start_time)
+
+    def record(self, category, name, seconds):
+        # Adds one measured step. Steps after finish() are not part of the startup and are ignored.
+        if self.enabled and self.end_time is None:
+            self.records.append((category, name, seconds))
+
+    def finish(self):
+        # Marks the end of the startup (the first frame can be shown now).
+        if self.end_time is None:
+            self.end_time = time.perf_counter()
+
+    def get_total_time(self):
+        # Returns the whole startup time in seconds (up to now if finish() was not called yet).
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        return end_time - self.start_time
+
+    def get_category_totals(self):
+        # Returns {category: (number of steps, total seconds)}.
+        totals = {}
+        for category, name, seconds in self.records:
+            count, total = totals.get(category, (0, 0.0))
+            totals[category] = (count + 1, total + seconds)
+        return totals
+
+    def report(self, max_entries=8, budget_ms=None):
+        # Returns the startup breakdown as readable lines. Each category shows its slowest steps first.
+        # Asset loads done inside a constructor are counted both there and under their own category.
+        total_ms = self.get_total_time() * 1000
+        lines = [f"Startup: {total_ms:.1f} ms"]
+        if budget_ms is not None:
+            verdict = 'within budget' if total_ms <= budget_ms else f"OVER BUDGET by {total_ms - budget_ms:.1f} ms"
+            lines[0] += f" (budget {budget_ms:.0f} ms, {verdict})"
+
+        totals = self.get_category_totals()
+        categories = list(self.CATEGORY_TITLES) + [category for category in totals if category not in self.CATEGORY_TITLES]
+        for category in categories:
+            if category not in totals:
+                continue
+
+            count, total = totals[category]
+            title = self.CATEGORY_TITLES.get(category, category)
+            lines.append(f"  {title}: {count} in {total * 1000:.1f} ms")
+
+            steps = sorted((step for step in self.records if step[0] == category), key=lambda step: -step[2])
+            for _, name, seconds in steps[:max_entries]:
+                lines.append(f"    {seconds * 1000:8.2f} ms  {name}")
+            if len(steps) > max_entries:
+                lines.append(f"    ... {len(steps) - max_entries} more")
+
+        return '\n'.join(lines)
@@ -0,0 +1,67 @@
+# TEXT RENDER CACHE
+
+from collections import OrderedDict
+
+class TextCache:
+    # Keeps recently rendered text surfaces so the same text is not rasterized again every frame.
+    # The oldest unused entries are removed when the cache gets too full (least recently used).
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        # Set the limits for the number of cached surfaces and their total pixel memory.
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        # Store rendered surfaces under their (font, text, color, antialias) key, oldest first.
+        self.surfaces = OrderedDict()
+
+        # Track the pixel memory used by all cached surfaces (in bytes).
+        self.bytes_used = 0
+
+        # Count cache hits, misses and removed entries.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, font, text, color, antialias=True):
+        # Returns the rendered text surface, from the cache if the same text was rendered before.
+        # The returned surface is shared, so callers must only blit it and never draw on it.
+        key = (font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        self.bytes_used += self._surface_bytes(surface)
+
+        # Remove the least recently used surfaces until the cache is within its limits again.
+        while len(self.surfaces) > self.max_entries or (self.bytes_used > self.max_bytes and len(self.surfaces) > 1):
+            _, old_surface = self.surfaces.popitem(last=False)
+            self.bytes_used -= self._surface_bytes(old_surface)
+            self.evictions += 1
+
+        return surface
+
+    def clear(self):
+        # Removes every cached surface.
+        self.surfaces.clear()
+        self.bytes_used = 0
+
+    def get_stats(self):
+        # Returns the cache statistics as a dictionary.
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self.surfaces),
+            'bytes': self.bytes_used
+        }
+
+    def _surface_bytes(self, surface):
+        # Returns how much pixel memory a surface uses.
+        return surface.get_pitch() * surface.get_height()
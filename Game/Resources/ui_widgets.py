@@ -0,0 +1,115 @@
+# UI WIDGET SYSTEM
+
+import pygame as pg
+
+class Widget:
+    # A part of a menu screen with a fixed position. The screen redraws it only when it is marked as changed.
+
+    def __init__(self, rect):
+        # Store the area the widget covers on the screen.
+        self.rect = pg.Rect(rect)
+
+        # Set to True when the widget looks different and has to be drawn again.
+        self.changed = True
+
+    def draw(self, screen):
+        # Draws the widget. Each kind of widget draws itself.
+        pass
+
+
+class Label(Widget):
+    # A pre-rendered text (or any other image) drawn at a fixed position.
+
+    def __init__(self, surface, **position):
+        # Store the surface and place it, like Label(text, center=(x, y)) or Label(text, centerx=x, top=y).
+        super().__init__(surface.get_rect(**position))
+        self.surface = surface
+
+    def draw(self, screen):
+        # Draws the text.
+        screen.blit(self.surface, self.rect)
+
+
+class Panel(Widget):
+    # A rounded, filled rectangle drawn behind other widgets.
+
+    def __init__(self, rect, color, border_radius=10):
+        # Store the fill color and how rounded the corners are.
+        super().__init__(rect)
+        self.color = color
+        self.border_radius = border_radius
+
+    def draw(self, screen):
+        # Draws the rectangle.
+        pg.draw.rect(screen, self.color, self.rect, border_radius=self.border_radius)
+
+
+class Button(Panel):
+    # A panel with a text in its center. It changes color while the mouse is over it.
+
+    def __init__(self, rect, text_surface, color, hover_color, border_radius=10):
+        # Store the text and the hover color. The button starts without the mouse over it.
+        super().__init__(rect, color, border_radius)
+        self.text_surface = text_surface
+        self.hover_color = hover_color
+        self.hovered = False
+
+    def set_hovered(self, hovered):
+        # Updates if the mouse is over the button. Only a change makes the button draw again.
+        if hovered != self.hovered:
+            self.hovered = hovered
+            self.changed = True
+
+    def draw(self, screen):
+        # Draws the button rectangle in the normal or hover color, then the text on it.
+        pg.draw.rect(screen, self.hover_color if self.hovered else self.color, self.rect, border_radius=self.border_radius)
+        screen.blit(self.text_surface, self.text_surface.get_rect(center=self.rect.center))
+
+
+class WidgetScreen:
+    # A whole menu screen: a background image and the widgets on it, laid out once.
+    # The first draw paints everything. After that only the widgets that changed are drawn again
+    # (with their part of the background and any widgets overlapping them), and draw returns the screen areas that must be presented.
+
+    def __init__(self, background, widgets):
+        # Store the background and the widgets, in drawing order (later widgets are drawn on top).
+        self.background = background
+        self.widgets = widgets
+
+        # Set to True when the screen no longer shows this menu and everything must be drawn again.
+        self.needs_full_redraw = True
+
+    def invalidate(self):
+        # Makes the next draw paint the whole screen (after another screen was shown, or something was drawn on top).
+        self.needs_full_redraw = True
+
+    def update_hover(self, mouse_pos):
+        # Updates the hover state of every button for the given mouse position.
+        for widget in self.widgets:
+            if isinstance(widget, Button):
+                widget.set_hovered(widget.rect.collidepoint(mouse_pos))
+
+    def draw(self, screen):
+        # Draws the screen. Returns None if the whole screen was drawn, or the list of areas that were drawn again.
+        if self.needs_full_redraw:
+            screen.blit(self.background, (0, 0))
+            for widget in self.widgets:
+                widget.draw(screen)
+                widget.changed = False
+            self.needs_full_redraw = False
+            return None
+
+        changed_rects = [widget.rect for widget in self.widgets if widget.changed]
+        for rect in changed_rects:
+            # Paint the background in the changed area again (it shows through rounded corners), 
+            # then every widget that covers part of the area, in drawing order. Drawing is clipped to the area.
+            screen.set_clip(rect)
+            screen.blit(self.background, rect, rect)
+            for widget in self.widgets:
+                if widget.rect.colliderect(rect):
+                    widget.draw(screen)
+            screen.set_clip(None)
+
+        for widget in self.widgets:
+            widget.changed = False
+        return changed_rects